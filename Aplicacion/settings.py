@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -88,6 +90,45 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# La caché de autorización de sensores (y de UIDs no registrados) decide
+# accesos: tiene que ser compartida por todos los workers de gunicorn para que
+# una invalidación (sensor bloqueado o perdido) llegue a todos a la vez. En
+# producción es Redis (SMARTCONNECT_REDIS_URL, p.ej. redis://127.0.0.1:6379/1):
+# cada acceso la lee en memoria y los contadores (incr) son atómicos. Sin
+# Redis (desarrollo, tests) se usa la propia base de datos (python manage.py
+# createcachetable), que cuesta una consulta por lectura. LocMemCache, una
+# copia por worker, no sirve con más de un worker.
+# La caché de respuestas usa ficheros, compartidos por todos los workers del
+# servidor (también funciona con LocMemCache, una copia por worker).
+
+REDIS_URL = os.environ.get('SMARTCONNECT_REDIS_URL')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'smartconnect_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+    'respuestas': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        # Fuera del código fuente; SMARTCONNECT_RESPUESTAS_DIR fija otro directorio
+        'LOCATION': os.environ.get(
+            'SMARTCONNECT_RESPUESTAS_DIR', os.path.join(tempfile.gettempdir(), 'smartconnect_respuestas')
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -147,8 +188,14 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'EXCEPTION_HANDLER': 'api.exceptions.custom_exception_handler',
+    # Misma salida y errores que JSONRenderer/JSONParser, con orjson (ver api/renderers.py)
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'api.renderers.ORJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 
@@ -181,3 +228,62 @@ SIMPLE_JWT = {
     
     'JTI_CLAIM': 'jti',
 }
+
+# SmartConnect Configuration
+SMARTCONNECT = {
+    # Caché de autorización usada por /api/acceso/sensor/
+    'SENSOR_CACHE_ENABLED': True,
+    'SENSOR_CACHE_ALIAS': 'default',
+    'SENSOR_CACHE_TIMEOUT': 300,  # segundos
+    'SENSOR_CACHE_NEGATIVE_TIMEOUT': 30,  # segundos que se recuerda un UID no registrado
+    # Cargar todas las autorizaciones al arrancar los workers de gunicorn
+    # (gunicorn.conf.py); solo lo hace el primero, la caché es compartida
+    'SENSOR_CACHE_PRECALENTAR': True,
+    # Denegaciones repetidas de un UID no registrado dentro de la ventana se
+    # fusionan en un único evento con metadata['repeticiones'] (0 = desactivado)
+    'DENEGACION_VENTANA': 60,
+    # Accesos agregados por gateways (/api/acceso/sensor/batch/)
+    'ACCESO_LOTE_MAX_ITEMS': 500,
+    # Sincronización de la allowlist en lectores (/api/sensores/allowlist/delta/)
+    'ALLOWLIST_DELTA_MAX': 5000,
+    # Segundos durante los que un delta vuelve a enviar los cambios anteriores a
+    # ?desde= (una versión menor puede confirmarse después de otra mayor)
+    'ALLOWLIST_DELTA_RELECTURA': 60,
+    # Días de historial de cambios que conserva podar_cambios_sensores; un
+    # lector con una versión anterior recibe 410 y descarga la instantánea
+    'ALLOWLIST_RETENCION_DIAS': 30,
+    # Paginación por cursor de /api/eventos/: límite de ?page_size=
+    'EVENTOS_PAGE_SIZE_MAX': 1000,
+    # Listados grandes (eventos, sensores activos, sensores de un departamento)
+    # sin ModelSerializer, sobre values() (ver api/rapido.py)
+    'SERIALIZACION_RAPIDA': False,
+    # Caché compartida de respuestas de departamentos, sensores, barreras y
+    # /api/info/, invalidada por generación de modelo (ver api/respuestas.py)
+    'RESPUESTAS_CACHE_ENABLED': True,
+    'RESPUESTAS_CACHE_ALIAS': 'respuestas',
+    'RESPUESTAS_CACHE_TIMEOUT': 300,  # segundos
+    # Retención de eventos por meses (python manage.py podar_eventos)
+    'EVENTOS_RETENCION_MESES': None,  # meses completos que se conservan; None = sin poda
+    'EVENTOS_ARCHIVO_DIR': BASE_DIR / 'archivo_eventos',  # volcado .ndjson.gz antes de eliminar
+    # Ingesta NDJSON de eventos registrados sin conexión (/api/eventos/ingesta/)
+    'EVENTOS_INGESTA_LOTE': 1000,  # líneas por consulta de UIDs, bulk_create y transacción
+    'EVENTOS_INGESTA_MAX_LINEAS': 100000,  # por petición; el resto se reenvía desde siguiente_linea
+    # Importación de sensores CSV/NDJSON (/api/sensores/importar/, importar_sensores)
+    'SENSORES_IMPORTACION_LOTE': 1000,  # filas por consulta de UIDs, bulk_create y transacción
+    # Feed en vivo por Server-Sent Events (/api/eventos/en-vivo/, solo ASGI)
+    'EVENTOS_FEED_RECIENTES': 1000,  # mensajes conservados para reanudar con Last-Event-ID
+    'EVENTOS_FEED_SONDEO': 1.0,  # segundos entre consultas de eventos de otros workers; 0 = desactivado
+    'EVENTOS_FEED_LATIDO': 15,  # segundos entre comentarios de keep-alive
+    'EVENTOS_FEED_TICKET_TTL': 30,  # segundos de validez del ticket de un solo uso (?ticket=)
+    # Escritura de eventos: 'SINCRONO' (INSERT antes de responder) o 'BUFFER'
+    # (respuesta inmediata y escritura diferida con bulk_create)
+    'EVENTO_ESCRITURA': {
+        'ACCESO_PERMITIDO': 'SINCRONO',
+        'ACCESO_DENEGADO': 'SINCRONO',
+        'BARRERA_ABIERTA': 'SINCRONO',
+        'BARRERA_CERRADA': 'SINCRONO',
+    },
+    'EVENTO_BUFFER_MAX': 10000,  # eventos pendientes antes de descartar
+    'EVENTO_BUFFER_LOTE': 200,  # tamaño de lote que fuerza el vaciado
+    'EVENTO_BUFFER_INTERVALO': 1.0,  # segundos entre vaciados
+}
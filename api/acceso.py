@@ -0,0 +1,191 @@
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, Func, JSONField, Value
+from django.utils import timezone
+from django.utils.http import parse_header_parameters
+
+from .buffer import fusionar_evento, registrar_evento
+from .cache import sensor_desde_autorizacion
+from .conf import smartconnect_setting
+from .models import Evento
+from .resumen import clave as clave_resumen, sumar
+
+
+FORMATO_COMPACTO = 'compacto'
+PREFIJO_DENEGACION = 'smartconnect:denegacion:'
+# Ventana reclamada por un intento cuyo evento aún no está guardado
+VENTANA_RESERVADA = 'RESERVADA'
+
+
+def formato_compacto(query_params, accept):
+    """
+    Indica si el cliente pidió la respuesta compacta, con ?formato=compacto
+    o con el perfil del Accept (application/json; profile=compacto)
+    """
+    if query_params.get('formato') == FORMATO_COMPACTO:
+        return True
+    for media_type in (accept or '').split(','):
+        _, parametros = parse_header_parameters(media_type)
+        if parametros.get('profile') == FORMATO_COMPACTO:
+            return True
+    return False
+
+
+def respuesta_compacta(evento, acceso_permitido, registrado):
+    """Respuesta mínima y de forma fija para lectores físicos (sin ModelSerializer)"""
+    return {
+        'success': registrado,
+        'acceso_permitido': acceso_permitido,
+        'evento_id': evento.pk,
+    }
+
+
+def evento_acceso(uid, autorizacion, timestamp=None, departamento_id=None):
+    """
+    Decide un intento de acceso y construye (sin guardar) su Evento.
+    Si se indica departamento_id, el sensor debe estar autorizado para ese
+    departamento (consulta O(1) en la autorización cacheada).
+    Devuelve (evento, acceso_permitido, mensaje).
+    """
+    timestamp = (timestamp or timezone.now()).isoformat()
+
+    if autorizacion is None:
+        evento = Evento(
+            tipo='ACCESO_DENEGADO',
+            codigo='UID_DESCONOCIDO',
+            metadata={
+                'uid': uid,
+                'razon': 'UID no registrado',
+                'timestamp': timestamp
+            }
+        )
+        return evento, False, f'Sensor con UID {uid} no encontrado'
+
+    sensor = sensor_desde_autorizacion(autorizacion)
+    departamentos = autorizacion['departamentos']
+    departamento_autorizado = departamento_id is None or departamento_id in departamentos
+    puede_acceder = sensor.puede_acceder() and departamento_autorizado
+    departamento_nombre = departamentos.get(departamento_id, autorizacion['departamento_nombre'])
+
+    if puede_acceder:
+        tipo_evento = 'ACCESO_PERMITIDO'
+        mensaje = f'Acceso permitido para sensor {sensor.uid}'
+        codigo = 'ACCESO'
+    elif not sensor.puede_acceder():
+        tipo_evento = 'ACCESO_DENEGADO'
+        mensaje = f'Acceso denegado para sensor {sensor.uid}. Estado: {sensor.get_estado_display()}'
+        codigo = 'SENSOR_NO_ACTIVO'
+    else:
+        tipo_evento = 'ACCESO_DENEGADO'
+        mensaje = f'Acceso denegado para sensor {sensor.uid}. Sin autorización para el departamento {departamento_id}'
+        codigo = 'SIN_AUTORIZACION'
+
+    # Parámetros de la descripción (Evento.MENSAJES), que se genera al leer
+    metadata = {
+        'uid': sensor.uid,
+        'sensor_nombre': sensor.nombre,
+        'estado_sensor': sensor.estado,
+        'departamento': departamento_nombre,
+        'usuario_asignado': autorizacion['usuario_nombre'],
+        'timestamp': timestamp
+    }
+    if departamento_id is not None:
+        metadata['departamento_solicitado'] = departamento_id
+
+    evento = Evento(
+        tipo=tipo_evento,
+        sensor=sensor,
+        # Departamento solicitado si el sensor está autorizado en él; si no, el propio del sensor
+        departamento_id=departamento_id if departamento_id in departamentos else autorizacion['departamento_id'],
+        codigo=codigo,
+        metadata=metadata
+    )
+    return evento, puede_acceder, mensaje
+
+
+class _SumarRepeticion(Func):
+    """
+    metadata con 'repeticiones' + 1 (1 si no existe) y 'ultimo_intento',
+    calculado en el propio UPDATE: dos repeticiones simultáneas no se pisan
+    """
+    output_field = JSONField()
+
+    def __init__(self, ultimo_intento):
+        super().__init__(F('metadata'), Value(ultimo_intento))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        metadata, ultimo_intento = self.get_source_expressions()
+        metadata_sql, metadata_params = compiler.compile(metadata)
+        valor_sql, valor_params = compiler.compile(ultimo_intento)
+        return (
+            f"JSON_SET({metadata_sql}, '$.repeticiones', "
+            f"COALESCE(JSON_EXTRACT({metadata_sql}, '$.repeticiones'), 1) + 1, '$.ultimo_intento', {valor_sql})",
+            (*metadata_params, *metadata_params, *valor_params)
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        metadata, ultimo_intento = self.get_source_expressions()
+        metadata_sql, metadata_params = compiler.compile(metadata)
+        valor_sql, valor_params = compiler.compile(ultimo_intento)
+        return (
+            f"{metadata_sql} || JSONB_BUILD_OBJECT('repeticiones', "
+            f"COALESCE(({metadata_sql} ->> 'repeticiones')::integer, 1) + 1, 'ultimo_intento', {valor_sql}::text)",
+            (*metadata_params, *metadata_params, *valor_params)
+        )
+
+
+def registrar_acceso_desconocido(evento):
+    """
+    Registra el evento de un UID no registrado. Las denegaciones repetidas
+    del mismo UID dentro de DENEGACION_VENTANA segundos se fusionan en el
+    primer Evento de la ventana (metadata['repeticiones'] y 'ultimo_intento')
+    en lugar de insertar una fila por intento.
+    La ventana vive en la caché compartida de autorización (SENSOR_CACHE_ALIAS),
+    así que se fusionan los intentos que atienden todos los workers. El primer
+    intento reclama la ventana con cache.add (atómico): de dos intentos
+    simultáneos solo uno la abre. Cada repetición suma en un único UPDATE
+    sobre la fila del evento (_SumarRepeticion), atómico con cualquier caché.
+    En modo BUFFER, mientras el evento sigue en la cola del worker que lo
+    registró, sus repeticiones se fusionan en la cola (BufferEventos.fusionar);
+    al escribirse, la ventana pasa a apuntar a su fila. Un intento que
+    encuentra la ventana reservada sin evento fusionable registra el suyo aparte.
+    """
+    ventana = smartconnect_setting('DENEGACION_VENTANA')
+    if not ventana:
+        return registrar_evento(evento)
+
+    cache = caches[smartconnect_setting('SENSOR_CACHE_ALIAS')]
+    clave = f'{PREFIJO_DENEGACION}{evento.metadata["uid"]}'
+
+    reclamada = time.monotonic()
+
+    def abrir_ventana(escrito):
+        # Lo que queda de la ventana reclamada (en modo BUFFER se escribe más tarde)
+        restante = ventana - (time.monotonic() - reclamada)
+        if restante > 0:
+            cache.set(clave, {'id': escrito.pk, 'fecha_hora': escrito.fecha_hora}, restante)
+
+    if cache.add(clave, VENTANA_RESERVADA, ventana):
+        return registrar_evento(evento, fusion=clave, al_escribir=abrir_ventana)
+
+    previo = cache.get(clave)
+    if previo == VENTANA_RESERVADA:
+        fusionado = fusionar_evento(clave, evento.metadata['timestamp'])
+        if fusionado is not None:
+            evento.fecha_hora, evento.metadata = fusionado
+            return evento
+    elif isinstance(previo, dict):
+        with transaction.atomic():
+            filas = Evento.objects.filter(pk=previo['id'])
+            if filas.update(metadata=_SumarRepeticion(evento.metadata['timestamp'])):
+                evento.pk = previo['id']
+                evento.metadata = filas.values_list('metadata', flat=True).get()
+                # La repetición cuenta en la hora del evento fusionado, la
+                # misma a la que la asigna resumen.reconstruir
+                evento.fecha_hora = previo['fecha_hora']
+                sumar({clave_resumen(evento): 1})
+                return evento
+
+    return registrar_evento(evento)
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.utils import timezone
 from .models import Usuario, Departamento, Sensor, Barrera, Evento
 
 
@@ -46,13 +47,19 @@ class DepartamentoAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        # Totales anotados en la consulta del listado (ver DepartamentoQuerySet.con_totales)
+        return super().get_queryset(request).con_totales()
+    
     def total_sensores(self, obj):
-        return obj.sensores.count()
+        return obj.total_sensores
     total_sensores.short_description = 'Sensores'
+    total_sensores.admin_order_field = 'total_sensores'
     
     def total_barreras(self, obj):
-        return obj.barreras.count()
+        return obj.total_barreras
     total_barreras.short_description = 'Barreras'
+    total_barreras.admin_order_field = 'total_barreras'
 
 
 @admin.register(Sensor)
@@ -71,7 +78,7 @@ class SensorAdmin(admin.ModelAdmin):
             'fields': ('uid', 'nombre', 'descripcion', 'estado')
         }),
         ('Asignaciones', {
-            'fields': ('departamento', 'usuario_asignado')
+            'fields': ('departamento', 'departamentos_adicionales', 'usuario_asignado')
         }),
         ('Fechas', {
             'fields': ('fecha_creacion', 'fecha_actualizacion'),
@@ -79,6 +86,7 @@ class SensorAdmin(admin.ModelAdmin):
         }),
     )
     
+    filter_horizontal = ['departamentos_adicionales']
     list_per_page = 25
 
 
@@ -106,12 +114,12 @@ class BarreraAdmin(admin.ModelAdmin):
     actions = ['abrir_barreras', 'cerrar_barreras']
     
     def abrir_barreras(self, request, queryset):
-        count = queryset.update(estado='ABIERTA')
+        count = queryset.update(estado='ABIERTA', fecha_actualizacion=timezone.now())
         self.message_user(request, f'{count} barrera(s) abierta(s) exitosamente.')
     abrir_barreras.short_description = 'Abrir barreras seleccionadas'
     
     def cerrar_barreras(self, request, queryset):
-        count = queryset.update(estado='CERRADA')
+        count = queryset.update(estado='CERRADA', fecha_actualizacion=timezone.now())
         self.message_user(request, f'{count} barrera(s) cerrada(s) exitosamente.')
     cerrar_barreras.short_description = 'Cerrar barreras seleccionadas'
 
@@ -122,21 +130,21 @@ class EventoAdmin(admin.ModelAdmin):
     Administración para Evento
     """
     list_display = ['tipo', 'sensor_info', 'barrera', 'usuario_accion', 'fecha_hora']
-    list_filter = ['tipo', 'fecha_hora']
-    search_fields = ['descripcion', 'sensor__uid', 'sensor__nombre', 'barrera__nombre']
+    list_filter = ['tipo', 'departamento', 'fecha_hora']
+    search_fields = ['descripcion', 'metadata__uid', 'id_origen', 'sensor__uid', 'sensor__nombre', 'barrera__nombre']
     ordering = ['-fecha_hora']
-    readonly_fields = ['fecha_hora']
+    readonly_fields = ['descripcion_evento', 'fecha_hora']
     date_hierarchy = 'fecha_hora'
     
     fieldsets = (
         ('Información del evento', {
-            'fields': ('tipo', 'descripcion')
+            'fields': ('tipo', 'descripcion_evento')
         }),
         ('Referencias', {
-            'fields': ('sensor', 'barrera', 'usuario_accion')
+            'fields': ('sensor', 'barrera', 'departamento', 'usuario_accion')
         }),
         ('Metadata', {
-            'fields': ('metadata', 'fecha_hora'),
+            'fields': ('metadata', 'id_origen', 'fecha_hora'),
             'classes': ('collapse',)
         }),
     )
@@ -149,6 +157,10 @@ class EventoAdmin(admin.ModelAdmin):
         return "-"
     sensor_info.short_description = 'Sensor'
     
+    def descripcion_evento(self, obj):
+        return obj.texto_descripcion
+    descripcion_evento.short_description = 'Descripción'
+    
     def has_add_permission(self, request):
         # Los eventos solo se crean automáticamente
         return False
@@ -0,0 +1,95 @@
+"""
+Lista de acceso (allowlist) de lectores y gateways
+(/api/sensores/allowlist/ y /api/sensores/allowlist/delta/)
+
+Cada sensor se exporta como
+    [uid, estado, departamento_id, departamento_activo, departamentos_adicionales]
+donde departamentos_adicionales son los ids de los adicionales activos: el
+sensor da acceso a departamento_id si departamento_activo y a cada adicional
+de la lista, igual que Sensor.departamentos_permitidos.
+
+Todo cambio de esos datos anota un CambioSensor por UID (api/signals.py y la
+importación en bloque): guardar o eliminar un sensor, sus departamentos
+adicionales y el campo activo de un departamento. El historial se poda con
+podar_cambios (python manage.py podar_cambios_sensores); un lector cuya
+versión sea anterior a lo que queda recibe 410 y descarga la instantánea.
+
+La versión es el id autoincremental de CambioSensor, asignado al insertar y
+no al confirmar: en PostgreSQL una transacción puede confirmar una versión
+menor después de que un lector haya recibido otra mayor. Por eso cada delta
+vuelve a enviar los cambios de las VENTANA_RELECTURA versiones anteriores a
+?desde= anotados en los últimos ALLOWLIST_DELTA_RELECTURA segundos (cada
+fila es el estado actual del sensor: repetirla no cambia nada).
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Max
+from django.utils import timezone
+
+from .conf import smartconnect_setting
+from .models import CambioSensor, Sensor
+
+
+# Versiones hacia atrás que se vuelven a mirar en cada delta (ver arriba)
+VENTANA_RELECTURA = 200
+
+
+def version_allowlist():
+    """Versión actual de la allowlist (último cambio registrado de sensores)"""
+    return CambioSensor.objects.aggregate(version=Max('version'))['version'] or 0
+
+
+def relecturas(desde):
+    """
+    UIDs de los cambios con versión <= desde que pudieron confirmarse después
+    de que el lector recibiera desde: los de las VENTANA_RELECTURA versiones
+    anteriores (rango de la clave primaria) anotados hace menos de
+    ALLOWLIST_DELTA_RELECTURA segundos
+    """
+    margen = smartconnect_setting('ALLOWLIST_DELTA_RELECTURA')
+    if not margen or desde <= 0:
+        return set()
+    return set(
+        CambioSensor.objects.filter(
+            version__gt=desde - VENTANA_RELECTURA, version__lte=desde,
+            fecha__gte=timezone.now() - timedelta(seconds=margen)
+        ).values_list('uid', flat=True)
+    )
+
+
+def filas_allowlist(sensores):
+    """Filas de la allowlist de un queryset de sensores, con dos consultas"""
+    Adicional = Sensor.departamentos_adicionales.through
+    adicionales = defaultdict(list)
+    for sensor_id, departamento_id in (
+        Adicional.objects.filter(sensor__in=sensores.order_by().values('pk'), departamento__activo=True)
+        .order_by('departamento_id').values_list('sensor_id', 'departamento_id')
+    ):
+        adicionales[sensor_id].append(departamento_id)
+    return [
+        [uid, estado, departamento_id, departamento_activo, adicionales.get(pk, [])]
+        for pk, uid, estado, departamento_id, departamento_activo in sensores.order_by().values_list(
+            'pk', 'uid', 'estado', 'departamento_id', 'departamento__activo'
+        )
+    ]
+
+
+def podar_cambios(dias=None):
+    """
+    Elimina los CambioSensor de más de dias (ALLOWLIST_RETENCION_DIAS)
+    días, conservando siempre el último para no perder la versión actual.
+    Devuelve el número de cambios eliminados.
+    """
+    if dias is None:
+        dias = smartconnect_setting('ALLOWLIST_RETENCION_DIAS')
+    ultima = version_allowlist()
+    if not ultima:
+        return 0
+    # La versión crece con la fecha: se borra un rango de la clave primaria
+    conservada = (
+        CambioSensor.objects.filter(fecha__gte=timezone.now() - timedelta(days=dias))
+        .order_by('version').values_list('version', flat=True).first()
+    )
+    corte = min(conservada, ultima) if conservada else ultima
+    return CambioSensor.objects.filter(version__lt=corte).delete()[0]
@@ -0,0 +1,233 @@
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, transaction
+
+from .conf import smartconnect_setting
+from .feed import publicador
+from .models import Evento
+from .resumen import acumular
+
+
+logger = logging.getLogger(__name__)
+
+MODO_SINCRONO = 'SINCRONO'
+MODO_BUFFER = 'BUFFER'
+
+
+class BufferEventos:
+    """
+    Buffer en memoria (acotado) para la escritura diferida de eventos.
+    Un hilo por proceso vacía la cola con bulk_create cuando alcanza
+    EVENTO_BUFFER_LOTE eventos o cada EVENTO_BUFFER_INTERVALO segundos.
+    Un evento encolado con clave de fusión admite repeticiones (fusionar)
+    mientras sigue en la cola; al escribirlo se llama a al_escribir(evento).
+    """
+
+    def __init__(self):
+        self._cola = deque()
+        # clave de fusión -> (evento pendiente, al_escribir)
+        self._fusionables = {}
+        self._lock = threading.Lock()
+        self._lock_vaciado = threading.Lock()
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._pid = None
+        self._descartados = 0
+        self._escritos = 0
+        self._errores = 0
+
+    def registrar(self, evento, fusion=None, al_escribir=None):
+        """Encola un evento; devuelve False si el buffer está lleno y se descarta"""
+        self._asegurar_hilo()
+        with self._lock:
+            if len(self._cola) >= smartconnect_setting('EVENTO_BUFFER_MAX'):
+                self._descartados += 1
+                return False
+            self._cola.append(evento)
+            if fusion is not None:
+                self._fusionables[fusion] = (evento, al_escribir)
+            pendientes = len(self._cola)
+        if pendientes >= smartconnect_setting('EVENTO_BUFFER_LOTE'):
+            self._despertar.set()
+        return True
+
+    def fusionar(self, fusion, ultimo_intento):
+        """
+        Suma una repetición (metadata['repeticiones'] y 'ultimo_intento') al
+        evento pendiente con esa clave de fusión. Devuelve (fecha_hora,
+        copia de metadata) del evento fusionado, o None si ya no está en la
+        cola (escrito o en escritura).
+        """
+        with self._lock:
+            pendiente = self._fusionables.get(fusion)
+            if pendiente is None:
+                return None
+            evento = pendiente[0]
+            evento.metadata['repeticiones'] = evento.metadata.get('repeticiones', 1) + 1
+            evento.metadata['ultimo_intento'] = ultimo_intento
+            return evento.fecha_hora, dict(evento.metadata)
+
+    def vaciar(self):
+        """Escribe todos los eventos pendientes en lotes de EVENTO_BUFFER_LOTE"""
+        tamano_lote = smartconnect_setting('EVENTO_BUFFER_LOTE')
+        with self._lock_vaciado:
+            while True:
+                with self._lock:
+                    lote = [self._cola.popleft() for _ in range(min(tamano_lote, len(self._cola)))]
+                    # Fuera de la cola ya no admiten repeticiones: se escriben tal cual
+                    escritos = self._sacar_fusionables(lote)
+                if not lote:
+                    return
+                try:
+                    escribir_eventos(lote)
+                except Exception:
+                    logger.exception('No se pudieron escribir %s eventos del buffer', len(lote))
+                    self._reencolar(lote)
+                    return
+                with self._lock:
+                    self._escritos += len(lote)
+                for evento, al_escribir in escritos:
+                    try:
+                        al_escribir(evento)
+                    except Exception:
+                        logger.exception('Error tras escribir un evento fusionable del buffer')
+
+    def detener(self):
+        """Detiene el hilo y vacía lo pendiente (cierre del worker)"""
+        self._detener.set()
+        self._despertar.set()
+        if self._hilo is not None and self._hilo.is_alive():
+            self._hilo.join(timeout=10)
+        self.vaciar()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'pendientes': len(self._cola),
+                'capacidad': smartconnect_setting('EVENTO_BUFFER_MAX'),
+                'escritos': self._escritos,
+                'descartados': self._descartados,
+                'errores': self._errores,
+            }
+
+    def _sacar_fusionables(self, lote):
+        if not self._fusionables:
+            return []
+        ids = set(map(id, lote))
+        sacados = [
+            (fusion, pendiente) for fusion, pendiente in self._fusionables.items() if id(pendiente[0]) in ids
+        ]
+        for fusion, _ in sacados:
+            del self._fusionables[fusion]
+        return [pendiente for _, pendiente in sacados if pendiente[1] is not None]
+
+    def _reencolar(self, lote):
+        # Devolver el lote al frente de la cola sin superar la capacidad
+        with self._lock:
+            self._errores += 1
+            espacio = smartconnect_setting('EVENTO_BUFFER_MAX') - len(self._cola)
+            conservados = lote[:max(espacio, 0)]
+            self._descartados += len(lote) - len(conservados)
+            self._cola.extendleft(reversed(conservados))
+
+    def _asegurar_hilo(self):
+        # El hilo se crea en el primer uso de cada proceso (p.ej. tras el fork de gunicorn)
+        if self._pid == os.getpid() and self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._hilo is not None and self._hilo.is_alive():
+                return
+            self._pid = os.getpid()
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._trabajar, name='smartconnect-eventos', daemon=True)
+            self._hilo.start()
+
+    def _trabajar(self):
+        while not self._detener.is_set():
+            self._despertar.wait(smartconnect_setting('EVENTO_BUFFER_INTERVALO'))
+            self._despertar.clear()
+            close_old_connections()
+            try:
+                self.vaciar()
+            finally:
+                close_old_connections()
+
+
+def guardar_evento(evento):
+    """
+    Guarda un evento y lo suma a su resumen por hora en una transacción; tras
+    el commit se publica en el feed en vivo
+    """
+    with transaction.atomic():
+        evento.save()
+        acumular([evento])
+        transaction.on_commit(lambda: publicador.publicar([evento]), robust=True)
+    return evento
+
+
+def escribir_eventos(eventos):
+    """bulk_create de eventos y actualización de sus resúmenes en una transacción"""
+    with transaction.atomic():
+        Evento.objects.bulk_create(eventos)
+        acumular(eventos)
+        transaction.on_commit(lambda: publicador.publicar(eventos), robust=True)
+    return eventos
+
+
+buffer_eventos = BufferEventos()
+atexit.register(buffer_eventos.detener)
+
+
+def modo_escritura(tipo):
+    """Modo de escritura configurado para un tipo de evento"""
+    return smartconnect_setting('EVENTO_ESCRITURA').get(tipo, MODO_SINCRONO)
+
+
+def registrar_evento(evento, fusion=None, al_escribir=None):
+    """
+    Guarda un evento de forma síncrona o lo encola en el buffer según
+    EVENTO_ESCRITURA. En modo buffer el evento conserva su fecha_hora (fijada
+    al construirlo) pero queda sin id en la respuesta. Con clave de fusión,
+    mientras espera en el buffer admite repeticiones (fusionar_evento);
+    al_escribir(evento) se llama cuando ya tiene id.
+    """
+    if modo_escritura(evento.tipo) == MODO_BUFFER:
+        buffer_eventos.registrar(evento, fusion, al_escribir)
+    else:
+        guardar_evento(evento)
+        if al_escribir is not None:
+            al_escribir(evento)
+    return evento
+
+
+def fusionar_evento(fusion, ultimo_intento):
+    """Repetición de un evento pendiente en el buffer de este proceso (BufferEventos.fusionar)"""
+    return buffer_eventos.fusionar(fusion, ultimo_intento)
+
+
+async def aregistrar_evento(evento):
+    """Versión asíncrona de registrar_evento"""
+    if modo_escritura(evento.tipo) == MODO_BUFFER:
+        buffer_eventos.registrar(evento)
+    else:
+        await sync_to_async(guardar_evento)(evento)
+    return evento
+
+
+def registrar_eventos(eventos):
+    """Versión en bloque de registrar_evento (un único bulk_create para los síncronos)"""
+    sincronos = []
+    for evento in eventos:
+        if modo_escritura(evento.tipo) == MODO_BUFFER:
+            buffer_eventos.registrar(evento)
+        else:
+            sincronos.append(evento)
+    if sincronos:
+        escribir_eventos(sincronos)
+    return eventos
@@ -0,0 +1,278 @@
+import logging
+import threading
+
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from .conf import smartconnect_setting
+from .models import Sensor
+from .serializers import SensorSerializer
+
+
+# El sufijo de versión evita leer entradas con el formato anterior
+PREFIJO_SENSOR = 'smartconnect:sensor:v2:'
+# Marca guardada en la misma clave para los UIDs no registrados (caché negativa)
+NO_REGISTRADO = 'NO_REGISTRADO'
+# Reclamada por el worker que precalienta la caché compartida al arrancar
+CLAVE_PRECALENTADO = 'smartconnect:precalentado'
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_contadores = {'aciertos': 0, 'fallos': 0, 'negativos': 0}
+
+
+def normalizar_uid(uid):
+    """Normaliza un UID igual que Sensor.clean"""
+    return uid.strip().upper()
+
+
+def _cache():
+    return caches[smartconnect_setting('SENSOR_CACHE_ALIAS')]
+
+
+def _clave(uid):
+    return f'{PREFIJO_SENSOR}{normalizar_uid(uid)}'
+
+
+def _sensores():
+    # Todo lo que necesita construir_autorizacion, sin consultas adicionales
+    return Sensor.objects.select_related('departamento', 'usuario_asignado').prefetch_related('departamentos_adicionales')
+
+
+def _contar(nombre):
+    with _lock:
+        _contadores[nombre] += 1
+
+
+def _desde_cache(autorizacion):
+    # Convierte la marca de UID no registrado en None y lleva la cuenta
+    _contar('aciertos')
+    if autorizacion == NO_REGISTRADO:
+        _contar('negativos')
+        return None
+    return autorizacion
+
+
+def construir_autorizacion(sensor):
+    """
+    Construye la entrada de caché de un sensor con solo lo necesario
+    para decidir el acceso (más su representación para la respuesta)
+    """
+    usuario = sensor.usuario_asignado
+    return {
+        'id': sensor.id,
+        'uid': sensor.uid,
+        'nombre': sensor.nombre,
+        'estado': sensor.estado,
+        'departamento_id': sensor.departamento_id,
+        'departamento_nombre': sensor.departamento.nombre,
+        'usuario_nombre': usuario.get_full_name() if usuario else None,
+        # Fila de la matriz sensor×departamento: {departamento_id: nombre}
+        'departamentos': sensor.departamentos_permitidos(),
+        'sensor': dict(SensorSerializer(sensor).data),
+    }
+
+
+def obtener_autorizacion(uid):
+    """
+    Devuelve la autorización de un UID o None si no está registrado.
+    Consulta la caché y, en caso de fallo, la base de datos. Los UIDs no
+    registrados también se cachean (SENSOR_CACHE_NEGATIVE_TIMEOUT) y se
+    invalidan con la misma clave al crear el sensor.
+    """
+    uid = normalizar_uid(uid)
+    habilitada = smartconnect_setting('SENSOR_CACHE_ENABLED')
+
+    if habilitada:
+        autorizacion = _cache().get(_clave(uid))
+        if autorizacion is not None:
+            return _desde_cache(autorizacion)
+
+    _contar('fallos')
+    try:
+        sensor = _sensores().get(uid=uid)
+    except Sensor.DoesNotExist:
+        if habilitada:
+            _cache().set(_clave(uid), NO_REGISTRADO, smartconnect_setting('SENSOR_CACHE_NEGATIVE_TIMEOUT'))
+        return None
+
+    autorizacion = construir_autorizacion(sensor)
+    if habilitada:
+        _cache().set(_clave(uid), autorizacion, smartconnect_setting('SENSOR_CACHE_TIMEOUT'))
+    return autorizacion
+
+
+async def aobtener_autorizacion(uid):
+    """Versión asíncrona de obtener_autorizacion (caché y ORM asíncronos)"""
+    uid = normalizar_uid(uid)
+    habilitada = smartconnect_setting('SENSOR_CACHE_ENABLED')
+
+    if habilitada:
+        autorizacion = await _cache().aget(_clave(uid))
+        if autorizacion is not None:
+            return _desde_cache(autorizacion)
+
+    _contar('fallos')
+    try:
+        sensor = await _sensores().aget(uid=uid)
+    except Sensor.DoesNotExist:
+        if habilitada:
+            await _cache().aset(_clave(uid), NO_REGISTRADO, smartconnect_setting('SENSOR_CACHE_NEGATIVE_TIMEOUT'))
+        return None
+
+    autorizacion = construir_autorizacion(sensor)
+    if habilitada:
+        await _cache().aset(_clave(uid), autorizacion, smartconnect_setting('SENSOR_CACHE_TIMEOUT'))
+    return autorizacion
+
+
+def obtener_autorizaciones(uids):
+    """
+    Versión en bloque de obtener_autorizacion: devuelve {uid: autorizacion}
+    solo para los UIDs registrados, con una única consulta uid__in para
+    todos los que no estén en caché
+    """
+    uids = {normalizar_uid(uid) for uid in uids}
+    habilitada = smartconnect_setting('SENSOR_CACHE_ENABLED')
+    autorizaciones = {}
+    desconocidos = set()
+
+    if habilitada and uids:
+        encontradas = _cache().get_many([_clave(uid) for uid in uids])
+        for clave, autorizacion in encontradas.items():
+            uid = clave[len(PREFIJO_SENSOR):]
+            if autorizacion == NO_REGISTRADO:
+                desconocidos.add(uid)
+            else:
+                autorizaciones[uid] = autorizacion
+
+    faltantes = uids - autorizaciones.keys() - desconocidos
+    with _lock:
+        _contadores['aciertos'] += len(autorizaciones) + len(desconocidos)
+        _contadores['negativos'] += len(desconocidos)
+        _contadores['fallos'] += len(faltantes)
+
+    if faltantes:
+        sensores = _sensores().filter(uid__in=faltantes).order_by()
+        nuevas = {sensor.uid: construir_autorizacion(sensor) for sensor in sensores}
+        autorizaciones.update(nuevas)
+        if habilitada and nuevas:
+            _cache().set_many(
+                {_clave(uid): autorizacion for uid, autorizacion in nuevas.items()},
+                smartconnect_setting('SENSOR_CACHE_TIMEOUT')
+            )
+        if habilitada and len(nuevas) < len(faltantes):
+            _cache().set_many(
+                {_clave(uid): NO_REGISTRADO for uid in faltantes - nuevas.keys()},
+                smartconnect_setting('SENSOR_CACHE_NEGATIVE_TIMEOUT')
+            )
+    return autorizaciones
+
+
+def sensor_desde_autorizacion(autorizacion):
+    """
+    Instancia un Sensor (sin consultar la base de datos) a partir de la
+    entrada de caché, suficiente para asociarlo a un Evento
+    """
+    return Sensor(
+        id=autorizacion['id'],
+        uid=autorizacion['uid'],
+        nombre=autorizacion['nombre'],
+        estado=autorizacion['estado'],
+        departamento_id=autorizacion['departamento_id'],
+    )
+
+
+def actualizar_sensor(sensor):
+    """Escribe en caché la autorización vigente de un sensor"""
+    if not smartconnect_setting('SENSOR_CACHE_ENABLED'):
+        return
+    _cache().set(
+        _clave(sensor.uid),
+        construir_autorizacion(sensor),
+        smartconnect_setting('SENSOR_CACHE_TIMEOUT')
+    )
+
+
+def invalidar_uids(uids):
+    """
+    Elimina de la caché las autorizaciones de los UIDs indicados.
+    Se repite al confirmar la transacción para que una lectura concurrente
+    no vuelva a cachear datos anteriores al commit.
+    """
+    claves = [_clave(uid) for uid in uids if uid]
+    if not claves:
+        return
+
+    def borrar():
+        _cache().delete_many(claves)
+
+    borrar()
+    transaction.on_commit(borrar)
+
+
+def precalentar():
+    """Carga en caché la autorización de todos los sensores"""
+    if not smartconnect_setting('SENSOR_CACHE_ENABLED'):
+        return 0
+
+    timeout = smartconnect_setting('SENSOR_CACHE_TIMEOUT')
+    sensores = _sensores().order_by()
+    lote = {}
+    total = 0
+    for sensor in sensores.iterator(chunk_size=2000):
+        lote[_clave(sensor.uid)] = construir_autorizacion(sensor)
+        if len(lote) >= 2000:
+            _cache().set_many(lote, timeout)
+            total += len(lote)
+            lote = {}
+    if lote:
+        _cache().set_many(lote, timeout)
+        total += len(lote)
+    return total
+
+
+def precalentar_al_iniciar():
+    """
+    Precalienta la caché al arrancar un worker (gunicorn.conf.py) si
+    SENSOR_CACHE_PRECALENTAR está activo. La caché es compartida: solo la
+    carga el primer worker que arranca en cada SENSOR_CACHE_TIMEOUT, que
+    reclama la carga con cache.add. Devuelve las entradas cargadas (None si
+    la cargó otro worker o está desactivado). Un fallo no impide arrancar: las
+    entradas se cargarán bajo demanda.
+    """
+    if not (smartconnect_setting('SENSOR_CACHE_ENABLED') and smartconnect_setting('SENSOR_CACHE_PRECALENTAR')):
+        return None
+    if not _cache().add(CLAVE_PRECALENTADO, True, smartconnect_setting('SENSOR_CACHE_TIMEOUT')):
+        return None
+    try:
+        return precalentar()
+    except Exception:
+        logger.exception('No se pudo precalentar la caché de autorización')
+        _cache().delete(CLAVE_PRECALENTADO)
+        return None
+    finally:
+        # No retener en el worker la conexión abierta antes de atender peticiones
+        connection.close()
+
+
+def estadisticas():
+    """Contadores de aciertos (incluidos los negativos) y fallos de la caché en este proceso"""
+    with _lock:
+        aciertos = _contadores['aciertos']
+        fallos = _contadores['fallos']
+        negativos = _contadores['negativos']
+    total = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'negativos': negativos,
+        'fallos': fallos,
+        'tasa_aciertos': aciertos / total if total else 0.0,
+    }
+
+
+def reiniciar_estadisticas():
+    with _lock:
+        for nombre in _contadores:
+            _contadores[nombre] = 0
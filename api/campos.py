@@ -0,0 +1,140 @@
+"""
+Campos dispersos: ?fields=id,uid,estado y ?exclude=metadata en los listados
+y detalles de los ViewSets
+
+Además de recortar la salida del serializador, la consulta solo lee las
+columnas de los campos pedidos (QuerySet.only) y solo hace los JOIN
+(select_related) y prefetch que esos campos necesitan.
+
+Los campos que no salen directamente de una columna o de una relación
+(propiedades, métodos, anotaciones) declaran de qué rutas del modelo dependen
+en Meta.dependencias del serializador; si un campo pedido no se puede
+resolver, la consulta no se recorta (la salida sí).
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+
+PARAMETRO_CAMPOS = 'fields'
+PARAMETRO_EXCLUIR = 'exclude'
+
+
+def _lista(valor):
+    return [nombre.strip() for nombre in (valor or '').split(',') if nombre.strip()]
+
+
+def campos_legibles(serializer):
+    """Nombres de los campos que aparecen en la salida del serializador"""
+    return [nombre for nombre, campo in serializer.fields.items() if not campo.write_only]
+
+
+def rutas_de_campos(modelo, serializer, campos):
+    """
+    Traduce los campos del serializador a (rutas para only(), relaciones para
+    select_related, relaciones para prefetch_related), o None si algún campo
+    no se puede resolver a columnas del modelo
+    """
+    dependencias = getattr(getattr(serializer, 'Meta', None), 'dependencias', {})
+    rutas, relaciones, prefetch = set(), set(), set()
+    for nombre in campos:
+        if nombre in dependencias:
+            fuentes = [ruta.split('__') for ruta in dependencias[nombre]]
+        elif nombre in serializer.fields and serializer.fields[nombre].source != '*':
+            fuentes = [serializer.fields[nombre].source.split('.')]
+        else:
+            return None
+        for partes in fuentes:
+            try:
+                campo = modelo._meta.get_field(partes[0])
+            except FieldDoesNotExist:
+                return None
+            if campo.many_to_many or campo.one_to_many:
+                prefetch.add(partes[0])
+            elif len(partes) == 1:
+                rutas.add(partes[0])
+            elif len(partes) == 2 and campo.is_relation:
+                try:
+                    campo.related_model._meta.get_field(partes[1])
+                except FieldDoesNotExist:
+                    return None
+                relaciones.add(partes[0])
+                rutas.update((partes[0], f'{partes[0]}__{partes[1]}'))
+            else:
+                return None
+    return rutas, relaciones, prefetch
+
+
+class CamposSerializerMixin:
+    """
+    Serializador que, si el contexto trae 'campos', solo incluye esos campos
+    en la salida (los de solo escritura no se tocan)
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        campos = self.context.get('campos')
+        if campos is not None:
+            for nombre in campos_legibles(self):
+                if nombre not in campos:
+                    self.fields.pop(nombre)
+
+
+class CamposViewMixin:
+    """
+    ViewSet con ?fields= / ?exclude= en las peticiones de lectura: recorta el
+    serializador (contexto 'campos') y la consulta de get_queryset.
+    campos_siempre son columnas que la vista necesita aunque no se muestren
+    (p.ej. la clave de la paginación por cursor).
+    """
+    campos_siempre = ()
+
+    def campos_solicitados(self):
+        """Conjunto de campos pedidos o None si se piden todos"""
+        if not hasattr(self, '_campos_solicitados'):
+            # Mientras se calcula, el serializador de referencia lleva todos los campos
+            self._campos_solicitados = None
+            self._campos_solicitados = self._leer_campos()
+        return self._campos_solicitados
+
+    def _leer_campos(self):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return None
+        incluir = _lista(self.request.query_params.get(PARAMETRO_CAMPOS))
+        excluir = _lista(self.request.query_params.get(PARAMETRO_EXCLUIR))
+        if not incluir and not excluir:
+            return None
+        self._referencia = self.get_serializer()
+        disponibles = campos_legibles(self._referencia)
+        for parametro, nombres in ((PARAMETRO_CAMPOS, incluir), (PARAMETRO_EXCLUIR, excluir)):
+            desconocidos = [nombre for nombre in nombres if nombre not in disponibles]
+            if desconocidos:
+                raise ValidationError({parametro: (
+                    f"Campos desconocidos: {', '.join(desconocidos)}. "
+                    f"Disponibles: {', '.join(disponibles)}"
+                )})
+        return set(incluir or disponibles) - set(excluir)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['campos'] = self.campos_solicitados()
+        return context
+
+    def get_queryset(self):
+        return self.podar(super().get_queryset())
+
+    def podar(self, queryset):
+        """Limita columnas, JOIN y prefetch de queryset a los campos solicitados"""
+        campos = self.campos_solicitados()
+        if campos is None:
+            return queryset
+        resultado = rutas_de_campos(queryset.model, self._referencia, campos)
+        if resultado is None:
+            return queryset
+        rutas, relaciones, prefetch = resultado
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if relaciones:
+            queryset = queryset.select_related(*relaciones)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset.only(queryset.model._meta.pk.name, *self.campos_siempre, *rutas)
@@ -0,0 +1,123 @@
+"""
+GET condicional (ETag / Last-Modified) para los catálogos: departamentos,
+sensores y barreras
+
+El validador de una respuesta se calcula con una sola consulta de agregados
+sobre las filas que la componen (el queryset filtrado, sin paginar): la
+última fecha_actualizacion y el número de filas del modelo y de las tablas
+relacionadas cuyos datos aparecen en la respuesta (departamento_nombre,
+usuario_nombre, totales...). Si el cliente ya tiene esa versión
+(If-None-Match / If-Modified-Since) se responde 304 sin serializar nada.
+
+Las altas y modificaciones cambian la última fecha y las bajas el número de
+filas, así que solo If-None-Match detecta también las bajas; If-Modified-Since
+tiene además la resolución de un segundo de las cabeceras HTTP.
+"""
+import hashlib
+
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .models import Barrera, Departamento, Sensor
+
+
+def _por_departamento(modelo, agregado):
+    """Agregado correlacionado de las filas de modelo de cada departamento"""
+    return Subquery(
+        modelo.objects.filter(departamento=OuterRef('pk'))
+        .order_by().values('departamento').annotate(valor=agregado).values('valor')
+    )
+
+
+# Anotaciones por fila previas a los agregados. Sensores y barreras de cada
+# departamento van en subconsultas separadas: dos JOIN multiplicarían las
+# filas sensores × barreras de cada departamento
+ANOTACIONES = {
+    Departamento: {
+        'depto_ultima_sensores': _por_departamento(Sensor, Max('fecha_actualizacion')),
+        'depto_num_sensores': _por_departamento(Sensor, Count('pk')),
+        'depto_ultima_barreras': _por_departamento(Barrera, Max('fecha_actualizacion')),
+        'depto_num_barreras': _por_departamento(Barrera, Count('pk')),
+    },
+}
+
+# Agregados del validador por modelo (las relaciones directas son a uno)
+VALIDADORES = {
+    Departamento: {
+        'ultima_departamentos': Max('fecha_actualizacion'),
+        'num_departamentos': Count('pk'),
+        'ultima_sensores': Max('depto_ultima_sensores'),
+        'num_sensores': Sum('depto_num_sensores'),
+        'ultima_barreras': Max('depto_ultima_barreras'),
+        'num_barreras': Sum('depto_num_barreras'),
+    },
+    Sensor: {
+        'ultima_sensores': Max('fecha_actualizacion'),
+        'num_sensores': Count('pk'),
+        'ultima_departamentos': Max('departamento__fecha_actualizacion'),
+        'ultima_usuarios': Max('usuario_asignado__fecha_actualizacion'),
+        # Al eliminar un usuario sus sensores quedan sin asignar sin cambiar de fecha
+        'num_usuarios': Count('usuario_asignado'),
+    },
+    Barrera: {
+        'ultima_barreras': Max('fecha_actualizacion'),
+        'num_barreras': Count('pk'),
+        'ultima_departamentos': Max('departamento__fecha_actualizacion'),
+    },
+}
+
+
+def validador(queryset):
+    """(ETag, última modificación o None) de las filas de queryset"""
+    valores = (
+        queryset.order_by().annotate(**ANOTACIONES.get(queryset.model, {}))
+        .aggregate(**VALIDADORES[queryset.model])
+    )
+    resumen = repr(sorted(valores.items())).encode()
+    etag = f'"{queryset.model._meta.model_name}-{hashlib.md5(resumen, usedforsecurity=False).hexdigest()}"'
+    fechas = [valor for valor in valores.values() if hasattr(valor, 'timestamp')]
+    return etag, max(fechas) if fechas else None
+
+
+class GetCondicionalMixin:
+    """
+    ViewSet de catálogo con GET condicional en list y retrieve; las acciones
+    de lectura llaman a self.condicional(queryset) antes de serializar
+    """
+
+    def queryset_validador(self):
+        """Filas de las que depende la respuesta (sin paginar)"""
+        return self.filter_queryset(self.get_queryset())
+
+    def condicional(self, queryset):
+        """
+        Respuesta 304 si el cliente ya tiene la versión de queryset o None; en
+        ese caso ETag y Last-Modified se añaden a la respuesta de la vista
+        """
+        etag, ultima = validador(queryset)
+        self.cabeceras_validador = {'ETag': etag}
+        if ultima is not None:
+            self.cabeceras_validador['Last-Modified'] = http_date(ultima.timestamp())
+        respuesta = get_conditional_response(
+            self.request, etag=etag, last_modified=ultima and int(ultima.timestamp())
+        )
+        if respuesta is not None:
+            for cabecera, valor in self.cabeceras_validador.items():
+                respuesta[cabecera] = valor
+        return respuesta
+
+    def list(self, request, *args, **kwargs):
+        return self.condicional(self.queryset_validador()) or super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.queryset_validador().filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return self.condicional(queryset) or super().retrieve(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if 200 <= response.status_code < 300:
+            for cabecera, valor in getattr(self, 'cabeceras_validador', {}).items():
+                response.setdefault(cabecera, valor)
+        return response
@@ -0,0 +1,54 @@
+from django.conf import settings
+
+
+# Valores por defecto de la configuración SMARTCONNECT (ver settings.py)
+DEFAULTS = {
+    # Caché de autorización de sensores (endpoint de acceso)
+    'SENSOR_CACHE_ENABLED': True,
+    'SENSOR_CACHE_ALIAS': 'default',
+    'SENSOR_CACHE_TIMEOUT': 300,
+    'SENSOR_CACHE_NEGATIVE_TIMEOUT': 30,
+    'SENSOR_CACHE_PRECALENTAR': False,
+    # Ventana (segundos) para fusionar denegaciones repetidas de UIDs no registrados; 0 la desactiva
+    'DENEGACION_VENTANA': 60,
+    # Número máximo de accesos por lote en /api/acceso/sensor/batch/
+    'ACCESO_LOTE_MAX_ITEMS': 500,
+    # Máximo de cambios por respuesta de /api/sensores/allowlist/delta/
+    'ALLOWLIST_DELTA_MAX': 5000,
+    'ALLOWLIST_DELTA_RELECTURA': 60,
+    # Días de historial de CambioSensor que se conservan (ver api/allowlist.py)
+    'ALLOWLIST_RETENCION_DIAS': 30,
+    # Tamaño máximo de página (?page_size=) en /api/eventos/
+    'EVENTOS_PAGE_SIZE_MAX': 1000,
+    # Serialización rápida de listados de solo lectura (ver api/rapido.py)
+    'SERIALIZACION_RAPIDA': False,
+    # Caché de respuestas de lectura (ver api/respuestas.py)
+    'RESPUESTAS_CACHE_ENABLED': True,
+    'RESPUESTAS_CACHE_ALIAS': 'respuestas',
+    'RESPUESTAS_CACHE_TIMEOUT': 300,
+    # Retención de eventos (ver api/retencion.py y podar_eventos)
+    'EVENTOS_RETENCION_MESES': None,
+    'EVENTOS_ARCHIVO_DIR': None,
+    # Ingesta de eventos diferidos /api/eventos/ingesta/ (ver api/ingesta.py)
+    'EVENTOS_INGESTA_LOTE': 1000,
+    'EVENTOS_INGESTA_MAX_LINEAS': 100000,
+    # Importación de sensores (ver api/importacion.py)
+    'SENSORES_IMPORTACION_LOTE': 1000,
+    # Feed en vivo /api/eventos/en-vivo/ (ver api/feed.py)
+    'EVENTOS_FEED_RECIENTES': 1000,
+    'EVENTOS_FEED_SONDEO': 1.0,
+    'EVENTOS_FEED_LATIDO': 15,
+    'EVENTOS_FEED_TICKET_TTL': 30,
+    # Escritura de eventos por tipo: 'SINCRONO' o 'BUFFER' (ver api/buffer.py)
+    'EVENTO_ESCRITURA': {},
+    'EVENTO_BUFFER_MAX': 10000,
+    'EVENTO_BUFFER_LOTE': 200,
+    'EVENTO_BUFFER_INTERVALO': 1.0,
+}
+
+
+def smartconnect_setting(nombre):
+    """
+    Obtiene un ajuste del diccionario SMARTCONNECT o su valor por defecto
+    """
+    return getattr(settings, 'SMARTCONNECT', {}).get(nombre, DEFAULTS[nombre])
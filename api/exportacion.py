@@ -0,0 +1,63 @@
+"""
+Exportación de eventos en streaming (NDJSON o CSV)
+
+Las filas se leen con QuerySet.iterator(chunk_size) y se escriben una a una
+en un StreamingHttpResponse, así que la memoria no depende del tamaño de la
+exportación.
+"""
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from .serializers import EventoSerializer
+
+
+FORMATOS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+TAMANO_BLOQUE = 2000
+
+
+class _Eco:
+    """Pseudo-fichero para csv.writer: devuelve la línea en lugar de guardarla"""
+    def write(self, valor):
+        return valor
+
+
+def _eventos(queryset, campos):
+    for evento in queryset.iterator(chunk_size=TAMANO_BLOQUE):
+        yield EventoSerializer(evento, context={'campos': campos}).data
+
+
+def lineas_ndjson(queryset, campos=None):
+    for fila in _eventos(queryset, campos):
+        yield json.dumps(fila, cls=JSONEncoder, ensure_ascii=False) + '\n'
+
+
+def lineas_csv(queryset, campos=None):
+    columnas = [columna for columna in EventoSerializer.Meta.fields if campos is None or columna in campos]
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(columnas)
+    for fila in _eventos(queryset, campos):
+        yield escritor.writerow([
+            json.dumps(fila.get(columna), cls=JSONEncoder, ensure_ascii=False)
+            if columna == 'metadata' else fila.get(columna)
+            for columna in columnas
+        ])
+
+
+def respuesta_exportacion(queryset, formato, campos=None):
+    """
+    StreamingHttpResponse con los eventos del queryset en el formato pedido
+    (solo con los campos indicados, ver api/campos.py)
+    """
+    if formato not in FORMATOS:
+        raise ValidationError({'formato': f'Formato no soportado: {formato}. Use {" o ".join(FORMATOS)}'})
+    lineas = lineas_ndjson(queryset, campos) if formato == 'ndjson' else lineas_csv(queryset, campos)
+    respuesta = StreamingHttpResponse(lineas, content_type=f'{FORMATOS[formato]}; charset=utf-8')
+    respuesta['Content-Disposition'] = f'attachment; filename="eventos.{formato}"'
+    return respuesta
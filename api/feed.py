@@ -0,0 +1,224 @@
+"""
+Publicador en proceso para el feed en vivo de eventos (Server-Sent Events)
+
+Cada evento escrito (api/buffer.py) se serializa una sola vez tras el commit
+y se reparte a todos los suscriptores del proceso, cada uno con su cola
+asyncio. Los últimos EVENTOS_FEED_RECIENTES mensajes se conservan para
+reanudar con Last-Event-ID sin consultar la base de datos.
+
+Con varios workers, cada proceso solo ve en el momento sus propias
+escrituras; mientras haya suscriptores, un hilo por proceso consulta cada
+EVENTOS_FEED_SONDEO segundos los eventos nuevos (una consulta por proceso,
+no por cliente) y publica los que aún no haya visto.
+
+EventSource no permite cabeceras: en lugar del JWT en la URL (quedaría en
+los logs de acceso), el cliente pide con su JWT un ticket de un solo uso
+(emitir_ticket), válido EVENTOS_FEED_TICKET_TTL segundos y solo para abrir
+el feed, y lo pasa en ?ticket=. Se guarda en la caché 'default', compartida
+entre workers, porque el worker que lo emite no suele ser el que lo canjea.
+"""
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.db import close_old_connections
+from django.db.models import Max
+
+from .conf import smartconnect_setting
+from .models import Evento
+from .renderers import ORJSONRenderer
+from .serializers import EventoSerializer
+
+
+logger = logging.getLogger(__name__)
+
+# Ids hacia atrás que se vuelven a mirar en cada sondeo: una transacción de
+# otro worker puede confirmar un id menor después de uno mayor
+VENTANA_SONDEO = 200
+PREFIJO_TICKET = 'smartconnect:feed-ticket:'
+
+
+class Mensaje:
+    """Evento ya formateado como mensaje SSE"""
+    __slots__ = ('id', 'tipo', 'departamento_id', 'texto')
+
+    def __init__(self, evento):
+        self.id = evento.pk
+        self.tipo = evento.tipo
+        self.departamento_id = evento.departamento_id
+        datos = ORJSONRenderer().render(EventoSerializer(evento).data).decode()
+        self.texto = f'id: {evento.pk}\nevent: evento\ndata: {datos}\n\n'
+
+
+class Suscripcion:
+    """Cola de un cliente conectado, alimentada desde cualquier hilo"""
+
+    def __init__(self, cola, loop, filtro=None):
+        self.cola = cola
+        self.loop = loop
+        self.filtro = filtro
+        self.desbordada = False
+
+    def entregar(self, mensajes):
+        self.loop.call_soon_threadsafe(self._poner, mensajes)
+
+    def _poner(self, mensajes):
+        if self.desbordada:
+            return
+        for mensaje in mensajes:
+            if self.filtro is not None and not self.filtro(mensaje):
+                continue
+            if self.cola.qsize() >= smartconnect_setting('EVENTOS_FEED_RECIENTES'):
+                # Cliente demasiado lento: se cierra el flujo y reanuda con Last-Event-ID
+                self.desbordada = True
+                self.cola.put_nowait(None)
+                return
+            self.cola.put_nowait(mensaje)
+
+
+class PublicadorEventos:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscriptores = set()
+        self._recientes = OrderedDict()
+        self._inicio_sondeo = None
+        self._ultimo_sondeado = None
+        self._hilo = None
+        self._pid = None
+
+    def publicar(self, eventos):
+        """Formatea una vez los eventos nuevos y los entrega a todos los suscriptores"""
+        maximo = smartconnect_setting('EVENTOS_FEED_RECIENTES')
+        eventos = [evento for evento in eventos if evento.pk is not None]
+        with self._lock:
+            if not self._suscriptores:
+                # Sin clientes conectados no se serializa nada; la reanudación va a la base de datos
+                return
+            pendientes = [evento for evento in eventos if evento.pk not in self._recientes]
+        # La serialización, fuera del lock: no detiene suscripciones, reanudaciones ni otros publicadores
+        formateados = [Mensaje(evento) for evento in pendientes]
+        mensajes = []
+        with self._lock:
+            for mensaje in formateados:
+                if mensaje.id in self._recientes:
+                    # Ya publicado entretanto desde otro hilo (buffer o sondeo)
+                    continue
+                self._recientes[mensaje.id] = mensaje
+                mensajes.append(mensaje)
+            while len(self._recientes) > maximo:
+                self._recientes.popitem(last=False)
+            suscriptores = list(self._suscriptores)
+        if mensajes:
+            for suscripcion in suscriptores:
+                suscripcion.entregar(mensajes)
+
+    def suscribir(self, suscripcion):
+        with self._lock:
+            self._suscriptores.add(suscripcion)
+        self._asegurar_hilo()
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscriptores.discard(suscripcion)
+
+    def desde(self, ultimo_id):
+        """
+        Mensajes publicados después de ultimo_id, en orden de publicación, o
+        None si ultimo_id ya no está entre los recientes
+        """
+        with self._lock:
+            if ultimo_id not in self._recientes:
+                return None
+            ids = list(self._recientes)
+            return [self._recientes[pk] for pk in ids[ids.index(ultimo_id) + 1:]]
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'suscriptores': len(self._suscriptores),
+                'recientes': len(self._recientes),
+            }
+
+    def _asegurar_hilo(self):
+        if not smartconnect_setting('EVENTOS_FEED_SONDEO'):
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._hilo is not None and self._hilo.is_alive():
+                return
+            self._pid = os.getpid()
+            self._hilo = threading.Thread(target=self._sondear, name='smartconnect-feed', daemon=True)
+            self._hilo.start()
+
+    def _sondear(self):
+        # El hilo termina cuando no quedan suscriptores; el siguiente lo vuelve a crear
+        while True:
+            time.sleep(smartconnect_setting('EVENTOS_FEED_SONDEO'))
+            with self._lock:
+                if not self._suscriptores:
+                    self._hilo = None
+                    self._inicio_sondeo = self._ultimo_sondeado = None
+                    return
+            close_old_connections()
+            try:
+                if self._ultimo_sondeado is None:
+                    # Lo anterior a la primera suscripción no se publica (se obtiene reanudando)
+                    maximo = Evento.objects.aggregate(maximo=Max('id'))['maximo'] or 0
+                    self._inicio_sondeo = self._ultimo_sondeado = maximo
+                    continue
+                # Solo ids (índice de la clave primaria); las filas completas, solo de los no vistos
+                ids = list(
+                    Evento.objects
+                    .filter(id__gt=max(self._inicio_sondeo, self._ultimo_sondeado - VENTANA_SONDEO))
+                    .order_by('id').values_list('id', flat=True)[:smartconnect_setting('EVENTOS_FEED_RECIENTES')]
+                )
+                if not ids:
+                    continue
+                self._ultimo_sondeado = max(self._ultimo_sondeado, ids[-1])
+                with self._lock:
+                    nuevos = [pk for pk in ids if pk not in self._recientes]
+                if nuevos:
+                    self.publicar(
+                        Evento.objects.select_related('sensor', 'barrera', 'usuario_accion')
+                        .filter(id__in=nuevos).order_by('id')
+                    )
+            except Exception:
+                logger.exception('Error al sondear eventos nuevos para el feed en vivo')
+            finally:
+                close_old_connections()
+
+
+publicador = PublicadorEventos()
+
+
+def mensajes_desde_bd(ultimo_id, limite):
+    """Eventos con id mayor que ultimo_id (reanudación fuera de los recientes)"""
+    eventos = (
+        Evento.objects.select_related('sensor', 'barrera', 'usuario_accion')
+        .filter(id__gt=ultimo_id).order_by('id')[:limite]
+    )
+    return [Mensaje(evento) for evento in eventos]
+
+
+def emitir_ticket(usuario):
+    """Ticket de un solo uso para abrir el feed en vivo como usuario"""
+    ticket = secrets.token_urlsafe(32)
+    caches['default'].set(PREFIJO_TICKET + ticket, usuario.pk, smartconnect_setting('EVENTOS_FEED_TICKET_TTL'))
+    return ticket
+
+
+async def acanjear_ticket(ticket):
+    """
+    Id del usuario del ticket, que queda consumido; None si no existe, caducó
+    o ya se usó (de dos canjes simultáneos solo uno logra eliminarlo)
+    """
+    cache = caches['default']
+    clave = PREFIJO_TICKET + ticket
+    usuario_id = await cache.aget(clave)
+    if usuario_id is None or not await cache.adelete(clave):
+        return None
+    return usuario_id
@@ -0,0 +1,111 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+def interpretar_fecha(valor, parametro, fin=False):
+    """
+    Interpreta una fecha (AAAA-MM-DD) o fecha y hora ISO 8601. Una fecha sin
+    hora como límite final abarca el día completo.
+    Devuelve (datetime, inclusivo).
+    """
+    try:
+        # La fecha sola primero: parse_datetime también acepta AAAA-MM-DD (como las 00:00)
+        fecha = parse_date(valor)
+        if fecha is not None:
+            fecha_hora = datetime.combine(fecha + timedelta(days=1) if fin else fecha, time.min)
+            inclusivo = not fin
+        else:
+            fecha_hora = parse_datetime(valor)
+            if fecha_hora is None:
+                raise ValueError
+            inclusivo = True
+    except ValueError:
+        raise ValidationError({parametro: f'Fecha inválida: {valor}. Use AAAA-MM-DD o ISO 8601'})
+    if timezone.is_naive(fecha_hora):
+        fecha_hora = timezone.make_aware(fecha_hora)
+    return fecha_hora, inclusivo
+
+
+def _entero(query_params, parametro):
+    valor = query_params.get(parametro)
+    if not valor:
+        return None
+    try:
+        return int(valor)
+    except ValueError:
+        raise ValidationError({parametro: f'Debe ser un id numérico: {valor}'})
+
+
+def filtrar_eventos(queryset, query_params):
+    """
+    Filtros comunes de eventos: ?desde=, ?hasta=, ?tipo=, ?sensor=, ?barrera=
+    y ?departamento= (Evento.departamento, fijado al registrar el evento).
+    Los límites sobre fecha_hora recorren solo ese rango de los índices que
+    terminan en fecha_hora.
+    """
+    desde = query_params.get('desde')
+    if desde:
+        fecha_hora, _ = interpretar_fecha(desde, 'desde')
+        queryset = queryset.filter(fecha_hora__gte=fecha_hora)
+    hasta = query_params.get('hasta')
+    if hasta:
+        fecha_hora, inclusivo = interpretar_fecha(hasta, 'hasta', fin=True)
+        queryset = queryset.filter(**{'fecha_hora__lte' if inclusivo else 'fecha_hora__lt': fecha_hora})
+    tipo = query_params.get('tipo')
+    if tipo:
+        queryset = queryset.filter(tipo=tipo)
+    for campo in ('sensor', 'barrera', 'departamento'):
+        valor = _entero(query_params, campo)
+        if valor is not None:
+            queryset = queryset.filter(**{f'{campo}_id': valor})
+    return queryset
+
+
+def filtrar_sensores(queryset, query_params):
+    """
+    Filtros de sensores: ?estado=, ?departamento= (departamento principal),
+    ?usuario= (usuario asignado), ?uid= (exacto, normalizado como
+    Sensor.clean) y ?nombre= (contiene). Estado y departamento recorren los
+    índices (estado, fecha_creacion) y (departamento, fecha_creacion) en el
+    orden por defecto.
+    """
+    estado = query_params.get('estado')
+    if estado:
+        queryset = queryset.filter(estado=estado.upper())
+    for parametro, campo in (('departamento', 'departamento_id'), ('usuario', 'usuario_asignado_id')):
+        valor = _entero(query_params, parametro)
+        if valor is not None:
+            queryset = queryset.filter(**{campo: valor})
+    uid = query_params.get('uid')
+    if uid:
+        queryset = queryset.filter(uid=uid.strip().upper())
+    nombre = query_params.get('nombre')
+    if nombre:
+        queryset = queryset.filter(nombre__icontains=nombre.strip())
+    return queryset
+
+
+def filtrar_resumenes(queryset, query_params):
+    """
+    Los mismos filtros sobre ResumenEventoHora. El resumen es por horas: desde
+    incluye la hora completa en la que cae.
+    """
+    desde = query_params.get('desde')
+    if desde:
+        fecha_hora, _ = interpretar_fecha(desde, 'desde')
+        queryset = queryset.filter(hora__gte=fecha_hora.replace(minute=0, second=0, microsecond=0))
+    hasta = query_params.get('hasta')
+    if hasta:
+        fecha_hora, inclusivo = interpretar_fecha(hasta, 'hasta', fin=True)
+        queryset = queryset.filter(**{'hora__lte' if inclusivo else 'hora__lt': fecha_hora})
+    tipo = query_params.get('tipo')
+    if tipo:
+        queryset = queryset.filter(tipo=tipo)
+    for campo in ('sensor', 'barrera', 'departamento'):
+        valor = _entero(query_params, campo)
+        if valor is not None:
+            queryset = queryset.filter(**{campo: valor})
+    return queryset
@@ -0,0 +1,210 @@
+"""
+Importación en bloque de sensores desde CSV o NDJSON
+(POST /api/sensores/importar/ y python manage.py importar_sensores)
+
+Cada fila es un sensor; el departamento y los adicionales se indican por
+nombre y el usuario asignado por username:
+    uid,nombre,estado,departamento,departamentos_adicionales,usuario,descripcion
+    abc123,Tarjeta Ana,ACTIVO,Oficina Central,Bodega|Recepción,ana,
+En NDJSON, un objeto por línea con las mismas claves (departamentos_adicionales
+como lista).
+
+El fichero se lee fila a fila y se procesa por tramos de
+SENSORES_IMPORTACION_LOTE filas. Los UIDs se normalizan como en Sensor.clean
+y los repetidos dentro del fichero se rechazan sin consultar. Por tramo hay
+una consulta uid__in contra los sensores existentes, una de departamentos y
+otra de usuarios (solo los nombres aún no resueltos) y, en una transacción,
+un bulk_create de sensores, otro de departamentos adicionales y otro de
+CambioSensor. Las filas con errores se informan con su número de línea sin
+interrumpir el resto del fichero.
+
+bulk_create no envía señales: aquí se invalida la caché de autorización
+(los UIDs pudieron quedar cacheados como no registrados) y se anotan los
+CambioSensor de la allowlist incremental. La caché de respuestas la invalida
+CatalogoQuerySet.bulk_create.
+"""
+import codecs
+import csv
+import json
+
+from django.db import IntegrityError, transaction
+
+from . import cache
+from .conf import smartconnect_setting
+from .models import CambioSensor, Departamento, Sensor, Usuario
+from .serializers import SensorImportacionSerializer
+
+
+FORMATOS = ('csv', 'ndjson')
+# Separador de departamentos_adicionales en CSV
+SEPARADOR = '|'
+
+
+def _error(linea, mensaje, detalles=None, uid=None):
+    error = {'linea': linea}
+    if uid is not None:
+        error['uid'] = uid
+    error['error'] = {'code': 400, 'message': mensaje, 'details': detalles or {}}
+    return error
+
+
+def _filas_csv(stream):
+    """(numero_linea, datos, None) por cada fila; la primera línea es la cabecera"""
+    lector = csv.DictReader(codecs.getreader('utf-8-sig')(stream))
+    for fila in lector:
+        datos = {
+            clave.strip(): valor.strip() for clave, valor in fila.items()
+            if clave is not None and isinstance(valor, str) and valor.strip()
+        }
+        if 'departamentos_adicionales' in datos:
+            datos['departamentos_adicionales'] = [
+                nombre.strip() for nombre in datos['departamentos_adicionales'].split(SEPARADOR) if nombre.strip()
+            ]
+        if datos:
+            yield lector.line_num, datos, None
+
+
+def _filas_ndjson(stream):
+    """(numero_linea, datos o None, error o None) por cada línea no vacía"""
+    for numero, linea in enumerate(stream, start=1):
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            datos = json.loads(linea)
+        except ValueError as exc:
+            yield numero, None, _error(numero, f'JSON parse error - {exc}')
+            continue
+        if not isinstance(datos, dict):
+            yield numero, None, _error(numero, 'Cada línea debe ser un objeto JSON')
+            continue
+        yield numero, datos, None
+
+
+def _leer(filas):
+    """Valida cada fila con SensorImportacionSerializer"""
+    for numero, datos, error in filas:
+        if error is not None:
+            yield numero, None, error
+            continue
+        serializer = SensorImportacionSerializer(data=datos)
+        if serializer.is_valid():
+            yield numero, serializer.validated_data, None
+        else:
+            uid = datos.get('uid')
+            yield numero, None, _error(numero, 'Error de validación', {
+                campo: [str(error) for error in errores] for campo, errores in serializer.errors.items()
+            }, uid.strip().upper() if isinstance(uid, str) else None)
+
+
+def _resolver(modelo, campo, nombres, resueltos):
+    """Completa resueltos ({nombre: pk}) con una sola consulta de los nombres que falten"""
+    faltan = set(nombres) - resueltos.keys()
+    if faltan:
+        resueltos.update(modelo.objects.filter(**{f'{campo}__in': faltan}).values_list(campo, 'pk'))
+
+
+def _referencias(datos, existentes, departamentos, usuarios):
+    """Errores de la fila que dependen de la base de datos ({campo: [mensajes]})"""
+    errores = {}
+    if datos['uid'] in existentes:
+        errores['uid'] = ['Ya existe un sensor con este UID.']
+    if datos['departamento'] not in departamentos:
+        errores['departamento'] = [f'No existe el departamento "{datos["departamento"]}".']
+    faltan = [nombre for nombre in datos.get('departamentos_adicionales', ()) if nombre not in departamentos]
+    if faltan:
+        errores['departamentos_adicionales'] = [f'No existe el departamento "{nombre}".' for nombre in faltan]
+    if datos.get('usuario') and datos['usuario'] not in usuarios:
+        errores['usuario'] = [f'No existe el usuario "{datos["usuario"]}".']
+    return errores
+
+
+def _sensor(datos, departamentos, usuarios):
+    return Sensor(
+        uid=datos['uid'],
+        nombre=datos['nombre'],
+        descripcion=datos.get('descripcion') or None,
+        estado=datos['estado'],
+        departamento_id=departamentos[datos['departamento']],
+        usuario_asignado_id=usuarios.get(datos['usuario']) if datos.get('usuario') else None,
+    )
+
+
+def _escribir_tramo(tramo, departamentos, usuarios):
+    """Crea los sensores válidos de un tramo [(linea, datos)]; devuelve (creados, errores)"""
+    _resolver(Departamento, 'nombre', (
+        nombre for _, datos in tramo
+        for nombre in (datos['departamento'], *datos.get('departamentos_adicionales', ()))
+    ), departamentos)
+    _resolver(Usuario, 'username', (datos['usuario'] for _, datos in tramo if datos.get('usuario')), usuarios)
+    for intento in range(2):
+        existentes = set(
+            Sensor.objects.filter(uid__in=[datos['uid'] for _, datos in tramo]).values_list('uid', flat=True)
+        )
+        errores = []
+        validas = []
+        for numero, datos in tramo:
+            detalles = _referencias(datos, existentes, departamentos, usuarios)
+            if detalles:
+                errores.append(_error(numero, 'Error de validación', detalles, datos['uid']))
+            else:
+                validas.append(datos)
+        if not validas:
+            return 0, errores
+        try:
+            with transaction.atomic():
+                sensores = Sensor.objects.bulk_create([_sensor(datos, departamentos, usuarios) for datos in validas])
+                Adicional = Sensor.departamentos_adicionales.through
+                Adicional.objects.bulk_create([
+                    Adicional(sensor_id=sensor.pk, departamento_id=departamentos[nombre])
+                    for sensor, datos in zip(sensores, validas)
+                    for nombre in dict.fromkeys(datos.get('departamentos_adicionales', ()))
+                ])
+                CambioSensor.objects.bulk_create([CambioSensor(uid=sensor.uid) for sensor in sensores])
+            cache.invalidar_uids([sensor.uid for sensor in sensores])
+            return len(sensores), errores
+        except IntegrityError:
+            # Otro proceso creó alguno de los UIDs entre la consulta y el INSERT
+            if intento:
+                raise
+
+
+def importar_sensores(stream, formato='csv'):
+    """
+    Importa los sensores de un flujo binario CSV o NDJSON (sin cargarlo entero
+    en memoria) y devuelve el informe: líneas leídas, sensores creados y
+    errores por línea
+    """
+    tamano_tramo = smartconnect_setting('SENSORES_IMPORTACION_LOTE')
+    filas = _filas_csv(stream) if formato == 'csv' else _filas_ndjson(stream)
+    informe = {'lineas': 0, 'creados': 0, 'rechazados': 0, 'errores': []}
+    vistos = {}
+    departamentos = {}
+    usuarios = {}
+    tramo = []
+
+    def vaciar():
+        creados, errores = _escribir_tramo(tramo, departamentos, usuarios)
+        informe['creados'] += creados
+        informe['errores'].extend(errores)
+        tramo.clear()
+
+    for numero, datos, error in _leer(filas):
+        informe['lineas'] = numero
+        if error is None and datos['uid'] in vistos:
+            error = _error(numero, 'Error de validación', {
+                'uid': [f'UID repetido en el fichero (línea {vistos[datos["uid"]]}).']
+            }, datos['uid'])
+        if error is not None:
+            informe['errores'].append(error)
+            continue
+        vistos[datos['uid']] = numero
+        tramo.append((numero, datos))
+        if len(tramo) >= tamano_tramo:
+            vaciar()
+    if tramo:
+        vaciar()
+
+    informe['errores'].sort(key=lambda error: error['linea'])
+    informe['rechazados'] = len(informe['errores'])
+    return informe
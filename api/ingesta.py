@@ -0,0 +1,163 @@
+"""
+Ingesta en bloque de eventos registrados sin conexión por los lectores
+(POST /api/eventos/ingesta/, NDJSON)
+
+Cada línea es un acceso con su hora original y la decisión que tomó el
+lector (acceso_permitido, o tipo ACCESO_PERMITIDO/ACCESO_DENEGADO):
+    {"id": "LECTOR-07:000123", "uid": "ABC123", "fecha_hora": "2025-06-01T08:15:00Z",
+     "departamento_id": 3, "acceso_permitido": true}
+
+Se guarda esa decisión, no la que tomaría ahora el servidor: el estado del
+sensor (y sus departamentos) pudo cambiar desde el acceso. De la autorización
+actual solo salen el sensor, el departamento y los parámetros de la
+descripción.
+
+El cuerpo se lee línea a línea y se procesa por tramos de EVENTOS_INGESTA_LOTE
+líneas: una sola consulta de UIDs (obtener_autorizaciones) y una de
+duplicados por tramo, y un bulk_create en una transacción por tramo
+(escribir_eventos, que también suma los resúmenes por hora). Si la petición
+falla a mitad, los tramos ya confirmados no se repiten al reenviar el fichero:
+un evento con el mismo id que uno existente es un duplicado.
+"""
+import gzip
+import itertools
+import json
+
+from django.db import IntegrityError
+
+from .acceso import evento_acceso
+from .buffer import escribir_eventos
+from .cache import obtener_autorizaciones
+from .conf import smartconnect_setting
+from .models import Evento
+from .serializers import EventoIngestaSerializer
+
+
+def abrir(stream, content_encoding=None):
+    """Cuerpo de la petición como flujo binario, descomprimido si llega con gzip"""
+    if content_encoding == 'gzip':
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+def _error(linea, mensaje, detalles=None, id_origen=None):
+    error = {'linea': linea}
+    if id_origen is not None:
+        error['id'] = id_origen
+    error['error'] = {'code': 400, 'message': mensaje, 'details': detalles or {}}
+    return error
+
+
+def _leer(lineas):
+    """Genera (numero_linea, datos validados o None, error o None) por cada línea no vacía"""
+    for numero, linea in lineas:
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            datos = json.loads(linea)
+        except ValueError as exc:
+            yield numero, None, _error(numero, f'JSON parse error - {exc}')
+            continue
+        if not isinstance(datos, dict):
+            yield numero, None, _error(numero, 'Cada línea debe ser un objeto JSON')
+            continue
+        serializer = EventoIngestaSerializer(data=datos)
+        if serializer.is_valid():
+            yield numero, serializer.validated_data, None
+        else:
+            yield numero, None, _error(numero, 'Error de validación', {
+                campo: [str(error) for error in errores] for campo, errores in serializer.errors.items()
+            }, datos.get('id'))
+
+
+def _existentes(tramo):
+    """id_origen del tramo que ya están registrados (índice evento_origen_uniq)"""
+    return set(
+        Evento.objects
+        .filter(id_origen__in={datos['id'] for datos in tramo})
+        .values_list('id_origen', flat=True)
+    )
+
+
+def _codigo(acceso_permitido, registrado):
+    if acceso_permitido:
+        return 'ACCESO' if registrado else 'ACCESO_SIN_REGISTRO'
+    return 'DENEGADO_LECTOR' if registrado else 'UID_DESCONOCIDO'
+
+
+def _construir(tramo, autorizaciones):
+    eventos = []
+    for datos in tramo:
+        uid = datos['uid']
+        autorizacion = autorizaciones.get(uid)
+        evento = evento_acceso(uid, autorizacion, datos['fecha_hora'], datos.get('departamento_id'))[0]
+        # La decisión es la del lector en su momento, no la del estado actual del sensor
+        evento.tipo = 'ACCESO_PERMITIDO' if datos['acceso_permitido'] else 'ACCESO_DENEGADO'
+        evento.codigo = _codigo(datos['acceso_permitido'], autorizacion is not None)
+        evento.fecha_hora = datos['fecha_hora']
+        evento.id_origen = datos['id']
+        evento.metadata['diferido'] = True
+        eventos.append(evento)
+    return eventos
+
+
+def _escribir_tramo(tramo):
+    """Escribe los eventos nuevos de un tramo; devuelve (insertados, duplicados)"""
+    autorizaciones = obtener_autorizaciones(datos['uid'] for datos in tramo)
+    for intento in range(2):
+        existentes = _existentes(tramo)
+        nuevos = [datos for datos in tramo if datos['id'] not in existentes]
+        try:
+            if nuevos:
+                escribir_eventos(_construir(nuevos, autorizaciones))
+            return len(nuevos), len(tramo) - len(nuevos)
+        except IntegrityError:
+            # Otra ingesta concurrente insertó alguno entre la consulta y el INSERT
+            if intento:
+                raise
+
+
+def ingerir(stream):
+    """
+    Procesa un cuerpo NDJSON (sin cargarlo entero en memoria) y devuelve el
+    informe de la ingesta: totales, errores por línea y, si el cuerpo supera
+    EVENTOS_INGESTA_MAX_LINEAS, la línea desde la que hay que reenviar
+    """
+    tamano_tramo = smartconnect_setting('EVENTOS_INGESTA_LOTE')
+    maximo = smartconnect_setting('EVENTOS_INGESTA_MAX_LINEAS')
+    informe = {'lineas': 0, 'insertados': 0, 'duplicados': 0, 'rechazados': 0, 'errores': []}
+    vistos = set()
+    tramo = []
+
+    def vaciar():
+        insertados, duplicados = _escribir_tramo(tramo)
+        informe['insertados'] += insertados
+        informe['duplicados'] += duplicados
+        tramo.clear()
+
+    lineas = enumerate(stream, start=1)
+    for numero, datos, error in _leer(itertools.islice(lineas, maximo)):
+        informe['lineas'] = numero
+        if error is not None:
+            informe['rechazados'] += 1
+            informe['errores'].append(error)
+            continue
+        if datos['id'] in vistos:
+            # Repetido dentro del mismo envío
+            informe['duplicados'] += 1
+            continue
+        vistos.add(datos['id'])
+        tramo.append(datos)
+        if len(tramo) >= tamano_tramo:
+            vaciar()
+    if tramo:
+        vaciar()
+
+    informe['completo'] = True
+    for numero, linea in lineas:
+        if linea.strip():
+            informe['completo'] = False
+            informe['siguiente_linea'] = numero
+            break
+    return informe
@@ -0,0 +1,89 @@
+"""
+Utilidades compartidas por los comandos de benchmark (bench_*)
+"""
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.models import Usuario, Departamento, Sensor
+
+
+@contextmanager
+def base_de_datos_temporal():
+    """
+    Ejecuta el benchmark sobre una base de datos de pruebas desechable
+    para no tocar los datos reales
+    """
+    nombre_original = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+
+def crear_datos(n_sensores, n_departamentos=10, inactivos_cada=10):
+    """Crea departamentos, un operador y n_sensores sensores con bulk_create"""
+    departamentos = Departamento.objects.bulk_create([
+        Departamento(nombre=f'Departamento {i:03d}') for i in range(n_departamentos)
+    ])
+    operador = Usuario.objects.create_user(
+        username='bench', password='bench-12345', rol='OPERADOR',
+        first_name='Bench', last_name='Operador'
+    )
+    sensores = Sensor.objects.bulk_create([
+        Sensor(
+            uid=f'BENCH-{i:06d}',
+            nombre=f'Sensor {i:06d}',
+            estado='INACTIVO' if inactivos_cada and i % inactivos_cada == 0 else 'ACTIVO',
+            departamento=departamentos[i % n_departamentos],
+            usuario_asignado=operador if i % 2 else None,
+        )
+        for i in range(n_sensores)
+    ], batch_size=1000)
+    return {'departamentos': departamentos, 'operador': operador, 'sensores': sensores}
+
+
+def cliente_jwt(usuario):
+    """APIClient autenticado con un token JWT real"""
+    cliente = APIClient()
+    cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(usuario)}')
+    return cliente
+
+
+def medir(funcion, repeticiones):
+    """
+    Ejecuta funcion(i) repeticiones veces y devuelve operaciones por segundo
+    y latencias p50/p99 en milisegundos
+    """
+    latencias = []
+    inicio = time.perf_counter()
+    for i in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion(i)
+        latencias.append(time.perf_counter() - t0)
+    total = time.perf_counter() - inicio
+    return resumir(latencias, total)
+
+
+def resumir(latencias, total):
+    latencias = sorted(latencias)
+    p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+    return {
+        'operaciones': len(latencias),
+        'segundos': total,
+        'por_segundo': len(latencias) / total if total else 0.0,
+        'p50_ms': statistics.median(latencias) * 1000,
+        'p99_ms': p99 * 1000,
+    }
+
+
+def formatear(nombre, resultado):
+    return (
+        f"{nombre:<32} {resultado['por_segundo']:>10.1f} op/s   "
+        f"p50 {resultado['p50_ms']:>7.3f} ms   p99 {resultado['p99_ms']:>7.3f} ms"
+    )
@@ -0,0 +1,36 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from api import cache
+from api.conf import smartconnect_setting
+
+from ._bench import base_de_datos_temporal, crear_datos, cliente_jwt, medir, formatear
+
+
+class Command(BaseCommand):
+    help = 'Mide accesos por segundo en /api/acceso/sensor/ con la caché de sensores activada y desactivada'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sensores', type=int, default=1000)
+        parser.add_argument('--accesos', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with base_de_datos_temporal():
+            datos = crear_datos(options['sensores'])
+            cliente = cliente_jwt(datos['operador'])
+            uids = [sensor.uid for sensor in datos['sensores']]
+
+            def acceder(i):
+                cliente.post('/api/acceso/sensor/', {'uid': uids[i % len(uids)]}, format='json')
+
+            for habilitada in (False, True):
+                with override_settings(SMARTCONNECT={'SENSOR_CACHE_ENABLED': habilitada}):
+                    caches[smartconnect_setting('SENSOR_CACHE_ALIAS')].clear()
+                    if habilitada:
+                        cache.precalentar()
+                    cache.reiniciar_estadisticas()
+                    resultado = medir(acceder, options['accesos'])
+                    nombre = 'caché activada' if habilitada else 'caché desactivada'
+                    self.stdout.write(formatear(nombre, resultado))
+                    self.stdout.write(f'    {cache.estadisticas()}')
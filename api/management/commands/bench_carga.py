@@ -0,0 +1,104 @@
+import http.client
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ._bench import resumir, formatear
+
+
+def _conexion(base):
+    partes = urlsplit(base)
+    clase = http.client.HTTPSConnection if partes.scheme == 'https' else http.client.HTTPConnection
+    return clase(partes.hostname, partes.port, timeout=30)
+
+
+def obtener_token(base, usuario, password):
+    conexion = _conexion(base)
+    conexion.request(
+        'POST', '/api/token/', json.dumps({'username': usuario, 'password': password}),
+        {'Content-Type': 'application/json'}
+    )
+    respuesta = conexion.getresponse()
+    cuerpo = json.loads(respuesta.read())
+    conexion.close()
+    if respuesta.status != 200:
+        raise CommandError(f'No se pudo obtener el token en {base}: {cuerpo}')
+    return cuerpo['access']
+
+
+def cargar(base, ruta, token, uids, concurrencia, accesos):
+    """
+    Lanza `accesos` peticiones con `concurrencia` clientes keep-alive y
+    devuelve el resumen de latencias y los códigos de estado recibidos
+    """
+    contador = itertools.count()
+    latencias = []
+    estados = Counter()
+    lock = threading.Lock()
+    cabeceras = {'Content-Type': 'application/json', 'Authorization': f'Bearer {token}'}
+
+    def cliente():
+        conexion = _conexion(base)
+        propias = []
+        propios = Counter()
+        while True:
+            i = next(contador)
+            if i >= accesos:
+                break
+            cuerpo = json.dumps({'uid': uids[i % len(uids)]})
+            t0 = time.perf_counter()
+            try:
+                conexion.request('POST', ruta, cuerpo, cabeceras)
+                respuesta = conexion.getresponse()
+                respuesta.read()
+                propios[respuesta.status] += 1
+            except (OSError, http.client.HTTPException):
+                propios['error'] += 1
+                conexion.close()
+                conexion = _conexion(base)
+            propias.append(time.perf_counter() - t0)
+        conexion.close()
+        with lock:
+            latencias.extend(propias)
+            estados.update(propios)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+        for _ in range(concurrencia):
+            ejecutor.submit(cliente)
+    return resumir(latencias, time.perf_counter() - inicio), estados
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga HTTP del endpoint de acceso: ruta síncrona servida por WSGI '
+        '(gunicorn) frente a la ruta asíncrona servida por ASGI (uvicorn)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi', default='http://127.0.0.1:8000', help='URL base del servidor WSGI')
+        parser.add_argument('--asgi', default='http://127.0.0.1:8001', help='URL base del servidor ASGI')
+        parser.add_argument('--usuario', required=True)
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--uid', action='append', required=True, help='UID a usar (repetible)')
+        parser.add_argument('--concurrencia', type=int, default=50)
+        parser.add_argument('--accesos', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        objetivos = [
+            ('WSGI /api/acceso/sensor/', options['wsgi'], '/api/acceso/sensor/'),
+            ('ASGI /api/acceso/sensor/async/', options['asgi'], '/api/acceso/sensor/async/'),
+        ]
+        for nombre, base, ruta in objetivos:
+            token = obtener_token(base, options['usuario'], options['password'])
+            resultado, estados = cargar(
+                base, ruta, token, options['uid'], options['concurrencia'], options['accesos']
+            )
+            self.stdout.write(formatear(nombre, resultado))
+            self.stdout.write(f'    estados: {dict(estados)}')
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.acceso import evento_acceso
+from api.buffer import escribir_eventos
+from api.cache import obtener_autorizacion
+from api.models import Evento
+
+from ._bench import base_de_datos_temporal, crear_datos, medir, formatear
+
+
+def tamano_eventos():
+    """Bytes ocupados por la tabla de eventos y sus índices"""
+    tabla = Evento._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT COALESCE(SUM(pg_total_relation_size(relid)), 0) FROM pg_partition_tree(%s)', [tabla]
+            )
+        else:
+            cursor.execute(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                "(SELECT name FROM sqlite_master WHERE tbl_name = %s)", [tabla]
+            )
+        return cursor.fetchone()[0] or 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Tamaño de la tabla de eventos y rendimiento de inserción con la descripción como '
+        'texto completo (antes) o como código + parámetros en metadata (después)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--eventos', type=int, default=50000)
+        parser.add_argument('--lote', type=int, default=200, help='Eventos por bulk_create')
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        with base_de_datos_temporal():
+            sensores = crear_datos(200)['sensores']
+            autorizaciones = [obtener_autorizacion(sensor.uid) for sensor in sensores]
+
+            def construir(texto):
+                eventos = []
+                for i in range(options['eventos']):
+                    if i % 10 == 0:
+                        evento = evento_acceso(f'DESCONOCIDO-{i:06d}', None)[0]
+                    else:
+                        autorizacion = autorizaciones[i % len(autorizaciones)]
+                        evento = evento_acceso(autorizacion['uid'], autorizacion)[0]
+                    if texto:
+                        # Representación anterior: texto completo y sin el nombre del sensor en metadata
+                        evento.descripcion = evento.texto_descripcion
+                        evento.codigo = ''
+                        evento.metadata.pop('sensor_nombre', None)
+                    eventos.append(evento)
+                return eventos
+
+            resultados = {}
+            for nombre, texto in (('texto completo', True), ('codigo + parametros', False)):
+                Evento.objects.all().delete()
+                eventos = construir(texto)
+                inicial = tamano_eventos()
+                resultado = medir(
+                    lambda i: escribir_eventos(eventos[i * lote:(i + 1) * lote]),
+                    -(-len(eventos) // lote)
+                )
+                tamano = tamano_eventos() - inicial
+                resultados[nombre] = tamano
+                self.stdout.write(formatear(f'{nombre} (lotes de {lote})', resultado))
+                self.stdout.write(
+                    f'    {resultado["por_segundo"] * lote:,.0f} eventos/s   '
+                    f'{tamano / 1024 / 1024:.2f} MiB   {tamano / len(eventos):.1f} bytes por evento'
+                )
+            antes, despues = resultados.values()
+            if antes:
+                self.stdout.write(f'Reducción de tamaño: {(1 - despues / antes) * 100:.1f} %')
@@ -0,0 +1,65 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.models import Evento
+from api.pagination import EventoCursorPagination
+
+from ._bench import base_de_datos_temporal, crear_datos, medir, formatear
+
+
+class Command(BaseCommand):
+    help = 'Latencia de páginas profundas en /api/eventos/: paginación por número (OFFSET + COUNT) vs cursor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--eventos', type=int, default=200000)
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeticiones', type=int, default=50)
+        parser.add_argument('--paginas', type=int, nargs='+', default=[1, 10, 100, 1000, 3000])
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        with base_de_datos_temporal():
+            sensores = crear_datos(100, inactivos_cada=0)['sensores']
+            ahora = timezone.now()
+            Evento.objects.bulk_create([
+                Evento(
+                    tipo='ACCESO_PERMITIDO',
+                    sensor=sensores[i % len(sensores)],
+                    descripcion=f'Evento {i}',
+                    fecha_hora=ahora - timedelta(seconds=i // 3),
+                )
+                for i in range(options['eventos'])
+            ], batch_size=2000)
+
+            factory = APIRequestFactory()
+            queryset = Evento.objects.select_related('sensor', 'barrera', 'usuario_accion')
+            ordenados = queryset.order_by('-fecha_hora', '-id')
+
+            for pagina in options['paginas']:
+                if (pagina - 1) * page_size >= options['eventos']:
+                    continue
+                numero = PageNumberPagination()
+                numero.page_size = page_size
+                peticion_numero = Request(factory.get('/api/eventos/', {'page': pagina}))
+
+                # El cursor de la página N es el borde de la página N-1 (se calcula fuera de la medición)
+                parametros = {'page_size': page_size}
+                if pagina > 1:
+                    borde = ordenados.values('fecha_hora', 'id')[(pagina - 1) * page_size - 1]
+                    parametros['cursor'] = EventoCursorPagination.encode_cursor('n', borde['fecha_hora'], borde['id'])
+                peticion_cursor = Request(factory.get('/api/eventos/', parametros))
+
+                resultado = medir(
+                    lambda i: numero.paginate_queryset(queryset, peticion_numero), options['repeticiones']
+                )
+                self.stdout.write(formatear(f'pagina {pagina} numero', resultado))
+                resultado = medir(
+                    lambda i: EventoCursorPagination().paginate_queryset(queryset, peticion_cursor),
+                    options['repeticiones']
+                )
+                self.stdout.write(formatear(f'pagina {pagina} cursor', resultado))
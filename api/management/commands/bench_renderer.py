@@ -0,0 +1,62 @@
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.models import Evento
+from api.renderers import ORJSONRenderer, orjson
+from api.serializers import EventoSerializer
+
+from ._bench import base_de_datos_temporal, crear_datos, medir, formatear
+
+
+class Command(BaseCommand):
+    help = 'Tiempo de render de una página de eventos con JSONRenderer (json) y ORJSONRenderer (orjson)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--eventos', type=int, default=1000)
+        parser.add_argument('--repeticiones', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError('orjson no está instalado: ORJSONRenderer usaría JSONRenderer')
+        with base_de_datos_temporal():
+            datos = crear_datos(200)
+            sensores = datos['sensores']
+            ahora = timezone.now()
+            Evento.objects.bulk_create([
+                Evento(
+                    tipo='ACCESO_PERMITIDO' if i % 4 else 'ACCESO_DENEGADO',
+                    sensor=sensores[i % len(sensores)],
+                    departamento=datos['departamentos'][i % len(datos['departamentos'])],
+                    codigo='ACCESO' if i % 4 else 'SENSOR_NO_ACTIVO',
+                    metadata={'uid': sensores[i % len(sensores)].uid, 'sensor_nombre': 'Sensor',
+                              'departamento': 'Departamento', 'estado_sensor': 'BLOQUEADO'},
+                    fecha_hora=ahora - timedelta(seconds=i),
+                )
+                for i in range(options['eventos'])
+            ], batch_size=2000)
+            eventos = Evento.objects.select_related('sensor', 'barrera', 'usuario_accion')
+            # Una página del listado, la misma lista con el sobre {'success', 'data'} de las
+            # acciones y filas con UUID y fechas sin serializar (las escribe orjson)
+            paginas = {
+                'pagina': {'next': 'http://testserver/api/eventos/?cursor=x', 'previous': None,
+                           'results': EventoSerializer(eventos, many=True).data},
+                'sobre': {'success': True, 'data': EventoSerializer(eventos, many=True).data},
+                'uuid': {'success': True, 'data': [
+                    {'id': uuid.uuid4(), 'lector': uuid.uuid4(), 'anterior': None}
+                    for _ in range(options['eventos'])
+                ]},
+                'fechas': {'success': True, 'data': [
+                    {'id': evento.pk, 'fecha_hora': evento.fecha_hora, 'dia': evento.fecha_hora.date(), 'barrera': None}
+                    for evento in eventos
+                ]},
+            }
+            for nombre, pagina in paginas.items():
+                if JSONRenderer().render(pagina) != ORJSONRenderer().render(pagina):
+                    raise CommandError(f'ORJSONRenderer no coincide con JSONRenderer ({nombre})')
+                for renderer in (JSONRenderer(), ORJSONRenderer()):
+                    resultado = medir(lambda i: renderer.render(pagina), options['repeticiones'])
+                    self.stdout.write(formatear(f'{nombre} {options["eventos"]} {type(renderer).__name__}', resultado))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from api.acceso import evento_acceso, respuesta_compacta
+from api.cache import obtener_autorizacion
+from api.serializers import EventoSerializer
+
+from ._bench import base_de_datos_temporal, crear_datos, medir, formatear
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark del coste de serialización por petición de /api/acceso/sensor/ (verbosa vs compacta)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        with base_de_datos_temporal():
+            datos = crear_datos(1, inactivos_cada=0)
+            uid = datos['sensores'][0].uid
+            autorizacion = obtener_autorizacion(uid)
+            evento, puede_acceder, mensaje = evento_acceso(uid, autorizacion)
+            evento.save()
+            renderer = JSONRenderer()
+
+            def verbosa(i):
+                return renderer.render({
+                    'success': True,
+                    'acceso_permitido': puede_acceder,
+                    'message': mensaje,
+                    'data': {
+                        'sensor': autorizacion['sensor'],
+                        'evento': EventoSerializer(evento).data
+                    }
+                })
+
+            def compacta(i):
+                return renderer.render(respuesta_compacta(evento, puede_acceder, True))
+
+            for nombre, funcion in (('verbosa', verbosa), ('compacta', compacta)):
+                resultado = medir(funcion, options['repeticiones'])
+                self.stdout.write(formatear(nombre, resultado))
+                self.stdout.write(f'    {len(funcion(0))} bytes por respuesta')
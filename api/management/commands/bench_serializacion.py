@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.models import Evento, Sensor
+from api.rapido import compilar
+from api.serializers import EventoSerializer, SensorSerializer
+
+from ._bench import base_de_datos_temporal, crear_datos, medir, formatear
+
+
+class Command(BaseCommand):
+    help = (
+        'Filas por segundo al serializar páginas de eventos y sensores con ModelSerializer '
+        'o con la serialización rápida sobre values() (api/rapido.py); comprueba que la salida es idéntica'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--eventos', type=int, default=5000)
+        parser.add_argument('--sensores', type=int, default=2000)
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[10, 100, 1000])
+
+    def handle(self, *args, **options):
+        with base_de_datos_temporal():
+            datos = crear_datos(options['sensores'])
+            sensores, departamentos = datos['sensores'], datos['departamentos']
+            for i, sensor in enumerate(sensores[::7]):
+                sensor.departamentos_adicionales.add(*departamentos[:i % 3])
+            ahora = timezone.now()
+            Evento.objects.bulk_create([
+                Evento(
+                    tipo='ACCESO_PERMITIDO' if i % 4 else 'ACCESO_DENEGADO',
+                    sensor=sensores[i % len(sensores)],
+                    departamento=departamentos[i % len(departamentos)],
+                    usuario_accion=datos['operador'] if i % 5 == 0 else None,
+                    codigo='ACCESO' if i % 4 else 'SENSOR_NO_ACTIVO',
+                    metadata={'uid': sensores[i % len(sensores)].uid, 'sensor_nombre': 'Sensor',
+                              'departamento': 'Departamento', 'estado_sensor': 'BLOQUEADO'},
+                    fecha_hora=ahora - timedelta(seconds=i),
+                )
+                for i in range(options['eventos'])
+            ], batch_size=2000)
+
+            casos = [
+                ('eventos', EventoSerializer,
+                 Evento.objects.select_related('sensor', 'barrera', 'usuario_accion').order_by('-fecha_hora', '-id'),
+                 Evento.objects.order_by('-fecha_hora', '-id')),
+                ('sensores', SensorSerializer,
+                 Sensor.objects.select_related('departamento', 'usuario_asignado')
+                 .prefetch_related('departamentos_adicionales'),
+                 Sensor.objects.all()),
+            ]
+            for nombre, serializer_class, queryset, base in casos:
+                plan = compilar(serializer_class)
+                for page_size in options['page_sizes']:
+                    modelo = lambda i: serializer_class(queryset[:page_size], many=True).data
+                    rapido = lambda i: plan.serializar(plan.filas(base[:page_size]))
+                    if JSONRenderer().render(modelo(0)) != JSONRenderer().render(rapido(0)):
+                        raise CommandError(f'La salida rápida de {nombre} no coincide con {serializer_class.__name__}')
+                    filas = len(rapido(0))
+                    for motor, funcion in (('ModelSerializer', modelo), ('rapido', rapido)):
+                        resultado = medir(funcion, options['repeticiones'])
+                        self.stdout.write(formatear(f'{nombre} {page_size} {motor}', resultado))
+                        self.stdout.write(f'    {resultado["por_segundo"] * filas:,.0f} filas/s')
@@ -0,0 +1,38 @@
+import csv
+import gzip
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importacion import FORMATOS, importar_sensores
+
+
+class Command(BaseCommand):
+    help = (
+        'Alta en bloque de sensores desde un fichero CSV (con cabecera) o NDJSON, por tramos '
+        '(ver api/importacion.py); las filas con errores se informan sin interrumpir la importación'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichero', help='Ruta del fichero .csv o .ndjson (también comprimido .gz)')
+        parser.add_argument('--formato', choices=FORMATOS, help='Por defecto, según la extensión del fichero')
+
+    def handle(self, *args, **options):
+        fichero = options['fichero']
+        nombre = fichero[:-3] if fichero.endswith('.gz') else fichero
+        formato = options['formato'] or ('csv' if nombre.lower().endswith('.csv') else 'ndjson')
+        abrir = gzip.open if fichero.endswith('.gz') else open
+        try:
+            with abrir(fichero, 'rb') as stream:
+                informe = importar_sensores(stream, formato)
+        except (OSError, EOFError, UnicodeDecodeError, csv.Error) as exc:
+            raise CommandError(f'No se pudo leer {fichero}: {exc}')
+
+        for error in informe['errores']:
+            detalles = '; '.join(
+                f'{campo}: {" ".join(mensajes)}' for campo, mensajes in error['error']['details'].items()
+            )
+            self.stderr.write(f'Línea {error["linea"]}: {error["error"]["message"]}. {detalles}'.rstrip('. '))
+        self.stdout.write(self.style.SUCCESS(
+            f'{informe["creados"]} sensores creados, {informe["rechazados"]} filas rechazadas '
+            f'({informe["lineas"]} líneas leídas)'
+        ))
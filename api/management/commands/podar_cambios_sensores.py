@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.allowlist import podar_cambios
+from api.conf import smartconnect_setting
+
+
+class Command(BaseCommand):
+    help = (
+        'Elimina el historial de cambios de la allowlist (CambioSensor) anterior a la retención; '
+        'los lectores con una versión más antigua recibirán 410 y descargarán la instantánea'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int,
+            help=f'Días que se conservan (por defecto ALLOWLIST_RETENCION_DIAS, '
+                 f'{smartconnect_setting("ALLOWLIST_RETENCION_DIAS")})'
+        )
+
+    def handle(self, *args, **options):
+        if options['dias'] is not None and options['dias'] < 0:
+            raise CommandError('--dias no puede ser negativo')
+        eliminados = podar_cambios(options['dias'])
+        self.stdout.write(self.style.SUCCESS(f'{eliminados} cambios eliminados'))
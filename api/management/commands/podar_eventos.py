@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import retencion
+from api.conf import smartconnect_setting
+
+
+class Command(BaseCommand):
+    help = (
+        'Archiva en .ndjson.gz y elimina los eventos de los meses anteriores a la retención '
+        '(EVENTOS_RETENCION_MESES meses completos además del actual)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retencion-meses', type=int, default=smartconnect_setting('EVENTOS_RETENCION_MESES'),
+            help='Meses completos que se conservan además del actual'
+        )
+        parser.add_argument(
+            '--destino', default=smartconnect_setting('EVENTOS_ARCHIVO_DIR'),
+            help='Directorio donde se archiva cada mes antes de eliminarlo'
+        )
+        parser.add_argument(
+            '--sin-archivo', action='store_true', help='Eliminar los meses vencidos sin archivarlos'
+        )
+        parser.add_argument('--lote', type=int, default=2000, help='Eventos por DELETE y transacción')
+        parser.add_argument('--simular', action='store_true', help='Solo mostrar lo que se haría')
+
+    def handle(self, *args, **options):
+        meses = options['retencion_meses']
+        if meses is None or meses < 0:
+            raise CommandError('Indique --retencion-meses o EVENTOS_RETENCION_MESES')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser positivo')
+        destino = None if options['sin_archivo'] else options['destino']
+        if destino is None and not options['sin_archivo']:
+            raise CommandError('Indique --destino (o EVENTOS_ARCHIVO_DIR) o use --sin-archivo')
+
+        if options['simular']:
+            for inicio in retencion.vencidos(meses):
+                self.stdout.write(f'Se podaría {inicio:%Y-%m}')
+            return
+
+        for inicio, ruta, eliminados in retencion.podar(meses, destino=destino, lote=options['lote']):
+            if ruta:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{inicio:%Y-%m}: {eliminados} eventos archivados en {ruta} y eliminados'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{inicio:%Y-%m}: {eliminados} eventos eliminados sin archivar'))
@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from api.filtros import interpretar_fecha
+from api.models import Evento
+from api.resumen import hora_de, horas, reconstruir
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye los resúmenes por hora de eventos (ResumenEventoHora) a partir del '
+        'histórico, por tramos; por defecto desde el primer evento hasta la hora en curso (excluida)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='AAAA-MM-DD o ISO 8601 (por defecto, el primer evento)')
+        parser.add_argument('--hasta', help='AAAA-MM-DD o ISO 8601, excluido (por defecto, la hora en curso)')
+        parser.add_argument('--horas-por-tramo', type=int, default=24, help='Horas recalculadas por transacción')
+
+    def handle(self, *args, **options):
+        if options['horas_por_tramo'] < 1:
+            raise CommandError('--horas-por-tramo debe ser mayor que 0')
+        try:
+            desde = interpretar_fecha(options['desde'], 'desde')[0] if options['desde'] else None
+            hasta = interpretar_fecha(options['hasta'], 'hasta')[0] if options['hasta'] else None
+        except ValidationError as exc:
+            raise CommandError(exc.detail)
+
+        if desde is None:
+            desde = Evento.objects.aggregate(primero=Min('fecha_hora'))['primero']
+            if desde is None:
+                self.stdout.write('No hay eventos')
+                return
+        if hasta is None:
+            # La hora en curso la siguen sumando las escrituras; no se recalcula por defecto
+            hasta = hora_de(timezone.now())
+        elif hora_de(hasta) != hasta:
+            hasta = hora_de(hasta) + timedelta(hours=1)
+
+        total = 0
+        for inicio, fin in horas(hora_de(desde), hasta, options['horas_por_tramo']):
+            filas = reconstruir(inicio, fin)
+            total += filas
+            self.stdout.write(f'{inicio:%Y-%m-%d %H:00} - {fin:%Y-%m-%d %H:00}: {filas} resúmenes')
+        self.stdout.write(self.style.SUCCESS(f'{total} resúmenes reconstruidos'))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_evento_fecha_hora_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioSensor',
+            fields=[
+                ('version', models.BigAutoField(primary_key=True, serialize=False)),
+                ('uid', models.CharField(max_length=50)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Cambio de sensor',
+                'verbose_name_plural': 'Cambios de sensores',
+                'ordering': ['version'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_cambiosensor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensor',
+            name='departamentos_adicionales',
+            field=models.ManyToManyField(blank=True, help_text='Otros departamentos a los que el sensor puede acceder', related_name='sensores_autorizados', to='api.departamento'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_sensor_departamentos_adicionales'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['fecha_hora', 'id'], name='evento_fecha_hora_id_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_evento_fecha_hora_id_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='evento',
+            name='barrera',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='eventos', to='api.barrera'),
+        ),
+        migrations.AlterField(
+            model_name='evento',
+            name='sensor',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='eventos', to='api.sensor'),
+        ),
+        migrations.AlterField(
+            model_name='sensor',
+            name='departamento',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='sensores', to='api.departamento'),
+        ),
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['tipo', 'fecha_hora'], name='evento_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['sensor', 'fecha_hora'], name='evento_sensor_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['barrera', 'fecha_hora'], name='evento_barrera_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensor',
+            index=models.Index(fields=['estado', 'fecha_creacion'], name='sensor_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensor',
+            index=models.Index(fields=['departamento', 'fecha_creacion'], name='sensor_depto_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+"""
+Sin operaciones. Convertía api_evento en una tabla particionada por mes en
+PostgreSQL; el particionado se retiró (la retención es podar_eventos, ver
+api/retencion.py). Se conserva para no dejar un hueco en la numeración y
+para las bases de datos que ya la tienen aplicada.
+"""
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_indices_consultas'),
+    ]
+
+    operations = []
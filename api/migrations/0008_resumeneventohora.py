@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_evento_particionado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenEventoHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField(help_text='Inicio de la hora (UTC)')),
+                ('tipo', models.CharField(choices=[('ACCESO_PERMITIDO', 'Acceso Permitido'), ('ACCESO_DENEGADO', 'Acceso Denegado'), ('BARRERA_ABIERTA', 'Barrera Abierta'), ('BARRERA_CERRADA', 'Barrera Cerrada')], max_length=30)),
+                ('departamento', models.PositiveIntegerField(default=0, help_text='Id del departamento (0 = ninguno)')),
+                ('sensor', models.PositiveIntegerField(default=0, help_text='Id del sensor (0 = ninguno)')),
+                ('barrera', models.PositiveIntegerField(default=0, help_text='Id de la barrera (0 = ninguna)')),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Resumen de eventos por hora',
+                'verbose_name_plural': 'Resúmenes de eventos por hora',
+                'ordering': ['hora'],
+                'indexes': [models.Index(fields=['departamento', 'hora'], name='resumen_depto_hora_idx')],
+                'constraints': [models.UniqueConstraint(fields=('hora', 'tipo', 'departamento', 'sensor', 'barrera'), name='resumen_evento_hora_clave')],
+            },
+        ),
+    ]
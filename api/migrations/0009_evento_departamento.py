@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_resumeneventohora'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evento',
+            name='departamento',
+            field=models.ForeignKey(blank=True, db_index=False, help_text='Departamento donde ocurrió el evento, fijado al registrarlo', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='eventos', to='api.departamento'),
+        ),
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['departamento', 'fecha_hora'], name='evento_depto_fecha_idx'),
+        ),
+    ]
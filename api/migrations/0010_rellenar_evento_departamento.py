@@ -0,0 +1,53 @@
+"""
+Rellena Evento.departamento en los eventos existentes, por tramos de id y
+con una transacción por tramo para no bloquear la tabla durante toda la
+migración. Los accesos permitidos con departamento_solicitado en metadata
+usan ese departamento; el resto, el del sensor o el de la barrera.
+"""
+from django.db import migrations, transaction
+from django.db.models import IntegerField, Max, Min, OuterRef, Subquery
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast
+
+
+TRAMO = 5000
+
+
+def rellenar(apps, schema_editor):
+    Evento = apps.get_model('api', 'Evento')
+    Sensor = apps.get_model('api', 'Sensor')
+    Barrera = apps.get_model('api', 'Barrera')
+    Departamento = apps.get_model('api', 'Departamento')
+
+    limites = Evento.objects.aggregate(primero=Min('id'), ultimo=Max('id'))
+    if limites['primero'] is None:
+        return
+    existentes = Departamento.objects.values('id')
+    for inicio in range(limites['primero'], limites['ultimo'] + 1, TRAMO):
+        tramo = Evento.objects.filter(id__gte=inicio, id__lt=inicio + TRAMO, departamento__isnull=True)
+        with transaction.atomic():
+            tramo.filter(
+                tipo='ACCESO_PERMITIDO', metadata__has_key='departamento_solicitado'
+            ).annotate(
+                solicitado=Cast(KT('metadata__departamento_solicitado'), IntegerField())
+            ).filter(solicitado__in=existentes).update(
+                departamento_id=Cast(KT('metadata__departamento_solicitado'), IntegerField())
+            )
+            tramo.filter(sensor__isnull=False).update(
+                departamento_id=Subquery(Sensor.objects.filter(pk=OuterRef('sensor_id')).values('departamento_id')[:1])
+            )
+            tramo.filter(sensor__isnull=True, barrera__isnull=False).update(
+                departamento_id=Subquery(Barrera.objects.filter(pk=OuterRef('barrera_id')).values('departamento_id')[:1])
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('api', '0009_evento_departamento'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_rellenar_evento_departamento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evento',
+            name='codigo',
+            field=models.CharField(blank=True, default='', help_text='Código de la descripción (MENSAJES); vacío si se usa texto libre', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='evento',
+            name='descripcion',
+            field=models.TextField(blank=True, default='', help_text='Texto libre (control manual con descripción propia o eventos anteriores a los códigos)'),
+        ),
+    ]
@@ -0,0 +1,120 @@
+"""
+Compacta la descripción de los eventos existentes: si el texto coincide
+exactamente con una plantilla de Evento.MENSAJES, se guarda el código, el
+nombre del sensor pasa a metadata['sensor_nombre'] y descripcion queda
+vacía. Los textos que no coinciden (descripciones propias, o datos de
+metadata que no cuadran con el texto) se conservan tal cual.
+Por tramos de id, con una transacción por tramo, como 0010.
+"""
+from django.db import migrations, transaction
+from django.db.models import Max, Min
+
+
+TRAMO = 5000
+
+# Copia fija de Evento.MENSAJES y ACCIONES a la fecha de esta migración
+MENSAJES = {
+    'UID_DESCONOCIDO': 'Intento de acceso con UID no registrado: {uid}',
+    'ACCESO': 'Sensor {sensor_nombre} ({uid}) accedió exitosamente al departamento {departamento}',
+    'SENSOR_NO_ACTIVO': (
+        'Intento de acceso denegado para sensor {sensor_nombre} ({uid}). '
+        'Estado del sensor: {estado_sensor_display}'
+    ),
+    'SIN_AUTORIZACION': (
+        'Intento de acceso denegado para sensor {sensor_nombre} ({uid}). '
+        'Sin autorización para el departamento {departamento_solicitado}'
+    ),
+    'CONTROL_MANUAL': 'Control manual: {accion}',
+}
+CODIGOS_POR_TIPO = {
+    'ACCESO_PERMITIDO': ['ACCESO'],
+    'ACCESO_DENEGADO': ['UID_DESCONOCIDO', 'SENSOR_NO_ACTIVO', 'SIN_AUTORIZACION'],
+    'BARRERA_ABIERTA': ['CONTROL_MANUAL'],
+    'BARRERA_CERRADA': ['CONTROL_MANUAL'],
+}
+ACCIONES = {'BARRERA_ABIERTA': 'abrir', 'BARRERA_CERRADA': 'cerrar'}
+ESTADOS_SENSOR = {'ACTIVO': 'Activo', 'INACTIVO': 'Inactivo', 'BLOQUEADO': 'Bloqueado', 'PERDIDO': 'Perdido'}
+
+
+class Parametros(dict):
+    def __missing__(self, clave):
+        return ''
+
+
+def _parametros(evento, metadata):
+    return Parametros(
+        metadata,
+        estado_sensor_display=ESTADOS_SENSOR.get(metadata.get('estado_sensor'), ''),
+        accion=ACCIONES.get(evento.tipo, ''),
+    )
+
+
+def _compactar(evento):
+    """Devuelve (codigo, metadata) si la descripción sale de una plantilla, o None"""
+    if not isinstance(evento.metadata, dict):
+        return None
+    for codigo in CODIGOS_POR_TIPO.get(evento.tipo, []):
+        plantilla = MENSAJES[codigo]
+        metadata = dict(evento.metadata)
+        if '{sensor_nombre}' in plantilla:
+            # El nombre del sensor solo está en el texto: es lo que queda entre prefijo y sufijo
+            prefijo, sufijo = plantilla.split('{sensor_nombre}')
+            prefijo = prefijo.format_map(_parametros(evento, metadata))
+            sufijo = sufijo.format_map(_parametros(evento, metadata))
+            texto = evento.descripcion
+            if not (texto.startswith(prefijo) and texto.endswith(sufijo)
+                    and len(texto) >= len(prefijo) + len(sufijo)):
+                continue
+            metadata['sensor_nombre'] = texto[len(prefijo):len(texto) - len(sufijo)]
+        if plantilla.format_map(_parametros(evento, metadata)) == evento.descripcion:
+            return codigo, metadata
+    return None
+
+
+def _tramos(Evento):
+    limites = Evento.objects.aggregate(primero=Min('id'), ultimo=Max('id'))
+    if limites['primero'] is None:
+        return
+    for inicio in range(limites['primero'], limites['ultimo'] + 1, TRAMO):
+        yield Evento.objects.filter(id__gte=inicio, id__lt=inicio + TRAMO)
+
+
+def compactar(apps, schema_editor):
+    Evento = apps.get_model('api', 'Evento')
+    for tramo in _tramos(Evento):
+        cambios = []
+        for evento in tramo.filter(codigo='').exclude(descripcion='').only('id', 'tipo', 'descripcion', 'metadata'):
+            resultado = _compactar(evento)
+            if resultado is not None:
+                evento.codigo, evento.metadata = resultado
+                evento.descripcion = ''
+                cambios.append(evento)
+        with transaction.atomic():
+            Evento.objects.bulk_update(cambios, ['codigo', 'descripcion', 'metadata'], batch_size=500)
+
+
+def expandir(apps, schema_editor):
+    Evento = apps.get_model('api', 'Evento')
+    for tramo in _tramos(Evento):
+        cambios = []
+        for evento in tramo.exclude(codigo='').only('id', 'tipo', 'codigo', 'metadata'):
+            plantilla = MENSAJES.get(evento.codigo)
+            if plantilla is None:
+                continue
+            evento.descripcion = plantilla.format_map(_parametros(evento, evento.metadata or {}))
+            evento.codigo = ''
+            cambios.append(evento)
+        with transaction.atomic():
+            Evento.objects.bulk_update(cambios, ['codigo', 'descripcion'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('api', '0011_evento_codigo'),
+    ]
+
+    operations = [
+        migrations.RunPython(compactar, expandir),
+    ]
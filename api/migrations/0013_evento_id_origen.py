@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_compactar_descripcion_evento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evento',
+            name='id_origen',
+            field=models.CharField(blank=True, help_text='Id asignado por el lector a un evento ingerido en diferido (/api/eventos/ingesta/)', max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='evento',
+            constraint=models.UniqueConstraint(condition=models.Q(('id_origen__isnull', False)), fields=('id_origen', 'fecha_hora'), name='evento_origen_fecha_uniq'),
+        ),
+    ]
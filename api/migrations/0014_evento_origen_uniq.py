@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_evento_id_origen'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='evento',
+            name='evento_origen_fecha_uniq',
+        ),
+        migrations.AddConstraint(
+            model_name='evento',
+            constraint=models.UniqueConstraint(condition=models.Q(('id_origen__isnull', False)), fields=('id_origen',), name='evento_origen_uniq'),
+        ),
+    ]
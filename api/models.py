@@ -1,7 +1,12 @@
 from django.db import models
+from django.db.models import OuterRef
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinLengthValidator, RegexValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from . import respuestas
 
 
 class Usuario(AbstractUser):
@@ -43,6 +48,54 @@ class Usuario(AbstractUser):
         return self.rol == 'OPERADOR'
 
 
+class CatalogoQuerySet(models.QuerySet):
+    """
+    QuerySet de los catálogos (departamentos, sensores, barreras): update() y
+    bulk_create() no envían señales, así que invalidan aquí la caché de
+    respuestas (ver api/respuestas.py)
+    """
+    
+    def update(self, **kwargs):
+        filas = super().update(**kwargs)
+        respuestas.incrementar_generacion(self.model)
+        return filas
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        respuestas.incrementar_generacion(self.model)
+        return objs
+
+
+class DepartamentoQuerySet(CatalogoQuerySet):
+    
+    def con_totales(self, por_estado=False):
+        """
+        Anota total_sensores y total_barreras (y sensores_<estado> por cada
+        estado de sensor si por_estado) en la misma consulta del listado.
+        Los sensores se cuentan con un único JOIN agrupado (Count con filter
+        por estado) y las barreras con una subconsulta correlacionada, para no
+        multiplicar filas sensores × barreras.
+        """
+        barreras = (
+            Barrera.objects.filter(departamento=OuterRef('pk'))
+            .order_by().values('departamento').annotate(n=models.Count('pk')).values('n')
+        )
+        anotaciones = {
+            'total_sensores': models.Count('sensores'),
+            'total_barreras': Coalesce(models.Subquery(barreras), 0),
+        }
+        if por_estado:
+            for estado, _ in Sensor.ESTADO_CHOICES:
+                anotaciones[f'sensores_{estado.lower()}'] = models.Count(
+                    'sensores', filter=models.Q(sensores__estado=estado)
+                )
+        queryset = self.annotate(**anotaciones)
+        if not queryset.ordered:
+            # Django no aplica Meta.ordering a las consultas agrupadas
+            queryset = queryset.order_by(*self.model._meta.ordering)
+        return queryset
+
+
 class Departamento(models.Model):
     """
     Modelo para representar departamentos o zonas físicas
@@ -58,6 +111,8 @@ class Departamento(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     
+    objects = DepartamentoQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Departamento'
         verbose_name_plural = 'Departamentos'
@@ -104,7 +159,14 @@ class Sensor(models.Model):
     departamento = models.ForeignKey(
         Departamento,
         on_delete=models.CASCADE,
-        related_name='sensores'
+        related_name='sensores',
+        db_index=False  # cubierto por sensor_depto_fecha_idx
+    )
+    departamentos_adicionales = models.ManyToManyField(
+        Departamento,
+        blank=True,
+        related_name='sensores_autorizados',
+        help_text='Otros departamentos a los que el sensor puede acceder'
     )
     usuario_asignado = models.ForeignKey(
         Usuario,
@@ -116,10 +178,18 @@ class Sensor(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     
+    objects = CatalogoQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Sensor'
         verbose_name_plural = 'Sensores'
         ordering = ['-fecha_creacion']
+        indexes = [
+            # /api/sensores/activos/ filtra por estado con el orden por defecto
+            models.Index(fields=['estado', 'fecha_creacion'], name='sensor_estado_fecha_idx'),
+            # /api/departamentos/{id}/sensores/ filtra por departamento con el orden por defecto
+            models.Index(fields=['departamento', 'fecha_creacion'], name='sensor_depto_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nombre} ({self.uid})"
@@ -135,6 +205,11 @@ class Sensor(models.Model):
     def puede_acceder(self):
         """Verifica si el sensor puede acceder"""
         return self.estado == 'ACTIVO'
+    
+    def departamentos_permitidos(self):
+        """Departamentos activos (id: nombre) a los que el sensor puede acceder"""
+        departamentos = [self.departamento, *self.departamentos_adicionales.all()]
+        return {d.id: d.nombre for d in departamentos if d.activo}
 
 
 class Barrera(models.Model):
@@ -165,6 +240,8 @@ class Barrera(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     
+    objects = CatalogoQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Barrera'
         verbose_name_plural = 'Barreras'
@@ -182,6 +259,23 @@ class Barrera(models.Model):
         """Cierra la barrera"""
         self.estado = 'CERRADA'
         self.save()
+    
+    async def aabrir(self):
+        """Abre la barrera (versión asíncrona)"""
+        self.estado = 'ABIERTA'
+        await self.asave()
+    
+    async def acerrar(self):
+        """Cierra la barrera (versión asíncrona)"""
+        self.estado = 'CERRADA'
+        await self.asave()
+
+
+class ParametrosMensaje(dict):
+    """Parámetros de una plantilla de Evento.MENSAJES; los que falten quedan vacíos"""
+
+    def __missing__(self, clave):
+        return ''
 
 
 class Evento(models.Model):
@@ -195,6 +289,29 @@ class Evento(models.Model):
         ('BARRERA_CERRADA', 'Barrera Cerrada'),
     ]
     
+    # Plantillas de descripción por código; los parámetros salen de metadata
+    # (y de la acción implícita en el tipo) y el texto se genera al leer
+    MENSAJES = {
+        'UID_DESCONOCIDO': 'Intento de acceso con UID no registrado: {uid}',
+        'ACCESO': 'Sensor {sensor_nombre} ({uid}) accedió exitosamente al departamento {departamento}',
+        'SENSOR_NO_ACTIVO': (
+            'Intento de acceso denegado para sensor {sensor_nombre} ({uid}). '
+            'Estado del sensor: {estado_sensor_display}'
+        ),
+        'SIN_AUTORIZACION': (
+            'Intento de acceso denegado para sensor {sensor_nombre} ({uid}). '
+            'Sin autorización para el departamento {departamento_solicitado}'
+        ),
+        'CONTROL_MANUAL': 'Control manual: {accion}',
+        # Decisiones de lectores sin conexión (ingesta diferida, api/ingesta.py)
+        'DENEGADO_LECTOR': 'Acceso denegado por el lector para sensor {sensor_nombre} ({uid})',
+        'ACCESO_SIN_REGISTRO': 'Acceso permitido por el lector a un UID ya no registrado: {uid}',
+    }
+    ACCIONES = {
+        'BARRERA_ABIERTA': 'abrir',
+        'BARRERA_CERRADA': 'cerrar',
+    }
+    
     tipo = models.CharField(
         max_length=30,
         choices=TIPO_CHOICES
@@ -204,14 +321,25 @@ class Evento(models.Model):
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
-        related_name='eventos'
+        related_name='eventos',
+        db_index=False  # cubierto por evento_sensor_fecha_idx
     )
     barrera = models.ForeignKey(
         Barrera,
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
-        related_name='eventos'
+        related_name='eventos',
+        db_index=False  # cubierto por evento_barrera_fecha_idx
+    )
+    departamento = models.ForeignKey(
+        Departamento,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='eventos',
+        db_index=False,  # cubierto por evento_depto_fecha_idx
+        help_text='Departamento donde ocurrió el evento, fijado al registrarlo'
     )
     usuario_accion = models.ForeignKey(
         Usuario,
@@ -221,18 +349,79 @@ class Evento(models.Model):
         related_name='eventos_realizados',
         help_text='Usuario que realizó la acción manual'
     )
-    descripcion = models.TextField()
+    codigo = models.CharField(
+        max_length=20,
+        blank=True,
+        default='',
+        help_text='Código de la descripción (MENSAJES); vacío si se usa texto libre'
+    )
+    descripcion = models.TextField(
+        blank=True,
+        default='',
+        help_text='Texto libre (control manual con descripción propia o eventos anteriores a los códigos)'
+    )
     metadata = models.JSONField(default=dict, blank=True)
-    fecha_hora = models.DateTimeField(auto_now_add=True)
+    # Se fija al construir el evento para conservar la hora real aunque se escriba en diferido
+    fecha_hora = models.DateTimeField(default=timezone.now)
+    id_origen = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        help_text='Id asignado por el lector a un evento ingerido en diferido (/api/eventos/ingesta/)'
+    )
     
     class Meta:
         verbose_name = 'Evento'
         verbose_name_plural = 'Eventos'
         ordering = ['-fecha_hora']
+        indexes = [
+            # Clave de la paginación por cursor de /api/eventos/ (api/pagination.py)
+            models.Index(fields=['fecha_hora', 'id'], name='evento_fecha_hora_id_idx'),
+            # Filtros por tipo, sensor o barrera ordenados por fecha (por_tipo, historiales)
+            models.Index(fields=['tipo', 'fecha_hora'], name='evento_tipo_fecha_idx'),
+            models.Index(fields=['sensor', 'fecha_hora'], name='evento_sensor_fecha_idx'),
+            models.Index(fields=['barrera', 'fecha_hora'], name='evento_barrera_fecha_idx'),
+            models.Index(fields=['departamento', 'fecha_hora'], name='evento_depto_fecha_idx'),
+        ]
+        constraints = [
+            # Deduplicación de la ingesta por el id del lector; es parcial: los
+            # eventos registrados en línea no ocupan el índice
+            models.UniqueConstraint(
+                fields=['id_origen'],
+                condition=models.Q(id_origen__isnull=False),
+                name='evento_origen_uniq'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.fecha_hora.strftime('%Y-%m-%d %H:%M:%S')}"
     
+    @property
+    def texto_descripcion(self):
+        """Descripción legible: la plantilla del código con sus parámetros o el texto libre"""
+        return self.formatear_descripcion(self.tipo, self.codigo, self.descripcion, self.metadata)
+    
+    @classmethod
+    def formatear_descripcion(cls, tipo, codigo, descripcion, metadata):
+        """texto_descripcion a partir de los valores de las columnas (p.ej. de values())"""
+        plantilla = cls.MENSAJES.get(codigo)
+        if plantilla is None:
+            return descripcion
+        return plantilla.format_map(ParametrosMensaje(
+            metadata,
+            estado_sensor_display=dict(Sensor.ESTADO_CHOICES).get(metadata.get('estado_sensor'), ''),
+            accion=cls.ACCIONES.get(tipo, ''),
+        ))
+    
+    def save(self, *args, **kwargs):
+        # Si quien crea el evento no fijó el departamento, se toma el del sensor o la barrera
+        if self.departamento_id is None:
+            if self.sensor_id:
+                self.departamento_id = self.sensor.departamento_id
+            elif self.barrera_id:
+                self.departamento_id = self.barrera.departamento_id
+        super().save(*args, **kwargs)
+    
     def clean(self):
         # Validar que eventos de barrera tengan barrera asociada
         if self.tipo in ['BARRERA_ABIERTA', 'BARRERA_CERRADA'] and not self.barrera:
@@ -241,3 +430,55 @@ class Evento(models.Model):
         # Validar que eventos de acceso tengan sensor asociado
         if self.tipo in ['ACCESO_PERMITIDO', 'ACCESO_DENEGADO'] and not self.sensor:
             raise ValidationError({'sensor': 'Los eventos de acceso requieren un sensor asociado'})
+
+
+class CambioSensor(models.Model):
+    """
+    Registro de cambios de sensores para la sincronización incremental de
+    la lista de acceso (allowlist) en lectores y gateways.
+    El id autoincremental actúa como contador de versión monótono.
+    """
+    version = models.BigAutoField(primary_key=True)
+    uid = models.CharField(max_length=50)
+    fecha = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'Cambio de sensor'
+        verbose_name_plural = 'Cambios de sensores'
+        ordering = ['version']
+    
+    def __str__(self):
+        return f"v{self.version} - {self.uid}"
+
+
+class ResumenEventoHora(models.Model):
+    """
+    Resumen incremental de eventos por hora, tipo, departamento, sensor y
+    barrera (ver api/resumen.py). Guarda ids sin clave foránea, con 0 como
+    "sin valor", para que la clave única funcione igual en SQLite y
+    PostgreSQL (NULL nunca colisiona) y para conservar la historia aunque se
+    eliminen sensores o barreras.
+    """
+    hora = models.DateTimeField(help_text='Inicio de la hora (UTC)')
+    tipo = models.CharField(max_length=30, choices=Evento.TIPO_CHOICES)
+    departamento = models.PositiveIntegerField(default=0, help_text='Id del departamento (0 = ninguno)')
+    sensor = models.PositiveIntegerField(default=0, help_text='Id del sensor (0 = ninguno)')
+    barrera = models.PositiveIntegerField(default=0, help_text='Id de la barrera (0 = ninguna)')
+    total = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Resumen de eventos por hora'
+        verbose_name_plural = 'Resúmenes de eventos por hora'
+        ordering = ['hora']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['hora', 'tipo', 'departamento', 'sensor', 'barrera'],
+                name='resumen_evento_hora_clave'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['departamento', 'hora'], name='resumen_depto_hora_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.hora:%Y-%m-%d %H:00} {self.tipo}: {self.total}"
@@ -0,0 +1,118 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .conf import smartconnect_setting
+
+
+class EventoCursorPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre (fecha_hora, id) descendente.
+    Cada página es una búsqueda por índice sin OFFSET ni COUNT(*), estable
+    aunque se inserten eventos nuevos. El total solo se calcula con ?total=true.
+    """
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    total_query_param = 'total'
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.total = None
+        if request.query_params.get(self.total_query_param, '').lower() in ('1', 'true'):
+            self.total = queryset.count()
+
+        cursor = self.decode_cursor(request)
+        self.direccion = cursor[0] if cursor else 'n'
+        if cursor is None:
+            queryset = queryset.order_by('-fecha_hora', '-id')
+        elif self.direccion == 'n':
+            _, fecha_hora, pk = cursor
+            # fecha_hora__lte acota el rango del índice; el OR desempata por id
+            queryset = queryset.filter(
+                Q(fecha_hora__lt=fecha_hora) | Q(id__lt=pk), fecha_hora__lte=fecha_hora
+            ).order_by('-fecha_hora', '-id')
+        else:
+            _, fecha_hora, pk = cursor
+            queryset = queryset.filter(
+                Q(fecha_hora__gt=fecha_hora) | Q(id__gt=pk), fecha_hora__gte=fecha_hora
+            ).order_by('fecha_hora', 'id')
+
+        resultados = list(queryset[:self.page_size + 1])
+        hay_mas = len(resultados) > self.page_size
+        resultados = resultados[:self.page_size]
+
+        if self.direccion == 'n':
+            self.has_next = hay_mas
+            self.has_previous = cursor is not None
+        else:
+            resultados.reverse()
+            self.has_next = True
+            self.has_previous = hay_mas
+
+        self.resultados = resultados
+        return resultados
+
+    def get_page_size(self, request):
+        maximo = smartconnect_setting('EVENTOS_PAGE_SIZE_MAX')
+        try:
+            return _positive_int(request.query_params[self.page_size_query_param], strict=True, cutoff=maximo)
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE or 10
+
+    def get_paginated_response(self, data):
+        datos = OrderedDict()
+        if self.total is not None:
+            datos['count'] = self.total
+        datos['next'] = self.get_next_link()
+        datos['previous'] = self.get_previous_link()
+        datos['results'] = data
+        return Response(datos)
+
+    def get_next_link(self):
+        if not self.has_next or not self.resultados:
+            return None
+        return self._link('n', self.resultados[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.resultados:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self._link('p', self.resultados[0])
+
+    def _link(self, direccion, evento):
+        url = self.request.build_absolute_uri()
+        if isinstance(evento, dict):
+            # Filas de values() (serialización rápida, api/rapido.py)
+            fecha_hora, pk = evento['fecha_hora'], evento['id']
+        else:
+            fecha_hora, pk = evento.fecha_hora, evento.id
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(direccion, fecha_hora, pk))
+
+    @staticmethod
+    def encode_cursor(direccion, fecha_hora, pk):
+        """Cursor opaco con la dirección y la clave (fecha_hora, id) del borde de la página"""
+        return b64encode(f'{direccion}|{fecha_hora.isoformat()}|{pk}'.encode()).decode()
+
+    def decode_cursor(self, request):
+        valor = request.query_params.get(self.cursor_query_param)
+        if not valor:
+            return None
+        try:
+            direccion, fecha_hora, pk = b64decode(valor.encode()).decode().split('|')
+            fecha_hora = parse_datetime(fecha_hora)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if direccion not in ('n', 'p') or fecha_hora is None:
+            raise NotFound(self.invalid_cursor_message)
+        return direccion, fecha_hora, pk
@@ -0,0 +1,202 @@
+"""
+Serialización rápida de solo lectura para listados grandes
+
+Un ModelSerializer (con los campos que deje ?fields=, ver api/campos.py) se
+compila una vez a una función fila -> dict generada sobre QuerySet.values():
+sin instancias de modelo ni llamadas a get_attribute/to_representation por
+campo. La salida es idéntica a la del serializador (mismas claves en el
+mismo orden, campos de una relación nula omitidos, fechas ISO 8601 con Z).
+
+Solo se compilan columnas y relaciones simples (FK, FK.columna, many-to-many
+por clave primaria) y los campos calculados que declaran su función en
+Meta.calculados (recibe los valores de Meta.dependencias en ese orden); con
+cualquier otro campo se usa el serializador normal.
+
+Se activa con SMARTCONNECT['SERIALIZACION_RAPIDA']. Se conservan los
+PLANES_MAX planes usados más recientemente (LRU).
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.settings import ISO_8601, api_settings
+
+from .conf import smartconnect_setting
+
+
+# Campos cuya representación es el valor de la columna tal cual
+IDENTIDAD = (
+    serializers.CharField, serializers.ChoiceField, serializers.IntegerField,
+    serializers.BooleanField, serializers.ReadOnlyField,
+)
+
+# Planes compilados que se conservan: ?fields= permite muchas combinaciones
+# de campos por serializador y cada una es un plan distinto
+PLANES_MAX = 128
+
+
+class NoCompilable(Exception):
+    pass
+
+
+def _fecha_compilable(campo):
+    return (
+        settings.USE_TZ and not hasattr(campo, 'timezone')
+        and getattr(campo, 'format', api_settings.DATETIME_FORMAT) == ISO_8601
+    )
+
+
+def _columna(modelo, nombre):
+    try:
+        return modelo._meta.get_field(nombre)
+    except FieldDoesNotExist:
+        raise NoCompilable(nombre)
+
+
+def _ruta(modelo, ruta):
+    """(columna para values(), FK anulable que la contiene o None) de una ruta a__b"""
+    partes = ruta.split('__')
+    campo = _columna(modelo, partes[0])
+    if len(partes) == 1 and campo.concrete and not campo.many_to_many:
+        return ruta, None
+    if len(partes) == 2 and campo.many_to_one:
+        _columna(campo.related_model, partes[1])
+        return ruta, partes[0] if campo.null else None
+    raise NoCompilable(ruta)
+
+
+class Plan:
+    """Serializador compilado: columnas de values() y función fila -> dict"""
+
+    def __init__(self, serializer_class, campos=None):
+        serializer = serializer_class(context={'campos': campos})
+        meta = serializer.Meta
+        modelo = meta.model
+        calculados = getattr(meta, 'calculados', {})
+        dependencias = getattr(meta, 'dependencias', {})
+        self.pk = modelo._meta.pk.name
+        self.columnas = []
+        self.many_to_many = []
+        self.funciones = []
+        lineas = []
+
+        def columna(ruta):
+            if ruta not in self.columnas:
+                self.columnas.append(ruta)
+            return f'f[{ruta!r}]'
+
+        for nombre, campo in serializer.fields.items():
+            if campo.write_only:
+                continue
+            guarda = None
+            if isinstance(campo, ManyRelatedField):
+                if not isinstance(campo.child_relation, PrimaryKeyRelatedField):
+                    raise NoCompilable(nombre)
+                relacion = _columna(modelo, campo.source)
+                if not relacion.many_to_many or relacion.auto_created:
+                    raise NoCompilable(nombre)
+                expresion = f'_m2m[{len(self.many_to_many)}].get({columna(self.pk)}, [])'
+                self.many_to_many.append(relacion)
+            elif nombre in calculados:
+                rutas = [_ruta(modelo, ruta) for ruta in dependencias.get(nombre, ())]
+                guardas = {fk for _, fk in rutas}
+                if len(guardas) > 1:
+                    raise NoCompilable(nombre)
+                guarda = guardas.pop() if guardas else None
+                expresion = f'_calc[{len(self.funciones)}]({", ".join(columna(ruta) for ruta, _ in rutas)})'
+                self.funciones.append(calculados[nombre])
+            elif isinstance(campo, PrimaryKeyRelatedField):
+                if campo.pk_field is not None or '.' in campo.source:
+                    raise NoCompilable(nombre)
+                expresion = columna(_ruta(modelo, campo.source)[0])
+            else:
+                ruta, guarda = _ruta(modelo, campo.source.replace('.', '__'))
+                expresion = columna(ruta)
+            if isinstance(campo, serializers.DateTimeField):
+                if not _fecha_compilable(campo):
+                    raise NoCompilable(nombre)
+                expresion = f'_fecha({expresion})'
+            elif isinstance(campo, serializers.JSONField):
+                if campo.binary:
+                    raise NoCompilable(nombre)
+            elif not isinstance(campo, (IDENTIDAD, ManyRelatedField, PrimaryKeyRelatedField)):
+                raise NoCompilable(nombre)
+            if guarda is not None:
+                # Como DRF: con la relación nula el campo no aparece
+                lineas.append(f'        if {columna(guarda)} is not None:')
+                lineas.append(f'            d[{nombre!r}] = {expresion}')
+            else:
+                lineas.append(f'        d[{nombre!r}] = {expresion}')
+
+        codigo = '\n'.join([
+            'def fabricar(_tz, _m2m, _calc):',
+            '    def _fecha(v):',
+            '        if not v:',
+            '            return None',
+            '        v = v.astimezone(_tz).isoformat()',
+            "        return v[:-6] + 'Z' if v.endswith('+00:00') else v",
+            '    def convertir(f):',
+            '        d = {}',
+            *lineas,
+            '        return d',
+            '    return convertir',
+        ])
+        espacio = {}
+        exec(compile(codigo, f'<rapido {serializer_class.__name__}>', 'exec'), espacio)
+        self._fabricar = espacio['fabricar']
+
+    def filas(self, queryset, *adicionales):
+        """queryset como diccionarios con las columnas del plan (y las adicionales)"""
+        return queryset.values(*self.columnas, *(c for c in adicionales if c not in self.columnas))
+
+    def _many_to_many(self, relacion, filas):
+        if not filas:
+            return {}
+        origen, destino = relacion.m2m_field_name(), relacion.m2m_reverse_field_name()
+        # Mismo orden que relacion.all(): Meta.ordering del modelo relacionado
+        orden = [
+            f'-{destino}__{campo[1:]}' if campo.startswith('-') else f'{destino}__{campo}'
+            for campo in relacion.related_model._meta.ordering
+        ]
+        resultado = {}
+        consulta = (
+            relacion.remote_field.through.objects
+            .filter(**{f'{origen}__in': [fila[self.pk] for fila in filas]})
+            .order_by(*orden).values_list(origen, destino)
+        )
+        for pk, relacionado in consulta:
+            resultado.setdefault(pk, []).append(relacionado)
+        return resultado
+
+    def serializar(self, filas):
+        """Lista de dicts de salida para filas de values() (o un queryset ya con filas())"""
+        filas = list(filas)
+        convertir = self._fabricar(
+            timezone.get_current_timezone(),
+            [self._many_to_many(relacion, filas) for relacion in self.many_to_many],
+            self.funciones,
+        )
+        return [convertir(fila) for fila in filas]
+
+
+@lru_cache(maxsize=PLANES_MAX)
+def _compilar(serializer_class, campos):
+    try:
+        return Plan(serializer_class, campos)
+    except NoCompilable:
+        return None
+
+
+def compilar(serializer_class, campos=None):
+    """Plan de serializer_class con los campos indicados, o None si no se puede compilar"""
+    return _compilar(serializer_class, frozenset(campos) if campos is not None else None)
+
+
+def plan_rapido(serializer_class, campos=None):
+    """Plan compilado si la serialización rápida está activada y el serializador lo permite"""
+    if not smartconnect_setting('SERIALIZACION_RAPIDA'):
+        return None
+    return compilar(serializer_class, campos)
@@ -0,0 +1,222 @@
+"""
+Renderer y parser JSON sobre orjson con la misma salida que los de DRF
+
+ORJSONRenderer produce byte a byte lo mismo que rest_framework.renderers.
+JSONRenderer con la configuración por defecto (UNICODE_JSON, COMPACT_JSON,
+STRICT_JSON): fechas, Decimal, UUID, ReturnDict/ReturnList y ErrorDetail
+incluidos. Donde orjson escribiría otra cosa (floats en notación exponencial,
+enteros de más de 64 bits, salida indentada, otra configuración de DRF) o si
+orjson no está instalado, se usa el renderer de DRF. NaN e Infinity, que
+orjson escribiría como null, pasan también por JSONRenderer, que los rechaza
+con el mismo ValueError.
+
+Las comprobaciones miran solo los valores que pueden salir distintos: los
+Decimal al pasar por el hook default de orjson y los floats (y las fechas
+con desplazamiento) con un recorrido por niveles de los datos hecho con
+map/chain, en C, que de la salida de un serializador solo baja a los campos
+que pueden llevar floats (JSONField, SerializerMethodField...). UUID, fechas
+y textos los escribe orjson directamente.
+
+ORJSONParser interpreta el cuerpo con orjson y, si falla, con json para dar
+el mismo resultado o el mismo mensaje de error que JSONParser.
+"""
+import codecs
+import math
+import re
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import chain, compress, repeat
+from operator import attrgetter, is_, methodcaller
+from uuid import UUID
+
+from django.conf import settings
+from django.utils.functional import Promise
+from rest_framework import serializers
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders, json
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Floats que json y orjson escriben distinto: los de notación exponencial
+# (json: 1e+16, 2.5e-07; orjson: 1e16, 2.5e-7) y los menores que 1e-4 (json:
+# 1e-05; orjson: 0.00001)
+_FLOAT_MAXIMO = 1e16
+_FLOAT_MINIMO = 1e-4
+# orjson lee como float los enteros que no caben en 64 bits
+_ENTERO_LARGO = re.compile(rb'[0-9]{19}')
+# Valores sin floats dentro que el recorrido no necesita mirar (los demás
+# tipos desconocidos los decide JSONRenderer)
+_ESCALARES = frozenset({str, int, bool, type(None), Decimal, UUID, date, time, timedelta, ErrorDetail})
+_SEGUNDOS = 60
+_segundos = attrgetter('seconds')
+_microsegundos = attrgetter('microseconds')
+# Campos de serializador cuya salida no necesita recorrerse (ver _seguro)
+_CAMPOS_SEGUROS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+_CAMPOS_FECHA = (serializers.DateTimeField, serializers.DateField, serializers.TimeField)
+_encoder_default = encoders.JSONEncoder().default
+
+
+class _Delegar(TypeError):
+    """El valor lo escribe JSONRenderer (y falla si JSONRenderer falla)"""
+
+
+def _float_distinto(valor):
+    valor = abs(valor)
+    return valor >= _FLOAT_MAXIMO or 0 < valor < _FLOAT_MINIMO
+
+
+def _default(valor):
+    """
+    Hook default de orjson: lo que orjson no escribe por sí mismo pasa por el
+    JSONEncoder de DRF (Decimal como float, textos traducibles, timedelta);
+    los Decimal no finitos o que json escribiría en otro formato se delegan
+    """
+    if type(valor) is Decimal:
+        if not valor.is_finite() or _float_distinto(float(valor)):
+            raise _Delegar()
+        return float(valor)
+    return _encoder_default(valor)
+
+
+def _seguro(campo):
+    """Campo cuya salida es siempre texto, entero, booleano o null"""
+    if isinstance(campo, _CAMPOS_FECHA):
+        return getattr(campo, 'format', api_settings.DATETIME_FORMAT) is not None
+    if isinstance(campo, serializers.PrimaryKeyRelatedField):
+        return campo.pk_field is None
+    return isinstance(campo, _CAMPOS_SEGUROS)
+
+
+def _valores_a_revisar(valor):
+    """
+    Valores de un ReturnDict o de las filas de un ReturnList que pueden
+    contener floats, según los campos de su serializador (p.ej. metadata de
+    EventoSerializer); None si la salida no corresponde a esos campos
+    """
+    serializer = getattr(valor, 'serializer', None)
+    if serializer is None:
+        return None
+    filas = [valor] if isinstance(valor, dict) else valor
+    if isinstance(valor, list):
+        serializer = getattr(serializer, 'child', None)
+    campos = getattr(serializer, 'fields', None)
+    if campos is None:
+        return None
+    legibles = [campo for campo in campos.values() if not campo.write_only]
+    # Las filas solo llevan campos del serializador (los que no se pueden leer se omiten); una
+    # con otras claves (to_representation propio, añadidas después) se recorre entera
+    if set(map(type, filas)) - {dict, OrderedDict, ReturnDict}:
+        return None
+    if not set(chain.from_iterable(filas)) <= {campo.field_name for campo in legibles}:
+        return None
+    return list(chain.from_iterable(
+        map(methodcaller('get', campo.field_name), filas) for campo in legibles if not _seguro(campo)
+    ))
+
+
+def _floats_a_delegar(datos):
+    """
+    Indica si datos contiene algo que orjson escribiría distinto que json:
+    floats no finitos (orjson los escribe como null) o en notación
+    exponencial, fechas con desplazamientos de segundos o tipos que el
+    recorrido no conoce. Recorre los datos por niveles: cada nivel se aplana
+    y se clasifica por tipo con map/chain, sin un bucle en Python por valor,
+    y de la salida de un serializador solo se miran los campos que pueden
+    llevar floats.
+    """
+    nivel = [datos]
+    while nivel:
+        tipos = list(map(type, nivel))
+        distintos = set(tipos).difference(_ESCALARES)
+        siguiente = []
+        for tipo in distintos:
+            valores = list(compress(nivel, map(is_, tipos, repeat(tipo))))
+            if tipo is ReturnDict or tipo is ReturnList:
+                # Los que no corresponden a los campos de su serializador se recorren enteros
+                enteros = []
+                for valor in valores:
+                    revisar = _valores_a_revisar(valor)
+                    if revisar is None:
+                        enteros.append(valor)
+                    else:
+                        siguiente.extend(revisar)
+                valores = enteros
+            if issubclass(tipo, dict):
+                siguiente.extend(chain.from_iterable(map(dict.values, valores)))
+            elif issubclass(tipo, (list, tuple)):
+                siguiente.extend(chain.from_iterable(valores))
+            elif tipo is float:
+                if not all(map(math.isfinite, valores)):
+                    return True
+                absolutos = list(map(abs, valores))
+                if max(absolutos) >= _FLOAT_MAXIMO or min(filter(None, absolutos), default=1) < _FLOAT_MINIMO:
+                    return True
+            elif tipo is datetime:
+                # orjson omite los segundos y microsegundos del desplazamiento
+                desplazamientos = list(filter(None, map(datetime.utcoffset, valores)))
+                if (
+                    any(map(_SEGUNDOS.__rmod__, map(_segundos, desplazamientos)))
+                    or any(map(_microsegundos, desplazamientos))
+                ):
+                    return True
+            elif not issubclass(tipo, (str, int, Promise)):
+                return True
+        nivel = siguiente
+    return False
+
+
+class ORJSONRenderer(JSONRenderer):
+
+    def _compatible(self, accepted_media_type, renderer_context):
+        return (
+            orjson is not None
+            and not self.ensure_ascii and self.compact and self.strict
+            and self.encoder_class is encoders.JSONEncoder
+            and self.get_indent(accepted_media_type, renderer_context or {}) is None
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not self._compatible(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        if _floats_a_delegar(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # UUID y fechas los escribe orjson como el JSONEncoder de DRF (con OPT_UTC_Z, sufijo Z)
+            ret = orjson.dumps(data, default=_default, option=orjson.OPT_UTC_Z)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Como JSONRenderer: U+2028 y U+2029 escapados (válidos en JSON, no en JavaScript)
+        if b'\xe2\x80' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class ORJSONParser(JSONParser):
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        contenido = stream.read()
+        if not _ENTERO_LARGO.search(contenido):
+            try:
+                return orjson.loads(contenido)
+            except orjson.JSONDecodeError:
+                pass
+        # Enteros de más de 64 bits, escapes de surrogates o JSON inválido: json decide
+        try:
+            return json.loads(contenido.decode(encoding), parse_constant=json.strict_constant)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,158 @@
+"""
+Caché compartida de respuestas de lectura: departamentos, sensores, barreras
+y /api/info/
+
+La clave de cada respuesta combina la URL (ruta y query string), el tipo de
+contenido negociado con sus parámetros (indent, profile...), el alcance de
+permisos del usuario (ADMIN, OPERADOR o anónimo) y el número de generación
+de cada modelo del que depende. Guardar o eliminar una instancia (señales) o
+un update()/bulk_create() sobre los querysets de catálogo incrementa la
+generación del modelo: las claves anteriores dejan de usarse sin tener que
+buscarlas ni borrarlas, con cualquier backend (memoria local, ficheros...).
+Las generaciones se guardan en la misma caché, así que con un backend
+compartido (FileBasedCache en el mismo servidor) la invalidación llega a
+todos los workers de gunicorn.
+
+Solo se guardan respuestas 200 a GET renderizadas como JSON. Una respuesta
+cacheada conserva su ETag y Last-Modified (ver api/condicional.py) y puede
+acabar en 304 sin consultar la base de datos.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .conf import smartconnect_setting
+
+
+PREFIJO_GENERACION = 'smartconnect:generacion:'
+PREFIJO_RESPUESTA = 'smartconnect:respuesta:v1:'
+CABECERAS = ('ETag', 'Last-Modified')
+
+
+def _cache():
+    return caches[smartconnect_setting('RESPUESTAS_CACHE_ALIAS')]
+
+
+def _clave_generacion(modelo):
+    return f'{PREFIJO_GENERACION}{modelo._meta.label_lower}'
+
+
+def generaciones(modelos):
+    """Generación actual de cada modelo"""
+    claves = [_clave_generacion(modelo) for modelo in modelos]
+    valores = _cache().get_many(claves)
+    for clave in claves:
+        if clave not in valores:
+            # Una generación nueva o expulsada de la caché empieza en la hora
+            # actual en nanosegundos: nunca repite un valor anterior
+            _cache().add(clave, time.time_ns(), None)
+            valores[clave] = _cache().get(clave)
+    return [valores[clave] for clave in claves]
+
+
+def incrementar_generacion(*modelos):
+    """
+    Invalida las respuestas que dependen de los modelos indicados. Se repite
+    al confirmar la transacción para que una lectura concurrente no guarde
+    con la nueva generación datos anteriores al commit.
+    """
+    if not smartconnect_setting('RESPUESTAS_CACHE_ENABLED'):
+        return
+    claves = [_clave_generacion(modelo) for modelo in modelos]
+
+    def incrementar():
+        for clave in claves:
+            try:
+                _cache().incr(clave)
+            except ValueError:
+                _cache().add(clave, time.time_ns(), None)
+
+    incrementar()
+    transaction.on_commit(incrementar)
+
+
+def alcance(usuario):
+    """Alcance de permisos con el que se comparte una respuesta (ver IsAdminOrReadOnly)"""
+    if not usuario or not usuario.is_authenticated:
+        return 'ANONIMO'
+    return 'ADMIN' if usuario.rol == 'ADMIN' else 'OPERADOR'
+
+
+def _clave(request, modelos):
+    # La URL absoluta: los enlaces de paginación incluyen el host. El tipo
+    # negociado con sus parámetros: Accept: application/json; indent=4 cambia el cuerpo
+    partes = [
+        alcance(request.user), request.build_absolute_uri(), request.accepted_media_type,
+        *map(str, generaciones(modelos)),
+    ]
+    return PREFIJO_RESPUESTA + hashlib.md5('|'.join(partes).encode(), usedforsecurity=False).hexdigest()
+
+
+def _desde_cache(request, guardada):
+    respuesta = HttpResponse(guardada['contenido'], content_type=guardada['content_type'])
+    for cabecera, valor in guardada['cabeceras'].items():
+        respuesta[cabecera] = valor
+    return get_conditional_response(
+        request,
+        etag=respuesta.get('ETag'),
+        last_modified=parse_http_date_safe(respuesta.get('Last-Modified', '')),
+        response=respuesta,
+    )
+
+
+def respuesta_cacheada(*modelos):
+    """
+    Decorador de vistas (o acciones) de lectura de DRF: sirve la respuesta
+    desde la caché mientras no cambie ninguno de los modelos indicados
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if (
+                not smartconnect_setting('RESPUESTAS_CACHE_ENABLED')
+                or request.method != 'GET'
+                or request.accepted_renderer.format != 'json'
+            ):
+                return vista(request, *args, **kwargs)
+
+            clave = _clave(request, modelos)
+            guardada = _cache().get(clave)
+            if guardada is not None:
+                return _desde_cache(request, guardada)
+
+            respuesta = vista(request, *args, **kwargs)
+            if respuesta.status_code != 200 or not hasattr(respuesta, 'add_post_render_callback'):
+                return respuesta
+
+            def guardar(renderizada):
+                # Tras finalize_response y el renderizado: contenido y cabeceras definitivos
+                _cache().set(clave, {
+                    'contenido': renderizada.content,
+                    'content_type': renderizada['Content-Type'],
+                    'cabeceras': {c: renderizada[c] for c in CABECERAS if renderizada.has_header(c)},
+                }, smartconnect_setting('RESPUESTAS_CACHE_TIMEOUT'))
+
+            respuesta.add_post_render_callback(guardar)
+            return respuesta
+        return envoltura
+    return decorador
+
+
+class RespuestaCacheMixin:
+    """
+    ViewSet cuyas acciones GET de cache_acciones se sirven desde la caché de
+    respuestas mientras no cambie ninguno de cache_modelos
+    """
+    cache_acciones = ('list', 'retrieve')
+    cache_modelos = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if getattr(self, 'action_map', {}).get('get') in self.cache_acciones:
+            self.get = respuesta_cacheada(*self.cache_modelos)(self.get)
+        return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,123 @@
+"""
+Resúmenes por hora de eventos (ResumenEventoHora)
+
+Cada escritura de eventos (api/buffer.py, incluidos los lotes y el vaciado
+del buffer, y la fusión de denegaciones de api/acceso.py) suma sus eventos
+al resumen en la misma transacción con un único UPSERT
+(INSERT ... ON CONFLICT DO UPDATE SET total = total + excluded.total).
+El total cuenta intentos: las repeticiones fusionadas en un mismo evento
+también suman. resumir_eventos reconstruye los resúmenes desde el histórico.
+
+Una fusión guarda solo el número de repeticiones y el último intento, así
+que todas cuentan en la hora del evento fusionado (la del primer intento):
+una repetición pasada la hora en punto, como mucho DENEGACION_VENTANA
+segundos después, se asigna a la hora anterior. La escritura en línea hace
+lo mismo para que reconstruir dé los mismos totales.
+"""
+from collections import Counter
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import IntegerField, Sum, Value
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Coalesce, TruncHour
+
+from .models import Evento, ResumenEventoHora
+
+
+CAMPOS_CLAVE = ('hora', 'tipo', 'departamento', 'sensor', 'barrera')
+# Filas por sentencia (6 parámetros por fila, por debajo del límite de SQLite)
+LOTE_UPSERT = 100
+
+
+def hora_de(fecha_hora):
+    """Inicio de la hora (UTC) de fecha_hora"""
+    return fecha_hora.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def clave(evento):
+    return (
+        hora_de(evento.fecha_hora),
+        evento.tipo,
+        evento.departamento_id or 0,
+        evento.sensor_id or 0,
+        evento.barrera_id or 0,
+    )
+
+
+def intentos(evento):
+    """Intentos que cuenta un evento al escribirlo: uno más las repeticiones fusionadas en el buffer"""
+    metadata = evento.metadata
+    return metadata.get('repeticiones', 1) if isinstance(metadata, dict) else 1
+
+
+def acumular(eventos):
+    """Suma los eventos a sus resúmenes por hora"""
+    contador = Counter()
+    for evento in eventos:
+        contador[clave(evento)] += intentos(evento)
+    sumar(contador)
+
+
+def sumar(contador):
+    """Aplica {clave: cantidad} a los resúmenes con UPSERT por lotes"""
+    if not contador:
+        return
+    tabla = ResumenEventoHora._meta.db_table
+    columnas = ', '.join(CAMPOS_CLAVE)
+    # Orden estable de claves para que dos escrituras concurrentes no se bloqueen mutuamente
+    filas = sorted(contador.items())
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(filas), LOTE_UPSERT):
+            bloque = filas[inicio:inicio + LOTE_UPSERT]
+            parametros = []
+            for (hora, tipo, departamento, sensor, barrera), total in bloque:
+                parametros += [
+                    connection.ops.adapt_datetimefield_value(hora), tipo, departamento, sensor, barrera, total
+                ]
+            cursor.execute(
+                f'INSERT INTO {tabla} ({columnas}, total) VALUES '
+                + ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(bloque))
+                + f' ON CONFLICT ({columnas}) DO UPDATE SET total = {tabla}.total + excluded.total',
+                parametros
+            )
+
+
+def reconstruir(desde, hasta):
+    """
+    Recalcula los resúmenes de las horas en [desde, hasta) a partir de los
+    eventos (un GROUP BY sobre el rango de fecha_hora) en una transacción.
+    Devuelve el número de filas de resumen escritas.
+    """
+    filas = (
+        Evento.objects
+        .filter(fecha_hora__gte=desde, fecha_hora__lt=hasta)
+        .annotate(
+            h=TruncHour('fecha_hora', tzinfo=dt_timezone.utc),
+            d=Coalesce('departamento_id', Value(0)),
+            s=Coalesce('sensor_id', Value(0)),
+            b=Coalesce('barrera_id', Value(0)),
+        )
+        .values('h', 'tipo', 'd', 's', 'b')
+        .annotate(n=Sum(Coalesce(Cast(KT('metadata__repeticiones'), IntegerField()), Value(1))))
+        .order_by()
+    )
+    with transaction.atomic():
+        ResumenEventoHora.objects.filter(hora__gte=desde, hora__lt=hasta).delete()
+        resumenes = ResumenEventoHora.objects.bulk_create([
+            ResumenEventoHora(
+                hora=fila['h'], tipo=fila['tipo'], departamento=fila['d'],
+                sensor=fila['s'], barrera=fila['b'], total=fila['n']
+            )
+            for fila in filas
+        ], batch_size=1000)
+    return len(resumenes)
+
+
+def horas(desde, hasta, paso):
+    """Tramos [inicio, fin) de paso horas entre desde y hasta"""
+    inicio = desde
+    while inicio < hasta:
+        fin = min(inicio + timedelta(hours=paso), hasta)
+        yield inicio, fin
+        inicio = fin
@@ -0,0 +1,118 @@
+"""
+Retención de eventos por meses (podar_eventos)
+
+No hay particionado: todos los eventos viven en api_evento. Los meses
+completos anteriores a la retención (EVENTOS_RETENCION_MESES, además del
+actual) se vuelcan a <destino>/api_evento_AAAAMM.ndjson.gz, leyendo solo el
+rango de fecha_hora del mes por su índice, y después se eliminan por tramos
+de ids, cada uno en su propia transacción, para no bloquear la tabla durante
+todo el mes. Solo se eliminan los eventos volcados (ids hasta el mayor del
+archivo): los que llegan a ese mes mientras tanto, p.ej. por la ingesta
+diferida, quedan para la siguiente poda. Los resúmenes por hora
+(ResumenEventoHora) se conservan.
+"""
+import gzip
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Evento
+
+
+def inicio_mes(fecha):
+    """Primer instante (UTC) del mes de fecha"""
+    fecha = fecha.astimezone(dt_timezone.utc) if timezone.is_aware(fecha) else fecha
+    return datetime(fecha.year, fecha.month, 1, tzinfo=dt_timezone.utc)
+
+
+def sumar_meses(inicio, meses):
+    indice = inicio.year * 12 + inicio.month - 1 + meses
+    return datetime(indice // 12, indice % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def ruta_archivo(destino, inicio):
+    """destino/api_evento_AAAAMM.ndjson.gz, o _AAAAMM-2, -3... si el mes ya se archivó antes"""
+    base = os.path.join(destino, f'{Evento._meta.db_table}_{inicio:%Y%m}')
+    ruta, n = f'{base}.ndjson.gz', 1
+    while os.path.exists(ruta):
+        n += 1
+        ruta = f'{base}-{n}.ndjson.gz'
+    return ruta
+
+
+def _del_mes(inicio):
+    return Evento.objects.filter(fecha_hora__gte=inicio, fecha_hora__lt=sumar_meses(inicio, 1))
+
+
+def vencidos(retencion_meses, ahora=None):
+    """Inicios de los meses con eventos completamente anteriores a la retención"""
+    limite = sumar_meses(inicio_mes(ahora or timezone.now()), -retencion_meses)
+    primero = Evento.objects.filter(fecha_hora__lt=limite).order_by('fecha_hora').values_list(
+        'fecha_hora', flat=True
+    ).first()
+    if primero is None:
+        return []
+    meses = []
+    inicio = inicio_mes(primero)
+    while inicio < limite:
+        # Cada comprobación es una búsqueda en el índice de fecha_hora
+        if _del_mes(inicio).exists():
+            meses.append(inicio)
+        inicio = sumar_meses(inicio, 1)
+    return meses
+
+
+def archivar_mes(inicio, destino, lote=2000):
+    """
+    Vuelca los eventos del mes a destino/api_evento_AAAAMM.ndjson.gz (un evento
+    JSON por línea, en orden cronológico) y devuelve (ruta, filas, ultimo_id).
+    El fichero se escribe con un nombre temporal y se renombra al terminar; no
+    sustituye el archivo de una poda anterior del mismo mes.
+    """
+    os.makedirs(destino, exist_ok=True)
+    ruta = ruta_archivo(destino, inicio)
+    filas = 0
+    ultimo_id = None
+    eventos = _del_mes(inicio).order_by('fecha_hora', 'id').values().iterator(chunk_size=lote)
+    with gzip.open(f'{ruta}.tmp', 'wt', encoding='utf-8') as archivo:
+        for evento in eventos:
+            archivo.write(json.dumps(evento, default=str, ensure_ascii=False))
+            archivo.write('\n')
+            filas += 1
+            ultimo_id = max(evento['id'], ultimo_id or 0)
+    os.replace(f'{ruta}.tmp', ruta)
+    return ruta, filas, ultimo_id
+
+
+def eliminar_mes(inicio, lote=2000, hasta_id=None):
+    """Elimina los eventos del mes (con id <= hasta_id, si se indica) por tramos de ids; devuelve cuántos"""
+    eventos = _del_mes(inicio)
+    if hasta_id is not None:
+        eventos = eventos.filter(id__lte=hasta_id)
+    eliminados = 0
+    while True:
+        with transaction.atomic():
+            ids = list(eventos.values_list('id', flat=True)[:lote])
+            if not ids:
+                return eliminados
+            eliminados += Evento.objects.filter(pk__in=ids).delete()[0]
+
+
+def podar(retencion_meses, destino=None, ahora=None, lote=2000):
+    """
+    Archiva (si hay destino) y elimina los meses anteriores a la retención.
+    Devuelve una lista de (inicio_mes, ruta_archivo, eventos_eliminados).
+    """
+    resultado = []
+    for inicio in vencidos(retencion_meses, ahora):
+        if destino:
+            ruta, _, ultimo_id = archivar_mes(inicio, destino, lote)
+            if ultimo_id is None:
+                continue
+        else:
+            ruta = ultimo_id = None
+        resultado.append((inicio, ruta, eliminar_mes(inicio, lote, ultimo_id)))
+    return resultado
@@ -1,9 +1,19 @@
+from datetime import timedelta
+
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
+from django.utils import timezone
 from .models import Usuario, Departamento, Sensor, Barrera, Evento
+from .conf import smartconnect_setting
+from .campos import CamposSerializerMixin
+
 
+def nombre_completo(first_name, last_name):
+    """Usuario.get_full_name a partir de las columnas (serialización rápida, api/rapido.py)"""
+    return f'{first_name} {last_name}'.strip()
 
-class UsuarioSerializer(serializers.ModelSerializer):
+
+class UsuarioSerializer(CamposSerializerMixin, serializers.ModelSerializer):
     """
     Serializador para el modelo Usuario
     """
@@ -51,7 +61,7 @@ class UsuarioSerializer(serializers.ModelSerializer):
         return instance
 
 
-class UsuarioListSerializer(serializers.ModelSerializer):
+class UsuarioListSerializer(CamposSerializerMixin, serializers.ModelSerializer):
     """
     Serializador simplificado para listado de usuarios
     """
@@ -62,26 +72,46 @@ class UsuarioListSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
-class DepartamentoSerializer(serializers.ModelSerializer):
+class DepartamentoSerializer(CamposSerializerMixin, serializers.ModelSerializer):
     """
     Serializador para el modelo Departamento
+    Los totales salen de las anotaciones de Departamento.objects.con_totales();
+    con context['por_estado'] se incluye sensores_por_estado.
     """
     total_sensores = serializers.SerializerMethodField()
     total_barreras = serializers.SerializerMethodField()
+    sensores_por_estado = serializers.SerializerMethodField()
     
     class Meta:
         model = Departamento
         fields = ['id', 'nombre', 'descripcion', 'ubicacion', 'activo', 
-                  'total_sensores', 'total_barreras', 'fecha_creacion', 
+                  'total_sensores', 'total_barreras', 'sensores_por_estado', 'fecha_creacion', 
                   'fecha_actualizacion']
         read_only_fields = ['id', 'fecha_creacion', 'fecha_actualizacion']
+        # Anotaciones de con_totales, no columnas (api/campos.py)
+        dependencias = {'total_sensores': [], 'total_barreras': [], 'sensores_por_estado': []}
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.context.get('por_estado'):
+            self.fields.pop('sensores_por_estado', None)
     
     def get_total_sensores(self, obj):
+        # Sin anotar (p.ej. recién creado) se cuenta con una consulta
+        if hasattr(obj, 'total_sensores'):
+            return obj.total_sensores
         return obj.sensores.count()
     
     def get_total_barreras(self, obj):
+        if hasattr(obj, 'total_barreras'):
+            return obj.total_barreras
         return obj.barreras.count()
     
+    def get_sensores_por_estado(self, obj):
+        if not hasattr(obj, 'sensores_activo'):
+            obj = Departamento.objects.con_totales(por_estado=True).get(pk=obj.pk)
+        return {estado: getattr(obj, f'sensores_{estado.lower()}') for estado, _ in Sensor.ESTADO_CHOICES}
+    
     def validate_nombre(self, value):
         value = value.strip()
         if len(value) < 3:
@@ -95,7 +125,7 @@ class DepartamentoSerializer(serializers.ModelSerializer):
         return value
 
 
-class SensorSerializer(serializers.ModelSerializer):
+class SensorSerializer(CamposSerializerMixin, serializers.ModelSerializer):
     """
     Serializador para el modelo Sensor
     """
@@ -105,9 +135,11 @@ class SensorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Sensor
         fields = ['id', 'uid', 'nombre', 'descripcion', 'estado', 'departamento', 
-                  'departamento_nombre', 'usuario_asignado', 'usuario_nombre', 
-                  'fecha_creacion', 'fecha_actualizacion']
+                  'departamento_nombre', 'departamentos_adicionales', 'usuario_asignado', 
+                  'usuario_nombre', 'fecha_creacion', 'fecha_actualizacion']
         read_only_fields = ['id', 'fecha_creacion', 'fecha_actualizacion']
+        dependencias = {'usuario_nombre': ['usuario_asignado__first_name', 'usuario_asignado__last_name']}
+        calculados = {'usuario_nombre': nombre_completo}
     
     def validate_uid(self, value):
         value = value.strip().upper()
@@ -134,7 +166,7 @@ class SensorSerializer(serializers.ModelSerializer):
         return value
 
 
-class BarreraSerializer(serializers.ModelSerializer):
+class BarreraSerializer(CamposSerializerMixin, serializers.ModelSerializer):
     """
     Serializador para el modelo Barrera
     """
@@ -159,7 +191,7 @@ class BarreraSerializer(serializers.ModelSerializer):
         return value
 
 
-class EventoSerializer(serializers.ModelSerializer):
+class EventoSerializer(CamposSerializerMixin, serializers.ModelSerializer):
     """
     Serializador para el modelo Evento
     """
@@ -167,13 +199,20 @@ class EventoSerializer(serializers.ModelSerializer):
     sensor_nombre = serializers.CharField(source='sensor.nombre', read_only=True)
     barrera_nombre = serializers.CharField(source='barrera.nombre', read_only=True)
     usuario_nombre = serializers.CharField(source='usuario_accion.get_full_name', read_only=True)
+    # Generada al leer a partir de codigo y metadata (Evento.MENSAJES)
+    descripcion = serializers.CharField(source='texto_descripcion', read_only=True)
     
     class Meta:
         model = Evento
         fields = ['id', 'tipo', 'sensor', 'sensor_uid', 'sensor_nombre', 
-                  'barrera', 'barrera_nombre', 'usuario_accion', 'usuario_nombre', 
+                  'barrera', 'barrera_nombre', 'departamento', 'usuario_accion', 'usuario_nombre', 
                   'descripcion', 'metadata', 'fecha_hora']
         read_only_fields = ['id', 'fecha_hora']
+        dependencias = {
+            'usuario_nombre': ['usuario_accion__first_name', 'usuario_accion__last_name'],
+            'descripcion': ['tipo', 'codigo', 'descripcion', 'metadata'],
+        }
+        calculados = {'usuario_nombre': nombre_completo, 'descripcion': Evento.formatear_descripcion}
     
     def validate(self, attrs):
         tipo = attrs.get('tipo')
@@ -206,6 +245,99 @@ class AccesoSensorSerializer(serializers.Serializer):
         return value.strip().upper()
 
 
+class AccesoSensorItemSerializer(AccesoSensorSerializer):
+    """
+    Serializador para cada acceso de un lote enviado por un gateway
+    """
+    ts = serializers.DateTimeField(required=False)
+
+
+class AccesoSensorLoteSerializer(serializers.Serializer):
+    """
+    Serializador para lotes de accesos (cada item se valida con AccesoSensorItemSerializer)
+    """
+    accesos = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+    
+    def validate_accesos(self, value):
+        maximo = smartconnect_setting('ACCESO_LOTE_MAX_ITEMS')
+        if len(value) > maximo:
+            raise serializers.ValidationError(f"El lote no puede superar {maximo} accesos.")
+        return value
+
+
+class EventoIngestaSerializer(serializers.Serializer):
+    """
+    Serializador de cada línea de la ingesta de eventos diferidos (api/ingesta.py)
+    """
+    # Margen para relojes de lectores algo adelantados
+    TOLERANCIA_FUTURO = timedelta(minutes=5)
+    
+    TIPOS_ACCESO = {'ACCESO_PERMITIDO': True, 'ACCESO_DENEGADO': False}
+    
+    id = serializers.CharField(max_length=64)
+    uid = serializers.CharField(min_length=3)
+    fecha_hora = serializers.DateTimeField()
+    departamento_id = serializers.IntegerField(required=False, allow_null=True)
+    # Decisión que tomó el lector sin conexión (basta con uno de los dos)
+    acceso_permitido = serializers.BooleanField(required=False)
+    tipo = serializers.ChoiceField(choices=list(TIPOS_ACCESO), required=False)
+    
+    def validate_uid(self, value):
+        return value.strip().upper()
+    
+    def validate_fecha_hora(self, value):
+        if value > timezone.now() + self.TOLERANCIA_FUTURO:
+            raise serializers.ValidationError("La fecha_hora no puede estar en el futuro.")
+        return value
+    
+    def validate(self, attrs):
+        tipo = attrs.pop('tipo', None)
+        if tipo is None and 'acceso_permitido' not in attrs:
+            raise serializers.ValidationError({
+                "acceso_permitido": "Indique la decisión del lector (acceso_permitido o tipo)."
+            })
+        if tipo is not None:
+            if attrs.setdefault('acceso_permitido', self.TIPOS_ACCESO[tipo]) != self.TIPOS_ACCESO[tipo]:
+                raise serializers.ValidationError({"tipo": "No coincide con acceso_permitido."})
+        return attrs
+
+
+class SensorImportacionSerializer(serializers.Serializer):
+    """
+    Serializador de cada fila de la importación de sensores (api/importacion.py).
+    No consulta la base de datos: la unicidad del UID, los departamentos (por
+    nombre) y el usuario (por username) se comprueban por tramos.
+    """
+    uid = serializers.CharField(max_length=50)
+    nombre = serializers.CharField(max_length=100)
+    descripcion = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    estado = serializers.ChoiceField(choices=Sensor.ESTADO_CHOICES, default='ACTIVO')
+    departamento = serializers.CharField(max_length=100)
+    departamentos_adicionales = serializers.ListField(
+        child=serializers.CharField(max_length=100), required=False
+    )
+    usuario = serializers.CharField(max_length=150, required=False, allow_null=True)
+    
+    def validate_uid(self, value):
+        # Igual que Sensor.clean
+        value = value.strip().upper()
+        if len(value) < 3:
+            raise serializers.ValidationError("El UID debe tener al menos 3 caracteres.")
+        return value
+    
+    def validate_nombre(self, value):
+        value = value.strip()
+        if len(value) < 3:
+            raise serializers.ValidationError("El nombre debe tener al menos 3 caracteres.")
+        return value
+    
+    def to_internal_value(self, data):
+        # El estado se admite en minúsculas
+        if isinstance(data, dict) and isinstance(data.get('estado'), str):
+            data = {**data, 'estado': data['estado'].strip().upper()}
+        return super().to_internal_value(data)
+
+
 class ControlBarreraSerializer(serializers.Serializer):
     """
     Serializador para control manual de barrera
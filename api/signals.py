@@ -0,0 +1,150 @@
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import cache, respuestas
+from .models import Barrera, CambioSensor, Departamento, Sensor, Usuario
+
+
+def registrar_cambios(uids):
+    """Anota en CambioSensor un cambio por UID (sincronización incremental de la allowlist)"""
+    CambioSensor.objects.bulk_create([CambioSensor(uid=uid) for uid in dict.fromkeys(uids)])
+
+
+@receiver(pre_save, sender=Sensor)
+def recordar_uid_anterior(sender, instance, **kwargs):
+    """Guarda el UID previo para invalidarlo si el sensor cambia de UID"""
+    if instance.pk:
+        instance._uid_anterior = (
+            Sensor.objects.filter(pk=instance.pk).values_list('uid', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Sensor)
+@receiver(post_delete, sender=Sensor)
+def invalidar_sensor(sender, instance, **kwargs):
+    cache.invalidar_uids([instance.uid, getattr(instance, '_uid_anterior', None)])
+
+
+@receiver(post_save, sender=Sensor)
+@receiver(post_delete, sender=Sensor)
+def registrar_cambio_sensor(sender, instance, **kwargs):
+    """Anota el cambio en CambioSensor para la sincronización incremental de la allowlist"""
+    registrar_cambios(uid for uid in (instance.uid, getattr(instance, '_uid_anterior', None)) if uid)
+
+
+@receiver(pre_save, sender=Departamento)
+def recordar_activo_anterior(sender, instance, **kwargs):
+    """Guarda el estado activo previo: cambiarlo modifica la allowlist de sus sensores"""
+    if instance.pk:
+        instance._activo_anterior = (
+            Departamento.objects.filter(pk=instance.pk).values_list('activo', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Departamento)
+def registrar_cambio_departamento(sender, instance, created, **kwargs):
+    anterior = getattr(instance, '_activo_anterior', None)
+    if created or anterior is None or anterior == instance.activo:
+        return
+    sensores = Sensor.objects.filter(Q(departamento=instance) | Q(departamentos_adicionales=instance))
+    registrar_cambios(sensores.values_list('uid', flat=True).distinct())
+
+
+@receiver(post_save, sender=Departamento)
+def invalidar_departamento(sender, instance, created, **kwargs):
+    # El nombre del departamento forma parte de la autorización cacheada.
+    # Al eliminarlo, el borrado en cascada dispara post_delete de cada sensor.
+    if created:
+        return
+    sensores = Sensor.objects.filter(Q(departamento=instance) | Q(departamentos_adicionales=instance))
+    cache.invalidar_uids(sensores.values_list('uid', flat=True).distinct())
+
+
+@receiver(m2m_changed, sender=Sensor.departamentos_adicionales.through)
+def invalidar_departamentos_adicionales(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalida los sensores cuyas autorizaciones por departamento cambian"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            cache.invalidar_uids([instance.uid])
+        return
+    # Desde el departamento: pk_set son sensores (en clear hay que leerlos antes)
+    if action in ('post_add', 'post_remove'):
+        cache.invalidar_uids(Sensor.objects.filter(pk__in=pk_set).values_list('uid', flat=True))
+    elif action == 'pre_clear':
+        cache.invalidar_uids(instance.sensores_autorizados.values_list('uid', flat=True))
+
+
+@receiver(m2m_changed, sender=Sensor.departamentos_adicionales.through)
+def registrar_cambio_departamentos_adicionales(sender, instance, action, reverse, pk_set, **kwargs):
+    """Los departamentos adicionales forman parte de la allowlist"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            registrar_cambios([instance.uid])
+        return
+    if action in ('post_add', 'post_remove'):
+        registrar_cambios(Sensor.objects.filter(pk__in=pk_set).values_list('uid', flat=True))
+    elif action == 'pre_clear':
+        registrar_cambios(instance.sensores_autorizados.values_list('uid', flat=True))
+
+
+@receiver(m2m_changed, sender=Sensor.departamentos_adicionales.through)
+def tocar_sensores_departamentos_adicionales(sender, instance, action, reverse, pk_set, **kwargs):
+    """Actualiza fecha_actualizacion de los sensores afectados (validador del GET condicional)"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Sensor.objects.filter(pk=instance.pk).update(fecha_actualizacion=timezone.now())
+        return
+    if action in ('post_add', 'post_remove'):
+        Sensor.objects.filter(pk__in=pk_set).update(fecha_actualizacion=timezone.now())
+    elif action == 'pre_clear':
+        instance.sensores_autorizados.update(fecha_actualizacion=timezone.now())
+
+
+@receiver(pre_delete, sender=Departamento)
+def tocar_sensores_autorizados(sender, instance, **kwargs):
+    # El borrado en cascada elimina las filas de la tabla intermedia sin m2m_changed
+    # (los sensores del propio departamento se eliminan con su post_delete)
+    instance.sensores_autorizados.update(fecha_actualizacion=timezone.now())
+    registrar_cambios(instance.sensores_autorizados.values_list('uid', flat=True))
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(pre_delete, sender=Usuario)
+def invalidar_usuario(sender, instance, **kwargs):
+    # Se usa pre_delete porque SET_NULL desasigna los sensores antes de post_delete.
+    # El login actualiza last_login en cada autenticación y no afecta a la caché
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    if kwargs.get('created'):
+        return
+    cache.invalidar_uids(instance.sensores.values_list('uid', flat=True))
+
+
+@receiver(post_save, sender=Departamento)
+@receiver(post_delete, sender=Departamento)
+@receiver(post_save, sender=Sensor)
+@receiver(post_delete, sender=Sensor)
+@receiver(post_save, sender=Barrera)
+@receiver(post_delete, sender=Barrera)
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_respuestas(sender, **kwargs):
+    """
+    Nueva generación del modelo en la caché de respuestas. Los cambios en
+    departamentos_adicionales actualizan fecha_actualizacion del sensor con
+    update(), que también la incrementa (ver CatalogoQuerySet)
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    respuestas.incrementar_generacion(sender)
+
+
+@receiver(post_migrate)
+def reiniciar_respuestas(sender, **kwargs):
+    # Una caché en ficheros sobrevive a la base de datos (tests, restauraciones)
+    if sender.name == 'api':
+        respuestas.incrementar_generacion(Departamento, Sensor, Barrera, Usuario)
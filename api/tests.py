@@ -1,3 +1,1666 @@
-from django.test import TestCase
+import csv
+import gzip
+import importlib
+import json
+import os
+import re
+import runpy
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework.utils.serializer_helpers import ReturnDict
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import retencion
+from .acceso import evento_acceso, registrar_acceso_desconocido
+from .buffer import BufferEventos, escribir_eventos, guardar_evento
+from .cache import precalentar_al_iniciar
+from .condicional import validador
+from .exportacion import TAMANO_BLOQUE
+from .feed import Mensaje, PublicadorEventos
+from .rapido import PLANES_MAX, _compilar, compilar
+from .renderers import ORJSONRenderer
+from .resumen import reconstruir
+from .serializers import EventoSerializer, SensorSerializer
+from .ingesta import _existentes
+from .models import Usuario, Departamento, Sensor, Barrera, Evento, CambioSensor, ResumenEventoHora
+from .views import EventoViewSet
+
+
+@override_settings(SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': False})
+class PlanesDeConsultaTests(TestCase):
+    """
+    Captura las consultas de los endpoints y comprueba con EXPLAIN que las
+    tablas de eventos y sensores se leen por índice y no con un recorrido
+    completo de la tabla (SQLite y PostgreSQL).
+    La caché de respuestas se desactiva para que cada petición llegue a la
+    base de datos.
+    """
+    TABLAS = ('api_evento', 'api_sensor')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin_plan', password='x', rol='ADMIN')
+        cls.departamento = Departamento.objects.create(nombre='Departamento plan')
+        cls.sensor = Sensor.objects.create(uid='PLAN-1', nombre='Sensor plan', departamento=cls.departamento)
+        Sensor.objects.create(uid='PLAN-2', nombre='Sensor inactivo', estado='INACTIVO', departamento=cls.departamento)
+        cls.barrera = Barrera.objects.create(nombre='Barrera plan', departamento=cls.departamento)
+        Evento.objects.bulk_create(
+            [Evento(tipo='ACCESO_PERMITIDO', sensor=cls.sensor, departamento=cls.departamento, descripcion='acceso')
+             for _ in range(20)]
+            + [Evento(tipo='BARRERA_ABIERTA', barrera=cls.barrera, departamento=cls.departamento, descripcion='barrera')
+               for _ in range(20)]
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        if connection.vendor == 'postgresql':
+            # Con tablas de prueba tan pequeñas el planificador preferiría Seq Scan
+            # aunque exista el índice; así solo lo elige si no hay alternativa
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def planes(self, funcion):
+        """Ejecuta funcion() y devuelve el EXPLAIN de cada SELECT sobre TABLAS"""
+        with CaptureQueriesContext(connection) as contexto:
+            funcion()
+        planes = []
+        for consulta in contexto.captured_queries:
+            sql = consulta['sql']
+            if not sql.startswith('SELECT') or not re.search(r'FROM "(%s)"' % '|'.join(self.TABLAS), sql):
+                continue
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute('EXPLAIN ' + sql)
+                    planes.append('\n'.join(fila[0] for fila in cursor.fetchall()))
+                else:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    planes.append('\n'.join(fila[-1] for fila in cursor.fetchall()))
+        self.assertTrue(planes, 'No se capturó ninguna consulta sobre las tablas vigiladas')
+        return planes
+
+    def assertUsaIndice(self, funcion, indice):
+        for plan in self.planes(funcion):
+            for tabla in self.TABLAS:
+                if connection.vendor == 'postgresql':
+                    self.assertNotIn(f'Seq Scan on {tabla}', plan)
+                else:
+                    self.assertIsNone(re.search(rf'^SCAN {tabla}$', plan, re.MULTILINE), plan)
+            self.assertIn(indice, plan)
+
+    def get(self, url):
+        return lambda: self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_eventos_listado(self):
+        self.assertUsaIndice(self.get('/api/eventos/'), 'evento_fecha_hora_id_idx')
+
+    def test_eventos_por_tipo(self):
+        self.assertUsaIndice(self.get('/api/eventos/por_tipo/?tipo=ACCESO_PERMITIDO'), 'evento_tipo_fecha_idx')
+
+    def test_eventos_de_sensor(self):
+        consulta = EventoViewSet.queryset.filter(sensor=self.sensor)[:50]
+        self.assertUsaIndice(lambda: list(consulta), 'evento_sensor_fecha_idx')
+
+    def test_eventos_de_barrera(self):
+        consulta = EventoViewSet.queryset.filter(barrera=self.barrera)[:50]
+        self.assertUsaIndice(lambda: list(consulta), 'evento_barrera_fecha_idx')
+
+    def test_eventos_de_departamento(self):
+        self.assertUsaIndice(
+            self.get(f'/api/eventos/?departamento={self.departamento.pk}'), 'evento_depto_fecha_idx'
+        )
+
+    def test_ingesta_duplicados(self):
+        tramo = [{'id': 'LECTOR-1:1', 'fecha_hora': timezone.now()}, {'id': 'LECTOR-1:2', 'fecha_hora': timezone.now()}]
+        self.assertUsaIndice(lambda: _existentes(tramo), 'evento_origen_uniq')
+
+    def test_sensores_activos(self):
+        self.assertUsaIndice(self.get('/api/sensores/activos/'), 'sensor_estado_fecha_idx')
+
+    def test_sensores_de_departamento(self):
+        self.assertUsaIndice(
+            self.get(f'/api/departamentos/{self.departamento.pk}/sensores/'), 'sensor_depto_fecha_idx'
+        )
+
+
+@override_settings(SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': False})
+class ConsultasDepartamentosTests(TestCase):
+    """
+    Los totales de sensores y barreras se anotan en la consulta del listado:
+    listar departamentos (API y admin) cuesta las mismas consultas con 2 que
+    con 10 departamentos.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(
+            username='admin_deptos', password='x', rol='ADMIN', is_staff=True, is_superuser=True
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def crear_departamentos(self, n):
+        for _ in range(n):
+            i = Departamento.objects.count()
+            departamento = Departamento.objects.create(nombre=f'Departamento {i:03d}')
+            Sensor.objects.create(uid=f'DEP-{i:03d}-A', nombre='Activo', departamento=departamento)
+            Sensor.objects.create(uid=f'DEP-{i:03d}-B', nombre='Bloqueado', estado='BLOQUEADO', departamento=departamento)
+            Barrera.objects.create(nombre=f'Barrera {i:03d}', departamento=departamento)
+
+    def consultas(self, cliente, url):
+        with CaptureQueriesContext(connection) as contexto:
+            self.assertEqual(cliente.get(url).status_code, 200)
+        return len(contexto.captured_queries)
+
+    def assertConstante(self, cliente, url):
+        self.crear_departamentos(2)
+        pocas = self.consultas(cliente, url)
+        self.crear_departamentos(8)
+        self.assertEqual(self.consultas(cliente, url), pocas)
+
+    def test_listado_api(self):
+        self.assertConstante(self.client, '/api/departamentos/')
+        departamento = self.client.get('/api/departamentos/').json()['results'][0]
+        self.assertEqual((departamento['total_sensores'], departamento['total_barreras']), (2, 1))
+        self.assertNotIn('sensores_por_estado', departamento)
+
+    def test_listado_api_por_estado(self):
+        self.assertConstante(self.client, '/api/departamentos/?por_estado=true')
+        departamento = self.client.get('/api/departamentos/?por_estado=true').json()['results'][0]
+        self.assertEqual(
+            departamento['sensores_por_estado'], {'ACTIVO': 1, 'INACTIVO': 0, 'BLOQUEADO': 1, 'PERDIDO': 0}
+        )
+
+    def test_detalle_api(self):
+        self.crear_departamentos(1)
+        departamento = Departamento.objects.get()
+        # El validador del GET condicional (ETag) y el departamento con sus totales
+        self.assertEqual(self.consultas(self.client, f'/api/departamentos/{departamento.pk}/?por_estado=1'), 2)
+
+    def test_validador_sin_producto(self):
+        self.crear_departamentos(1)
+        departamento = Departamento.objects.get()
+        Barrera.objects.create(nombre='Barrera extra', departamento=departamento)
+        with CaptureQueriesContext(connection) as contexto:
+            etag = validador(Departamento.objects.all())[0]
+        # Sensores y barreras en subconsultas separadas, sin JOIN sensores × barreras
+        self.assertNotIn('JOIN', contexto.captured_queries[0]['sql'])
+        Barrera.objects.filter(nombre='Barrera extra').delete()
+        self.assertNotEqual(validador(Departamento.objects.all())[0], etag)
+
+    def test_admin_changelist(self):
+        cliente = Client()
+        cliente.force_login(self.admin)
+        self.assertConstante(cliente, '/admin/api/departamento/')
+
+
+@override_settings(SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': False})
+class GetCondicionalTests(TestCase):
+    """
+    Con la versión vigente (If-None-Match o If-Modified-Since) los catálogos
+    responden 304 sin cuerpo; cualquier escritura cambia el ETag
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin_condicional', password='x', rol='ADMIN')
+        cls.departamento = Departamento.objects.create(nombre='Departamento condicional')
+        cls.otro = Departamento.objects.create(nombre='Departamento adicional')
+        cls.sensor = Sensor.objects.create(uid='COND-001', nombre='Activo', departamento=cls.departamento)
+        Sensor.objects.create(uid='COND-002', nombre='Bloqueado', estado='BLOQUEADO', departamento=cls.departamento)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def urls(self):
+        return [
+            '/api/sensores/',
+            f'/api/sensores/{self.sensor.pk}/',
+            '/api/sensores/activos/',
+            f'/api/departamentos/{self.departamento.pk}/sensores/',
+            '/api/departamentos/',
+            f'/api/departamentos/{self.departamento.pk}/',
+        ]
+
+    def etag(self, url):
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta['ETag']
+
+    def test_no_modificado(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                respuesta = self.client.get(url)
+                self.assertEqual(respuesta.status_code, 200)
+                condiciones = {
+                    'HTTP_IF_NONE_MATCH': respuesta['ETag'],
+                    'HTTP_IF_MODIFIED_SINCE': respuesta['Last-Modified'],
+                }
+                for cabecera, valor in condiciones.items():
+                    no_modificado = self.client.get(url, **{cabecera: valor})
+                    self.assertEqual(no_modificado.status_code, 304, cabecera)
+                    self.assertEqual(no_modificado.content, b'')
+                    self.assertEqual(no_modificado['ETag'], respuesta['ETag'])
+
+    def test_otra_version(self):
+        url = '/api/sensores/activos/'
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH='"sensor-anterior"')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['count'], 1)
+
+    def assertCambiaETag(self, escribir, urls=None):
+        antes = {url: self.etag(url) for url in urls or self.urls()}
+        escribir()
+        for url, etag in antes.items():
+            with self.subTest(url=url):
+                self.assertNotEqual(self.etag(url), etag)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_modificacion(self):
+        self.assertCambiaETag(lambda: self.assertEqual(self.client.patch(
+            f'/api/sensores/{self.sensor.pk}/', {'nombre': 'Renombrado'}, format='json'
+        ).status_code, 200))
+
+    def test_eliminacion(self):
+        detalle = f'/api/sensores/{self.sensor.pk}/'
+        self.assertCambiaETag(
+            lambda: self.assertEqual(self.client.delete(detalle).status_code, 200),
+            [url for url in self.urls() if url != detalle],
+        )
+
+    def test_departamentos_adicionales(self):
+        # m2m_changed no guarda el sensor: la señal actualiza su fecha_actualizacion
+        self.assertCambiaETag(lambda: self.sensor.departamentos_adicionales.add(self.otro))
+        self.assertCambiaETag(lambda: self.otro.sensores_autorizados.clear())
+
+
+@override_settings(SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': False})
+class ConsultasColeccionesTests(TestCase):
+    """
+    Las acciones de colección (sensores de un departamento, sensores activos y
+    eventos por tipo) se paginan y cuestan un número fijo de consultas,
+    tengan 5 o 50 filas
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(
+            username='admin_colecciones', password='x', rol='ADMIN', first_name='Ana', last_name='Admin'
+        )
+        cls.departamento = Departamento.objects.create(nombre='Departamento colecciones')
+        cls.otro = Departamento.objects.create(nombre='Otro departamento')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def crear(self, n):
+        for _ in range(n):
+            i = Sensor.objects.count()
+            sensor = Sensor.objects.create(
+                uid=f'COL-{i:03d}', nombre=f'Sensor {i:03d}', departamento=self.departamento,
+                usuario_asignado=self.admin, estado='ACTIVO' if i % 5 else 'BLOQUEADO',
+            )
+            sensor.departamentos_adicionales.add(self.otro)
+            Evento.objects.create(tipo='ACCESO_PERMITIDO', sensor=sensor, departamento=self.departamento)
+
+    def consultas(self, url):
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(contexto.captured_queries), respuesta.json()
+
+    def assertPresupuesto(self, url, presupuesto):
+        """Mismas consultas con 5 que con 50 filas y como máximo presupuesto"""
+        self.crear(5)
+        pocas, _ = self.consultas(url)
+        self.crear(45)
+        muchas, datos = self.consultas(url)
+        self.assertEqual(muchas, pocas)
+        self.assertLessEqual(muchas, presupuesto)
+        return datos
+
+    def test_sensores_de_departamento(self):
+        # get_object, validador del ETag, COUNT, página y departamentos adicionales
+        datos = self.assertPresupuesto(f'/api/departamentos/{self.departamento.pk}/sensores/', 5)
+        self.assertEqual(datos['count'], 50)
+        self.assertEqual(len(datos['results']), 10)
+        self.assertEqual(datos['results'][0]['usuario_nombre'], 'Ana Admin')
+        self.assertEqual(datos['results'][0]['departamentos_adicionales'], [self.otro.pk])
+
+    def test_sensores_de_departamento_filtrados(self):
+        datos = self.assertPresupuesto(
+            f'/api/departamentos/{self.departamento.pk}/sensores/?estado=bloqueado&fields=uid,estado', 5
+        )
+        self.assertEqual(datos['count'], 10)
+        self.assertEqual(set(datos['results'][0]), {'uid', 'estado'})
+
+    def test_sensores_activos(self):
+        # validador del ETag, COUNT, página y departamentos adicionales
+        datos = self.assertPresupuesto('/api/sensores/activos/', 4)
+        self.assertEqual(datos['count'], 40)
+        self.assertEqual(len(datos['results']), 10)
+        self.assertTrue(all(sensor['estado'] == 'ACTIVO' for sensor in datos['results']))
+
+    def test_sensores_activos_filtrados(self):
+        datos = self.assertPresupuesto(f'/api/sensores/activos/?uid=col-001&usuario={self.admin.pk}', 4)
+        self.assertEqual([sensor['uid'] for sensor in datos['results']], ['COL-001'])
+
+    def test_eventos_por_tipo(self):
+        # Una sola consulta: página por cursor con sensor, barrera y usuario unidos
+        datos = self.assertPresupuesto('/api/eventos/por_tipo/?tipo=ACCESO_PERMITIDO', 1)
+        self.assertEqual(len(datos['results']), 10)
+        self.assertIsNotNone(datos['next'])
+
+    def test_eventos_por_tipo_sin_tipo(self):
+        self.assertEqual(self.client.get('/api/eventos/por_tipo/').status_code, 400)
+
+
+@override_settings(SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': False})
+class ImportacionSensoresTests(TestCase):
+    """
+    La importación de sensores valida por tramos: las mismas consultas con 10
+    que con 100 filas, y las filas con errores no interrumpen el resto
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin_importacion', password='x', rol='ADMIN')
+        cls.oficina = Departamento.objects.create(nombre='Oficina importación')
+        Departamento.objects.create(nombre='Bodega importación')
+        Sensor.objects.create(uid='IMP-EXISTE', nombre='Existente', departamento=cls.oficina)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def importar(self, cuerpo, content_type='text/csv'):
+        respuesta = self.client.post('/api/sensores/importar/', cuerpo.encode(), content_type=content_type)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()['data']
+
+    def test_informe_por_fila(self):
+        informe = self.importar(
+            'uid,nombre,estado,departamento,departamentos_adicionales,usuario\n'
+            ' imp-1 ,Tarjeta uno,activo,Oficina importación,Bodega importación,admin_importacion\n'
+            'IMP-1,Repetida,ACTIVO,Oficina importación,,\n'
+            'imp-existe,Existente,ACTIVO,Oficina importación,,\n'
+            'IMP-2,Tarjeta dos,ACTIVO,Sin departamento,,\n'
+            'IMP-3,"Tarjeta, tres",BLOQUEADO,Bodega importación,,\n'
+        )
+        self.assertEqual((informe['creados'], informe['rechazados']), (2, 3))
+        self.assertEqual(
+            [(error['linea'], error['uid'], list(error['error']['details'])) for error in informe['errores']],
+            [(3, 'IMP-1', ['uid']), (4, 'IMP-EXISTE', ['uid']), (5, 'IMP-2', ['departamento'])]
+        )
+        sensor = Sensor.objects.get(uid='IMP-1')
+        self.assertEqual(sensor.usuario_asignado, self.admin)
+        self.assertEqual([d.nombre for d in sensor.departamentos_adicionales.all()], ['Bodega importación'])
+        self.assertEqual(Sensor.objects.get(uid='IMP-3').nombre, 'Tarjeta, tres')
+        # bulk_create no envía señales: los cambios de la allowlist se anotan al importar
+        self.assertEqual(CambioSensor.objects.filter(uid__in=['IMP-1', 'IMP-3']).count(), 2)
+
+    def test_consultas_por_tramo(self):
+        consultas = []
+        for n in (10, 100):
+            cuerpo = '\n'.join(
+                f'{{"uid": "lote{n}-{i}", "nombre": "Sensor {i}", "departamento": "Oficina importación", '
+                f'"departamentos_adicionales": ["Bodega importación"], "usuario": "admin_importacion"}}'
+                for i in range(n)
+            )
+            with CaptureQueriesContext(connection) as contexto:
+                informe = self.importar(cuerpo, 'application/x-ndjson')
+            self.assertEqual(informe['creados'], n)
+            consultas.append(len(contexto.captured_queries))
+        self.assertEqual(consultas[0], consultas[1])
+
+
+@override_settings(SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': False})
+class CacheAutorizacionTests(TestCase):
+    """
+    La caché de autorización está en un backend compartido por los workers:
+    la invalidación de un sensor es visible para cualquier proceso
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin_cache', password='x', rol='ADMIN')
+        cls.departamento = Departamento.objects.create(nombre='Departamento caché')
+        cls.sensor = Sensor.objects.create(uid='CACHE-1', nombre='Sensor caché', departamento=cls.departamento)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def acceso(self, uid='CACHE-1'):
+        return self.client.post('/api/acceso/sensor/', {'uid': uid}, format='json')
+
+    def test_backend_compartido(self):
+        self.assertEqual(caches['default'].__class__.__name__, 'DatabaseCache')
+        self.assertTrue(self.acceso().json()['acceso_permitido'])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM smartconnect_cache')
+            self.assertGreater(cursor.fetchone()[0], 0)
+
+    def test_precalentar_al_iniciar(self):
+        caches['default'].clear()
+        with override_settings(SMARTCONNECT={'SENSOR_CACHE_PRECALENTAR': False}):
+            self.assertIsNone(precalentar_al_iniciar())
+        with override_settings(SMARTCONNECT={'SENSOR_CACHE_PRECALENTAR': True}):
+            self.assertEqual(precalentar_al_iniciar(), 1)
+            self.assertIsNotNone(caches['default'].get('smartconnect:sensor:v2:CACHE-1'))
+            # El resto de workers encuentra la carga reclamada
+            self.assertIsNone(precalentar_al_iniciar())
+
+    def test_hook_de_gunicorn(self):
+        hooks = runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+        worker = mock.Mock()
+        with mock.patch('api.cache.precalentar_al_iniciar', return_value=7) as precalentar:
+            hooks['post_worker_init'](worker)
+        precalentar.assert_called_once_with()
+        worker.log.info.assert_called_once()
+
+    def test_bloqueo_invalida(self):
+        self.assertTrue(self.acceso().json()['acceso_permitido'])
+        self.sensor.estado = 'BLOQUEADO'
+        self.sensor.save()
+        # Otro worker leería la misma tabla: la entrada anterior ya no existe
+        self.assertIsNone(caches['default'].get('smartconnect:sensor:v2:CACHE-1'))
+        self.assertFalse(self.acceso().json()['acceso_permitido'])
+
+    def test_denegaciones_fusionadas(self):
+        for _ in range(3):
+            self.assertEqual(self.acceso('NO-EXISTE').status_code, 404)
+        evento = Evento.objects.get(metadata__uid='NO-EXISTE')
+        self.assertEqual(evento.metadata['repeticiones'], 3)
+
+    def test_repeticion_atomica(self):
+        self.assertEqual(self.acceso('NO-EXISTE').status_code, 404)
+        evento = Evento.objects.get(metadata__uid='NO-EXISTE')
+        # Otro worker sumó repeticiones entretanto: el contador sale de la fila, no de la caché
+        Evento.objects.filter(pk=evento.pk).update(metadata={**evento.metadata, 'repeticiones': 5})
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.acceso('NO-EXISTE').status_code, 404)
+        evento.refresh_from_db()
+        self.assertEqual(evento.metadata['repeticiones'], 6)
+        actualizaciones = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith('UPDATE "api_evento"')]
+        self.assertEqual(len(actualizaciones), 1)
+        self.assertIn('JSON_SET', actualizaciones[0])
+
+    def test_repeticiones_en_la_hora_del_evento(self):
+        # Primer intento a las 10:59:50 y repetición ya pasadas las 11:00
+        primero = datetime(2026, 3, 1, 10, 59, 50, tzinfo=dt_timezone.utc)
+        for fecha_hora in (primero, primero + timedelta(seconds=20)):
+            evento = evento_acceso('NO-EXISTE', None, fecha_hora)[0]
+            evento.fecha_hora = fecha_hora
+            registrar_acceso_desconocido(evento)
+        self.assertEqual(Evento.objects.get(metadata__uid='NO-EXISTE').metadata['repeticiones'], 2)
+        resumenes = lambda: sorted(ResumenEventoHora.objects.values_list('hora', 'total'))
+        en_linea = resumenes()
+        self.assertEqual(en_linea, [(datetime(2026, 3, 1, 10, tzinfo=dt_timezone.utc), 2)])
+        reconstruir(datetime(2026, 3, 1, tzinfo=dt_timezone.utc), datetime(2026, 3, 2, tzinfo=dt_timezone.utc))
+        self.assertEqual(resumenes(), en_linea)
+
+    def test_ventana_reservada(self):
+        # Otro worker reclamó la ventana y aún no guardó su evento: este intento se registra aparte
+        caches['default'].add('smartconnect:denegacion:NO-EXISTE', 'RESERVADA', 60)
+        self.assertEqual(self.acceso('NO-EXISTE').status_code, 404)
+        self.assertEqual(self.acceso('NO-EXISTE').status_code, 404)
+        self.assertEqual(Evento.objects.filter(metadata__uid='NO-EXISTE').count(), 2)
+
+    def test_lote_usa_ts(self):
+        ts = timezone.now() - timedelta(hours=2)
+        respuesta = self.client.post('/api/acceso/sensor/batch/', {'accesos': [
+            {'uid': 'CACHE-1', 'ts': ts.isoformat()},
+            {'uid': 'CACHE-1', 'ts': (timezone.now() + timedelta(days=1)).isoformat()},
+            {'uid': 'CACHE-1'},
+        ]}, format='json')
+        ids = [resultado['evento_id'] for resultado in respuesta.json()['data']['resultados']]
+        pasado, futuro, sin_ts = (Evento.objects.get(pk=pk).fecha_hora for pk in ids)
+        self.assertEqual(pasado, ts)
+        self.assertLessEqual(futuro, timezone.now())
+        self.assertLessEqual(sin_ts, timezone.now())
+
+
+@override_settings(SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': False})
+class AllowlistTests(TestCase):
+    """
+    La allowlist incluye los departamentos adicionales y el estado activo,
+    sus cambios quedan en CambioSensor y el historial podado responde 410
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin_allowlist', password='x', rol='ADMIN')
+        cls.oficina = Departamento.objects.create(nombre='Oficina allowlist')
+        cls.bodega = Departamento.objects.create(nombre='Bodega allowlist')
+        cls.sensor = Sensor.objects.create(uid='ALLOW-1', nombre='Sensor allowlist', departamento=cls.oficina)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def delta(self, desde):
+        return self.client.get(f'/api/sensores/allowlist/delta/?desde={desde}')
+
+    def test_instantanea(self):
+        self.sensor.departamentos_adicionales.add(self.bodega)
+        datos = self.client.get('/api/sensores/allowlist/').json()['data']
+        self.assertEqual(datos['sensores'], [['ALLOW-1', 'ACTIVO', self.oficina.pk, True, [self.bodega.pk]]])
+
+    def test_cambios_de_departamentos(self):
+        version = self.delta(0).json()['data']['version']
+        self.sensor.departamentos_adicionales.add(self.bodega)
+        datos = self.delta(version).json()['data']
+        self.assertEqual(datos['cambios'], [['ALLOW-1', 'ACTIVO', self.oficina.pk, True, [self.bodega.pk]]])
+
+        self.bodega.activo = False
+        self.bodega.save()
+        datos = self.delta(datos['version']).json()['data']
+        self.assertEqual(datos['cambios'], [['ALLOW-1', 'ACTIVO', self.oficina.pk, True, []]])
+
+        self.oficina.activo = False
+        self.oficina.save()
+        datos = self.delta(datos['version']).json()['data']
+        self.assertEqual(datos['cambios'], [['ALLOW-1', 'ACTIVO', self.oficina.pk, False, []]])
+
+        # Guardar sin cambiar activo no anota cambios
+        self.oficina.descripcion = 'Sin cambios de acceso'
+        self.oficina.save()
+        self.assertEqual(self.delta(datos['version']).json()['data']['version'], datos['version'])
+
+    def test_version_menor_confirmada_tarde(self):
+        # Otra transacción obtuvo la versión 'tardia' antes que las siguientes, pero confirma después
+        tardia = self.delta(0).json()['data']['version'] + 1
+        CambioSensor.objects.create(version=tardia + 1, uid='ALLOW-1')
+        version = self.delta(0).json()['data']['version']
+        self.assertGreater(version, tardia)
+        Sensor.objects.bulk_create([Sensor(uid='ALLOW-2', nombre='Confirmado tarde', departamento=self.oficina)])
+        CambioSensor.objects.create(version=tardia, uid='ALLOW-2')
+
+        datos = self.delta(version).json()['data']
+        self.assertEqual(datos['version'], version)
+        self.assertIn('ALLOW-2', [fila[0] for fila in datos['cambios']])
+        # Pasado el margen de relectura el delta ya no repite cambios anteriores a "desde"
+        CambioSensor.objects.update(fecha=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.delta(version).json()['data']['cambios'], [])
+
+    def test_historial_podado(self):
+        inicial = self.delta(0).json()['data']['version']
+        self.sensor.estado = 'BLOQUEADO'
+        self.sensor.save()
+        CambioSensor.objects.update(fecha=timezone.now() - timedelta(days=40))
+        self.sensor.estado = 'ACTIVO'
+        self.sensor.save()
+        call_command('podar_cambios_sensores', dias=30, stdout=StringIO())
+
+        self.assertEqual(CambioSensor.objects.count(), 1)
+        self.assertEqual(self.delta(inicial).status_code, 410)
+        actual = self.delta(inicial + 1)
+        self.assertEqual(actual.status_code, 200)
+        self.assertEqual(actual.json()['data']['cambios'], [['ALLOW-1', 'ACTIVO', self.oficina.pk, True, []]])
+
+
+class RetencionEventosTests(TestCase):
+    """
+    La retención archiva y elimina de api_evento los meses vencidos, por
+    tramos; los meses vigentes, y lo que no llegó a archivarse, se quedan
+    """
+
+    AHORA = datetime(2026, 6, 15, tzinfo=dt_timezone.utc)
+
+    def crear(self, n, *fecha):
+        return Evento.objects.bulk_create(
+            [Evento(tipo='BARRERA_ABIERTA', fecha_hora=datetime(*fecha, tzinfo=dt_timezone.utc)) for _ in range(n)]
+        )
+
+    def test_podar_mes_vencido(self):
+        self.crear(3, 2026, 1, 10)
+        self.crear(2, 2026, 2, 28, 23, 59)
+        self.crear(2, 2026, 3, 1)
+        with tempfile.TemporaryDirectory() as destino:
+            resultado = retencion.podar(3, destino=destino, ahora=self.AHORA, lote=2)
+            self.assertEqual(
+                [(f'{inicio:%Y%m}', os.path.basename(ruta), n) for inicio, ruta, n in resultado],
+                [('202601', 'api_evento_202601.ndjson.gz', 3), ('202602', 'api_evento_202602.ndjson.gz', 2)]
+            )
+            with gzip.open(resultado[0][1], 'rt') as archivo:
+                self.assertEqual(len(archivo.readlines()), 3)
+        self.assertEqual(list(Evento.objects.values_list('fecha_hora__month', flat=True)), [3, 3])
+
+    def test_solo_elimina_lo_archivado(self):
+        self.crear(2, 2026, 1, 10)
+        archivar = retencion.archivar_mes
+
+        def archivar_y_llega_otro(*args):
+            resultado = archivar(*args)
+            self.crear(1, 2026, 1, 11)
+            return resultado
+
+        with tempfile.TemporaryDirectory() as destino:
+            with mock.patch.object(retencion, 'archivar_mes', archivar_y_llega_otro):
+                self.assertEqual(retencion.podar(3, destino=destino, ahora=self.AHORA)[0][2], 2)
+            self.assertEqual(Evento.objects.count(), 1)
+            ruta = retencion.podar(3, destino=destino, ahora=self.AHORA)[0][1]
+            self.assertEqual(os.path.basename(ruta), 'api_evento_202601-2.ndjson.gz')
+            self.assertEqual(len(os.listdir(destino)), 2)
+        self.assertFalse(Evento.objects.exists())
+
+    def test_comando(self):
+        self.crear(1, 2020, 5, 1)
+        salida = StringIO()
+        call_command('podar_eventos', retencion_meses=3, simular=True, stdout=salida)
+        self.assertIn('2020-05', salida.getvalue())
+        self.assertEqual(Evento.objects.count(), 1)
+        call_command('podar_eventos', retencion_meses=3, sin_archivo=True, stdout=StringIO())
+        self.assertFalse(Evento.objects.exists())
+        with self.assertRaises(CommandError):
+            call_command('podar_eventos', stdout=StringIO())
+
+
+class RenderersTests(TestCase):
+    """ORJSONRenderer escribe byte a byte lo mismo que JSONRenderer y falla igual"""
+
+    DATOS = {
+        'texto': 'Añoranza — ü ✓ 🚪 \u2028\u2029 "comillas" \\ \n',
+        'decimal': Decimal('12.50'),
+        'fechas': [
+            datetime(2026, 3, 1, 8, 30, tzinfo=dt_timezone.utc),
+            datetime(2026, 3, 1, 8, 30, 15, 123456, tzinfo=dt_timezone(timedelta(hours=-5))),
+            datetime(2026, 3, 1, 8, 30).date(),
+            datetime(2026, 3, 1, 8, 30, 5).time(),
+        ],
+        'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'numeros': [0, -1, 2 ** 63, 10 ** 20, 1.5, 1e16, 2.5e-7, 0.00001, 123456.789],
+        'vacios': [None, True, False, [], {}],
+        'anidado': [{'a': [{'b': None}]}],
+    }
+
+    def assertIgual(self, datos, media_type=None):
+        esperado = JSONRenderer().render(datos, media_type)
+        self.assertEqual(ORJSONRenderer().render(datos, media_type), esperado)
+
+    def test_misma_salida(self):
+        self.assertIgual(self.DATOS)
+        self.assertIgual(ReturnDict(self.DATOS, serializer=None))
+        self.assertIgual([self.DATOS, self.DATOS])
+
+    def test_indentado(self):
+        self.assertIgual(self.DATOS, 'application/json; indent=4')
+
+    def test_no_finitos(self):
+        for valor in (float('nan'), float('inf'), -float('inf'), Decimal('NaN')):
+            with self.assertRaises(ValueError):
+                JSONRenderer().render({'valor': [valor]})
+            with self.assertRaises(ValueError):
+                ORJSONRenderer().render({'valor': [valor]})
+
+    def test_uuid_y_fechas_con_orjson(self):
+        datos = {'resultados': [
+            {'id': uuid.uuid4(), 'fecha': timezone.now(), 'dia': timezone.now().date(), 'vacio': None}
+            for _ in range(20)
+        ]}
+        with mock.patch.object(JSONRenderer, 'render', side_effect=AssertionError('sin delegar')):
+            salida = ORJSONRenderer().render(datos)
+        self.assertEqual(salida, JSONRenderer().render(datos))
+        # Los guiones y la e de los UUID no son floats
+        self.assertIgual({'id': uuid.UUID('1e5e0000-0000-4000-8000-00000000e123')})
+
+    def test_desplazamiento_con_segundos(self):
+        fecha = datetime(1900, 1, 1, tzinfo=dt_timezone(timedelta(minutes=19, seconds=32)))
+        self.assertIgual({'fecha': fecha, 'vacio': None})
+
+    def test_salida_de_serializador(self):
+        departamento = Departamento.objects.create(nombre='Departamento renderer')
+        eventos = [
+            Evento.objects.create(tipo='BARRERA_ABIERTA', departamento=departamento, metadata={'valor': 1.5}),
+            Evento.objects.create(tipo='BARRERA_ABIERTA', departamento=departamento, metadata={'valor': 1e-7}),
+        ]
+        datos = EventoSerializer(eventos, many=True).data
+        self.assertIgual({'results': datos})
+        # NaN dentro de un campo JSON, o en una clave añadida después de serializar
+        datos[0]['metadata']['valor'] = float('nan')
+        with self.assertRaises(ValueError):
+            ORJSONRenderer().render({'results': datos})
+        datos[0]['metadata']['valor'] = 1.5
+        datos[1]['extra'] = float('inf')
+        with self.assertRaises(ValueError):
+            ORJSONRenderer().render({'results': datos})
+
+
+@override_settings(
+    SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': True},
+    CACHES={
+        **settings.CACHES,
+        'respuestas': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'respuestas-tests'},
+    },
+)
+class CacheRespuestasTests(TestCase):
+    """
+    La caché de respuestas separa las respuestas por alcance (ADMIN, OPERADOR,
+    anónimo) y por tipo negociado, y deja de servirlas al escribir
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin_respuestas', password='x', rol='ADMIN')
+        cls.operador = Usuario.objects.create_user(username='operador_respuestas', password='x', rol='OPERADOR')
+        cls.departamento = Departamento.objects.create(nombre='Departamento respuestas')
+
+    def setUp(self):
+        caches['respuestas'].clear()
+
+    def cliente(self, usuario=None):
+        cliente = APIClient()
+        if usuario is not None:
+            cliente.force_authenticate(usuario)
+        return cliente
+
+    def get(self, cliente, url='/api/departamentos/', **extra):
+        """(respuesta, número de consultas)"""
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = cliente.get(url, **extra)
+        return respuesta, len(contexto.captured_queries)
+
+    def test_alcance(self):
+        admin, operador = self.cliente(self.admin), self.cliente(self.operador)
+        self.assertGreater(self.get(admin)[1], 0)
+        self.assertEqual(self.get(admin)[1], 0)
+        # Otro alcance no reutiliza la respuesta del administrador
+        self.assertGreater(self.get(operador)[1], 0)
+        self.assertEqual(self.get(operador)[1], 0)
+        self.assertEqual(self.get(self.cliente())[0].status_code, 401)
+
+    def test_tipo_negociado(self):
+        admin = self.cliente(self.admin)
+        compacta = self.get(admin)[0]
+        indentada, consultas = self.get(admin, HTTP_ACCEPT='application/json; indent=4')
+        self.assertGreater(consultas, 0)
+        self.assertIn(b'\n    "', indentada.content)
+        self.assertNotIn(b'\n', compacta.content)
+
+    def test_invalidacion(self):
+        admin = self.cliente(self.admin)
+        self.get(admin)
+        self.assertEqual(self.get(admin)[1], 0)
+        respuesta = admin.patch(
+            f'/api/departamentos/{self.departamento.pk}/', {'nombre': 'Departamento renombrado'}, format='json'
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        respuesta, consultas = self.get(admin)
+        self.assertGreater(consultas, 0)
+        self.assertEqual(respuesta.json()['results'][0]['nombre'], 'Departamento renombrado')
+
+    def test_no_modificado_desde_cache(self):
+        admin = self.cliente(self.admin)
+        etag = self.get(admin)[0]['ETag']
+        respuesta, consultas = self.get(admin, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((respuesta.status_code, respuesta.content, consultas), (304, b'', 0))
+
+
+class SerializacionRapidaTests(TestCase):
+    """
+    Con SERIALIZACION_RAPIDA los listados responden exactamente lo mismo que
+    con el ModelSerializer, también con ?fields= y relaciones nulas
+    """
+    URLS = (
+        '/api/eventos/',
+        '/api/eventos/?fields=id,tipo,barrera_nombre,usuario_nombre,descripcion',
+        '/api/eventos/?exclude=metadata',
+        '/api/sensores/activos/',
+        '/api/sensores/activos/?fields=uid,usuario_nombre,departamentos_adicionales',
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(
+            username='admin_rapido', password='x', rol='ADMIN', first_name='Ana', last_name='Pérez'
+        )
+        oficina = Departamento.objects.create(nombre='Oficina rápida')
+        bodega = Departamento.objects.create(nombre='Bodega rápida')
+        asignado = Sensor.objects.create(
+            uid='RAP-1', nombre='Asignado', departamento=oficina, usuario_asignado=cls.admin
+        )
+        asignado.departamentos_adicionales.add(bodega, oficina)
+        libre = Sensor.objects.create(uid='RAP-2', nombre='Sin usuario', departamento=bodega)
+        barrera = Barrera.objects.create(nombre='Barrera rápida', departamento=oficina)
+        cls.urls = (*cls.URLS, f'/api/departamentos/{oficina.pk}/sensores/')
+        Evento.objects.bulk_create([
+            Evento(tipo='ACCESO_PERMITIDO', sensor=asignado, departamento=oficina, codigo='ACCESO',
+                   metadata={'uid': 'RAP-1', 'sensor_nombre': 'Asignado', 'departamento': 'Oficina rápida'}),
+            Evento(tipo='ACCESO_DENEGADO', sensor=libre, departamento=bodega, codigo='SENSOR_NO_ACTIVO',
+                   metadata={'uid': 'RAP-2', 'sensor_nombre': 'Sin usuario', 'estado_sensor': 'BLOQUEADO'}),
+            Evento(tipo='BARRERA_ABIERTA', barrera=barrera, departamento=oficina, usuario_accion=cls.admin,
+                   descripcion='Apertura manual'),
+            Evento(tipo='ACCESO_DENEGADO', descripcion='Sin sensor ni barrera', metadata={}),
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def respuesta(self, url, rapida):
+        with override_settings(SMARTCONNECT={'SERIALIZACION_RAPIDA': rapida, 'RESPUESTAS_CACHE_ENABLED': False}):
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.content
+
+    def test_misma_salida(self):
+        self.assertIsNotNone(compilar(EventoSerializer))
+        self.assertIsNotNone(compilar(SensorSerializer))
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.respuesta(url, True), self.respuesta(url, False))
+
+    def test_planes_acotados(self):
+        _compilar.cache_clear()
+        nombres = ['id', 'uid', 'nombre', 'estado', 'departamento', 'descripcion', 'usuario_asignado', 'fecha_creacion']
+        for n in range(1, 2 ** len(nombres)):
+            compilar(SensorSerializer, {nombre for i, nombre in enumerate(nombres) if n >> i & 1})
+        self.assertEqual(_compilar.cache_info().currsize, PLANES_MAX)
+
+
+@override_settings(SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': False, 'EVENTOS_FEED_SONDEO': 0})
+class FeedEnVivoTests(TestCase):
+    """
+    El feed en vivo se abre con un ticket de un solo uso, nunca con el JWT en
+    la URL, y el publicador serializa los eventos fuera del lock
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user(username='guardia_feed', password='x')
+        cls.departamento = Departamento.objects.create(nombre='Departamento feed')
+
+    def ticket(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        respuesta = cliente.post('/api/eventos/en-vivo/ticket/')
+        self.assertEqual(respuesta.status_code, 201)
+        return respuesta.json()['data']['ticket']
+
+    def test_ticket_requiere_autenticacion(self):
+        self.assertEqual(APIClient().post('/api/eventos/en-vivo/ticket/').status_code, 401)
+
+    def test_ticket_de_un_solo_uso(self):
+        ticket = self.ticket()
+        # Autenticado: con WSGI el feed responde 501 (requiere ASGI)
+        self.assertEqual(Client().get('/api/eventos/en-vivo/', {'ticket': ticket}).status_code, 501)
+        respuesta = Client().get('/api/eventos/en-vivo/', {'ticket': ticket})
+        self.assertEqual(respuesta.status_code, 401)
+        self.assertFalse(respuesta.json()['success'])
+
+    def test_ticket_de_usuario_inactivo(self):
+        ticket = self.ticket()
+        Usuario.objects.filter(pk=self.usuario.pk).update(is_active=False)
+        self.assertEqual(Client().get('/api/eventos/en-vivo/', {'ticket': ticket}).status_code, 401)
+
+    def test_jwt_en_la_url_no_autentica(self):
+        token = str(AccessToken.for_user(self.usuario))
+        self.assertEqual(Client().get('/api/eventos/en-vivo/', {'token': token}).status_code, 401)
+        self.assertEqual(
+            Client().get('/api/eventos/en-vivo/', HTTP_AUTHORIZATION=f'Bearer {token}').status_code, 501
+        )
+
+    def test_publicar_serializa_fuera_del_lock(self):
+        publicador = PublicadorEventos()
+        entregados = []
+        suscripcion = mock.Mock(entregar=entregados.extend)
+        publicador._suscriptores.add(suscripcion)
+        eventos = [
+            Evento.objects.create(tipo='BARRERA_ABIERTA', departamento=self.departamento) for _ in range(2)
+        ]
+
+        def formatear(evento):
+            self.assertFalse(publicador._lock.locked())
+            return Mensaje(evento)
+
+        with mock.patch('api.feed.Mensaje', side_effect=formatear) as serializar:
+            publicador.publicar(eventos)
+            publicador.publicar(eventos)
+        self.assertEqual(serializar.call_count, 2)
+        self.assertEqual([mensaje.id for mensaje in entregados], [evento.pk for evento in eventos])
+        self.assertEqual(publicador.desde(eventos[0].pk)[0].id, eventos[1].pk)
+
+
+@override_settings(SMARTCONNECT={
+    'RESPUESTAS_CACHE_ENABLED': False,
+    'EVENTO_ESCRITURA': {'ACCESO_PERMITIDO': 'BUFFER'},
+    'EVENTO_BUFFER_MAX': 3,
+    'EVENTO_BUFFER_LOTE': 2,
+})
+class BufferEventosTests(TestCase):
+    """
+    En modo BUFFER la decisión se responde sin esperar al INSERT y los eventos
+    se escriben después, por lotes, al vaciar el buffer
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin_buffer', password='x', rol='ADMIN')
+        cls.departamento = Departamento.objects.create(nombre='Departamento buffer')
+        cls.sensor = Sensor.objects.create(uid='BUFFER-1', nombre='Sensor buffer', departamento=cls.departamento)
+
+    def setUp(self):
+        # Sin el hilo de fondo: el test decide cuándo se vacía
+        self.buffer = BufferEventos()
+        parche = mock.patch.object(self.buffer, '_asegurar_hilo')
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def evento(self):
+        return Evento(tipo='ACCESO_PERMITIDO', sensor=self.sensor, departamento=self.departamento)
+
+    def test_respuesta_antes_del_insert(self):
+        with mock.patch('api.buffer.buffer_eventos', self.buffer):
+            respuesta = self.client.post('/api/acceso/sensor/', {'uid': 'BUFFER-1'}, format='json')
+        self.assertTrue(respuesta.json()['acceso_permitido'])
+        self.assertIsNone(respuesta.json()['data']['evento']['id'])
+        self.assertFalse(Evento.objects.exists())
+        self.assertEqual(self.buffer.estadisticas()['pendientes'], 1)
+
+        self.buffer.vaciar()
+        self.assertEqual(Evento.objects.filter(sensor=self.sensor, tipo='ACCESO_PERMITIDO').count(), 1)
+        self.assertEqual(ResumenEventoHora.objects.get(sensor=self.sensor.pk).total, 1)
+        self.assertEqual(self.buffer.estadisticas()['escritos'], 1)
+
+    def test_denegados_sincronos(self):
+        Sensor.objects.filter(pk=self.sensor.pk).update(estado='BLOQUEADO')
+        with mock.patch('api.buffer.buffer_eventos', self.buffer):
+            respuesta = self.client.post('/api/acceso/sensor/', {'uid': 'BUFFER-1'}, format='json')
+        self.assertIsNotNone(respuesta.json()['data']['evento']['id'])
+        self.assertEqual(self.buffer.estadisticas()['pendientes'], 0)
+
+    def test_denegaciones_fusionadas_en_el_buffer(self):
+        caches['default'].clear()
+        escritura = {'ACCESO_PERMITIDO': 'BUFFER', 'ACCESO_DENEGADO': 'BUFFER'}
+        with self.settings(SMARTCONNECT={**settings.SMARTCONNECT, 'EVENTO_ESCRITURA': escritura}), \
+                mock.patch('api.buffer.buffer_eventos', self.buffer):
+            for _ in range(3):
+                respuesta = self.client.post('/api/acceso/sensor/', {'uid': 'NO-EXISTE'}, format='json')
+            self.assertEqual(respuesta.json()['error']['details']['evento']['metadata']['repeticiones'], 3)
+            self.assertEqual(self.buffer.estadisticas()['pendientes'], 1)
+
+            self.buffer.vaciar()
+            evento = Evento.objects.get(metadata__uid='NO-EXISTE')
+            self.assertEqual(evento.metadata['repeticiones'], 3)
+            self.assertEqual(ResumenEventoHora.objects.get(tipo='ACCESO_DENEGADO').total, 3)
+            # Escrito el evento, la ventana apunta a su fila y las repeticiones la actualizan
+            self.assertEqual(caches['default'].get('smartconnect:denegacion:NO-EXISTE')['id'], evento.pk)
+            respuesta = self.client.post('/api/acceso/sensor/', {'uid': 'NO-EXISTE'}, format='json')
+        self.assertEqual(respuesta.json()['error']['details']['evento']['id'], evento.pk)
+        evento.refresh_from_db()
+        self.assertEqual(evento.metadata['repeticiones'], 4)
+        self.assertEqual(ResumenEventoHora.objects.get(tipo='ACCESO_DENEGADO').total, 4)
+        self.assertEqual(self.buffer.estadisticas()['pendientes'], 0)
+
+    def test_lote_despierta_el_vaciado(self):
+        self.buffer.registrar(self.evento())
+        self.assertFalse(self.buffer._despertar.is_set())
+        self.buffer.registrar(self.evento())
+        self.assertTrue(self.buffer._despertar.is_set())
+
+    def test_capacidad_y_descartados(self):
+        resultados = [self.buffer.registrar(self.evento()) for _ in range(4)]
+        self.assertEqual(resultados, [True, True, True, False])
+        self.assertEqual(self.buffer.estadisticas()['descartados'], 1)
+        with CaptureQueriesContext(connection) as consultas:
+            self.buffer.vaciar()
+        # Lotes de EVENTO_BUFFER_LOTE: un bulk_create por lote
+        inserts = [q for q in consultas.captured_queries if q['sql'].startswith('INSERT INTO "api_evento"')]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(Evento.objects.count(), 3)
+
+    def test_error_reencola(self):
+        self.buffer.registrar(self.evento())
+        with mock.patch('api.buffer.escribir_eventos', side_effect=RuntimeError), self.assertLogs('api.buffer'):
+            self.buffer.vaciar()
+        self.assertEqual(self.buffer.estadisticas()['pendientes'], 1)
+        self.assertEqual(self.buffer.estadisticas()['errores'], 1)
+        self.buffer.detener()
+        self.assertEqual(self.buffer.estadisticas()['pendientes'], 0)
+        self.assertEqual(Evento.objects.count(), 1)
+
+
+@override_settings(SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': False})
+class AccesoAsincronoTests(TestCase):
+    """
+    Las versiones ASGI de acceso y control de barrera responden igual que las
+    síncronas y autentican el JWT en el event loop
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin_async', password='x', rol='ADMIN')
+        cls.departamento = Departamento.objects.create(nombre='Departamento async')
+        cls.sensor = Sensor.objects.create(uid='ASYNC-1', nombre='Sensor async', departamento=cls.departamento)
+        cls.barrera = Barrera.objects.create(nombre='Barrera async', departamento=cls.departamento)
+
+    def post(self, ruta, datos):
+        return AsyncClient().post(
+            ruta, datos, content_type='application/json',
+            headers={'Authorization': f'Bearer {AccessToken.for_user(self.admin)}'}
+        )
+
+    async def test_acceso_permitido(self):
+        respuesta = await self.post('/api/acceso/sensor/async/', {'uid': 'async-1'})
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertTrue(datos['acceso_permitido'])
+        self.assertEqual(datos['data']['sensor']['uid'], 'ASYNC-1')
+        evento = await Evento.objects.aget(pk=datos['data']['evento']['id'])
+        self.assertEqual(evento.tipo, 'ACCESO_PERMITIDO')
+
+    async def test_misma_forma_que_sincrono(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.admin)
+        sincrona = (await sync_to_async(cliente.post)('/api/acceso/sensor/', {'uid': 'ASYNC-1'}, format='json')).json()
+        asincrona = (await self.post('/api/acceso/sensor/async/', {'uid': 'ASYNC-1'})).json()
+        self.assertEqual(asincrona.keys(), sincrona.keys())
+        self.assertEqual(asincrona['data'].keys(), sincrona['data'].keys())
+        self.assertEqual(asincrona['data']['sensor'], sincrona['data']['sensor'])
+
+    async def test_uid_desconocido(self):
+        respuesta = await self.post('/api/acceso/sensor/async/', {'uid': 'NO-EXISTE'})
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertFalse(respuesta.json()['success'])
+
+    async def test_sin_token(self):
+        respuesta = await AsyncClient().post(
+            '/api/acceso/sensor/async/', {'uid': 'ASYNC-1'}, content_type='application/json'
+        )
+        self.assertEqual(respuesta.status_code, 401)
+        self.assertEqual(respuesta.json()['error']['code'], 401)
+        self.assertIn('WWW-Authenticate', respuesta.headers)
+
+    async def test_datos_invalidos(self):
+        respuesta = await self.post('/api/acceso/sensor/async/', {})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('uid', respuesta.json()['error']['details'])
+
+    async def test_controlar_barrera(self):
+        respuesta = await self.post(f'/api/barreras/{self.barrera.pk}/controlar/async/', {'accion': 'ABRIR'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['data']['barrera']['estado'], 'ABIERTA')
+        evento = await Evento.objects.aget(pk=respuesta.json()['data']['evento']['id'])
+        self.assertEqual((evento.tipo, evento.usuario_accion_id), ('BARRERA_ABIERTA', self.admin.pk))
+        self.assertEqual((await Barrera.objects.aget(pk=self.barrera.pk)).estado, 'ABIERTA')
+
+    async def test_controlar_barrera_inexistente(self):
+        respuesta = await self.post('/api/barreras/999999/controlar/async/', {'accion': 'ABRIR'})
+        self.assertEqual(respuesta.status_code, 404)
+
+
+@override_settings(SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': False})
+class RespuestaCompactaTests(TestCase):
+    """
+    El formato compacto de /api/acceso/sensor/ (?formato=compacto o el perfil
+    del Accept) tiene forma fija; sin pedirlo se mantiene la respuesta completa
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin_compacto', password='x', rol='ADMIN')
+        cls.departamento = Departamento.objects.create(nombre='Departamento compacto')
+        cls.sensor = Sensor.objects.create(uid='COMPACTO-1', nombre='Sensor compacto', departamento=cls.departamento)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_parametro(self):
+        respuesta = self.client.post('/api/acceso/sensor/?formato=compacto', {'uid': 'COMPACTO-1'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        evento = Evento.objects.get(sensor=self.sensor)
+        self.assertEqual(respuesta.json(), {'success': True, 'acceso_permitido': True, 'evento_id': evento.pk})
+
+    def test_perfil_accept(self):
+        respuesta = self.client.post(
+            '/api/acceso/sensor/', {'uid': 'COMPACTO-1'}, format='json',
+            HTTP_ACCEPT='application/json; profile=compacto'
+        )
+        self.assertEqual(respuesta.json().keys(), {'success', 'acceso_permitido', 'evento_id'})
+
+    def test_denegado_y_desconocido(self):
+        Sensor.objects.filter(pk=self.sensor.pk).update(estado='BLOQUEADO')
+        denegado = self.client.post('/api/acceso/sensor/?formato=compacto', {'uid': 'COMPACTO-1'}, format='json')
+        self.assertEqual(denegado.status_code, 200)
+        self.assertEqual(denegado.json()['acceso_permitido'], False)
+        self.assertTrue(denegado.json()['success'])
+        desconocido = self.client.post('/api/acceso/sensor/?formato=compacto', {'uid': 'NO-EXISTE'}, format='json')
+        self.assertEqual(desconocido.status_code, 404)
+        self.assertEqual(desconocido.json()['success'], False)
+        self.assertEqual(desconocido.json()['acceso_permitido'], False)
+
+    def test_completa_por_defecto(self):
+        respuesta = self.client.post('/api/acceso/sensor/', {'uid': 'COMPACTO-1'}, format='json')
+        self.assertEqual(respuesta.json().keys(), {'success', 'acceso_permitido', 'message', 'data'})
+        self.assertEqual(respuesta.json()['data']['sensor']['uid'], 'COMPACTO-1')
+
+    def test_asincrono(self):
+        respuesta = Client().post(
+            '/api/acceso/sensor/async/?formato=compacto', {'uid': 'COMPACTO-1'}, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}'
+        )
+        self.assertEqual(respuesta.json().keys(), {'success', 'acceso_permitido', 'evento_id'})
+
+
+@override_settings(SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': False, 'EVENTOS_PAGE_SIZE_MAX': 5})
+class PaginacionCursorTests(TestCase):
+    """
+    /api/eventos/ se pagina por cursor sobre (fecha_hora, id) descendente, sin
+    COUNT(*) salvo con ?total=true y estable ante inserciones nuevas
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin_cursor', password='x', rol='ADMIN')
+        cls.departamento = Departamento.objects.create(nombre='Departamento cursor')
+        base = timezone.now() - timedelta(hours=1)
+        # Fechas repetidas: el id desempata dentro de la misma fecha_hora
+        Evento.objects.bulk_create([
+            Evento(tipo='BARRERA_ABIERTA', departamento=cls.departamento, fecha_hora=base + timedelta(minutes=i // 2))
+            for i in range(7)
+        ])
+        cls.orden = list(Evento.objects.order_by('-fecha_hora', '-id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def pagina(self, url):
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def ids(self, pagina):
+        return [evento['id'] for evento in pagina['results']]
+
+    def test_siguiente_y_anterior(self):
+        primera = self.pagina('/api/eventos/?page_size=3')
+        self.assertIsNone(primera['previous'])
+        segunda = self.pagina(primera['next'])
+        tercera = self.pagina(segunda['next'])
+        self.assertEqual(self.ids(primera) + self.ids(segunda) + self.ids(tercera), self.orden)
+        self.assertIsNone(tercera['next'])
+
+        self.assertEqual(self.ids(self.pagina(tercera['previous'])), self.ids(segunda))
+        anterior = self.pagina(segunda['previous'])
+        self.assertEqual(self.ids(anterior), self.ids(primera))
+        self.assertIsNone(anterior['previous'])
+
+    def test_estable_ante_inserciones(self):
+        primera = self.pagina('/api/eventos/?page_size=3')
+        Evento.objects.create(tipo='BARRERA_CERRADA', departamento=self.departamento)
+        segunda = self.pagina(primera['next'])
+        self.assertEqual(self.ids(segunda), self.orden[3:6])
+
+    def test_sin_count(self):
+        with CaptureQueriesContext(connection) as consultas:
+            pagina = self.pagina('/api/eventos/?page_size=3')
+        self.assertNotIn('count', pagina)
+        self.assertFalse([q for q in consultas.captured_queries if 'COUNT(' in q['sql'].upper()])
+        self.assertEqual(self.pagina('/api/eventos/?page_size=3&total=true')['count'], 7)
+
+    def test_tamano_acotado(self):
+        self.assertEqual(len(self.pagina('/api/eventos/?page_size=100')['results']), 5)
+        self.assertEqual(len(self.pagina('/api/eventos/')['results']), 7)
+
+    def test_cursor_invalido(self):
+        self.assertEqual(self.client.get('/api/eventos/?cursor=no-es-un-cursor').status_code, 404)
+
+
+@override_settings(SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': False})
+class ExportacionEventosTests(TestCase):
+    """
+    /api/eventos/exportar/ escribe los eventos filtrados fila a fila (NDJSON o
+    CSV) en un StreamingHttpResponse, con gzip si el cliente lo acepta
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin_exportar', password='x', rol='ADMIN')
+        cls.departamento = Departamento.objects.create(nombre='Departamento exportar')
+        cls.otro = Departamento.objects.create(nombre='Otro exportar')
+        base = timezone.now() - timedelta(days=3)
+        Evento.objects.bulk_create([
+            Evento(tipo='BARRERA_ABIERTA', departamento=cls.departamento, fecha_hora=base + timedelta(days=2),
+                   metadata={'accion_manual': True}),
+            Evento(tipo='BARRERA_CERRADA', departamento=cls.departamento, fecha_hora=base),
+            Evento(tipo='BARRERA_ABIERTA', departamento=cls.departamento, fecha_hora=base + timedelta(days=1)),
+            Evento(tipo='BARRERA_ABIERTA', departamento=cls.otro, fecha_hora=base),
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def contenido(self, respuesta):
+        self.assertTrue(respuesta.streaming)
+        return b''.join(respuesta.streaming_content)
+
+    def test_ndjson_filtrado_y_cronologico(self):
+        respuesta = self.client.get(
+            f'/api/eventos/exportar/?tipo=BARRERA_ABIERTA&departamento={self.departamento.pk}'
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta['Content-Type'].startswith('application/x-ndjson'))
+        filas = [json.loads(linea) for linea in self.contenido(respuesta).decode().splitlines()]
+        esperados = list(
+            Evento.objects.filter(tipo='BARRERA_ABIERTA', departamento=self.departamento)
+            .order_by('fecha_hora', 'id').values_list('id', flat=True)
+        )
+        self.assertEqual([fila['id'] for fila in filas], esperados)
+        self.assertEqual(filas[-1]['metadata'], {'accion_manual': True})
+
+    def test_rango_de_fechas(self):
+        desde = (timezone.now() - timedelta(days=2, hours=12)).isoformat()
+        respuesta = self.client.get('/api/eventos/exportar/', {'desde': desde})
+        self.assertEqual(len(self.contenido(respuesta).splitlines()), 2)
+
+    def test_csv(self):
+        respuesta = self.client.get(f'/api/eventos/exportar/?formato=csv&departamento={self.departamento.pk}')
+        self.assertTrue(respuesta['Content-Type'].startswith('text/csv'))
+        self.assertIn('eventos.csv', respuesta['Content-Disposition'])
+        filas = list(csv.DictReader(StringIO(self.contenido(respuesta).decode())))
+        self.assertEqual(len(filas), 3)
+        self.assertEqual(list(filas[0]), list(EventoSerializer.Meta.fields))
+        self.assertEqual(json.loads(filas[-1]['metadata']), {'accion_manual': True})
+
+    def test_gzip(self):
+        respuesta = self.client.get('/api/eventos/exportar/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+        self.assertEqual(len(gzip.decompress(self.contenido(respuesta)).splitlines()), 4)
+
+    def test_lectura_por_bloques(self):
+        with mock.patch('django.db.models.query.QuerySet.iterator', autospec=True, return_value=iter(())) as iterador:
+            self.contenido(self.client.get('/api/eventos/exportar/'))
+        self.assertEqual(iterador.call_args.kwargs['chunk_size'], TAMANO_BLOQUE)
+
+    def test_formato_no_soportado(self):
+        respuesta = self.client.get('/api/eventos/exportar/?formato=xml')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('formato', respuesta.json()['error']['details'])
+
+
+@override_settings(SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': False})
+class EstadisticasEventosTests(TestCase):
+    """
+    /api/eventos/estadisticas/ responde desde los resúmenes que suma cada
+    escritura, y resumir_eventos los reconstruye igual desde los eventos
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin_estadisticas', password='x', rol='ADMIN')
+        cls.oficina = Departamento.objects.create(nombre='Oficina estadísticas')
+        cls.bodega = Departamento.objects.create(nombre='Bodega estadísticas')
+        cls.sensor = Sensor.objects.create(uid='ESTAD-1', nombre='Sensor estadísticas', departamento=cls.oficina)
+        cls.barrera = Barrera.objects.create(nombre='Barrera estadísticas', departamento=cls.bodega)
+
+        def fecha(dia, hora, minuto=0):
+            return datetime(2026, 3, dia, hora, minuto, tzinfo=dt_timezone.utc)
+
+        def acceso(tipo, fecha_hora):
+            return Evento(tipo=tipo, sensor=cls.sensor, departamento=cls.oficina, fecha_hora=fecha_hora)
+
+        # Por las mismas vías que la API: un evento, un lote y denegaciones fusionadas
+        guardar_evento(acceso('ACCESO_PERMITIDO', fecha(1, 8, 10)))
+        escribir_eventos([
+            acceso('ACCESO_PERMITIDO', fecha(1, 8, 40)),
+            acceso('ACCESO_DENEGADO', fecha(1, 9, 5)),
+            Evento(tipo='BARRERA_ABIERTA', barrera=cls.barrera, departamento=cls.bodega, fecha_hora=fecha(2, 10)),
+        ])
+        with override_settings(SMARTCONNECT={'DENEGACION_VENTANA': 60}):
+            caches['default'].clear()
+            for segundos in (0, 20, 40):
+                evento = evento_acceso('ESTAD-NO-EXISTE', None)[0]
+                evento.fecha_hora = fecha(2, 11) + timedelta(seconds=segundos)
+                registrar_acceso_desconocido(evento)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def estadisticas(self, parametros=''):
+        respuesta = self.client.get(f'/api/eventos/estadisticas/?{parametros}')
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()['data']
+
+    def test_total_sin_agrupar(self):
+        datos = self.estadisticas()
+        self.assertEqual((datos['total'], datos['agrupar'], datos['resultados']), (7, [], []))
+
+    def test_agrupar(self):
+        self.assertEqual(self.estadisticas('agrupar=tipo')['resultados'], [
+            {'tipo': 'ACCESO_DENEGADO', 'total': 4},
+            {'tipo': 'ACCESO_PERMITIDO', 'total': 2},
+            {'tipo': 'BARRERA_ABIERTA', 'total': 1},
+        ])
+        self.assertEqual(self.estadisticas('agrupar=dia')['resultados'], [
+            {'dia': '2026-03-01T00:00:00Z', 'total': 3},
+            {'dia': '2026-03-02T00:00:00Z', 'total': 4},
+        ])
+        # Sin departamento, sensor o barrera se agrupa como null
+        self.assertEqual(self.estadisticas('agrupar=departamento,hora')['resultados'], [
+            {'departamento': None, 'hora': '2026-03-02T11:00:00Z', 'total': 3},
+            {'departamento': self.oficina.pk, 'hora': '2026-03-01T08:00:00Z', 'total': 2},
+            {'departamento': self.oficina.pk, 'hora': '2026-03-01T09:00:00Z', 'total': 1},
+            {'departamento': self.bodega.pk, 'hora': '2026-03-02T10:00:00Z', 'total': 1},
+        ])
+        self.assertEqual(self.estadisticas('agrupar=barrera&tipo=BARRERA_ABIERTA')['resultados'], [
+            {'barrera': self.barrera.pk, 'total': 1},
+        ])
+
+    def test_filtros(self):
+        self.assertEqual(self.estadisticas('desde=2026-03-02')['total'], 4)
+        self.assertEqual(self.estadisticas('hasta=2026-03-01')['total'], 3)
+        # desde incluye la hora completa en la que cae
+        self.assertEqual(self.estadisticas('desde=2026-03-01T08:30:00Z&hasta=2026-03-01T09:59:59Z')['total'], 3)
+        self.assertEqual(self.estadisticas(f'departamento={self.oficina.pk}')['total'], 3)
+        self.assertEqual(self.estadisticas(f'departamento={self.bodega.pk}&tipo=ACCESO_PERMITIDO')['total'], 0)
+        self.assertEqual(self.estadisticas(f'sensor={self.sensor.pk}&agrupar=tipo')['resultados'], [
+            {'tipo': 'ACCESO_DENEGADO', 'total': 1},
+            {'tipo': 'ACCESO_PERMITIDO', 'total': 2},
+        ])
+
+    def test_agrupacion_invalida(self):
+        respuesta = self.client.get('/api/eventos/estadisticas/?agrupar=tipo,usuario')
+        self.assertEqual(respuesta.status_code, 400)
+        error = respuesta.json()['error']
+        self.assertIn('usuario', error['message'])
+        self.assertEqual(error['details']['agrupar'], ['hora', 'dia', 'tipo', 'departamento', 'sensor', 'barrera'])
+
+    def test_reconstruccion_reproduce_la_escritura(self):
+        campos = ('hora', 'tipo', 'departamento', 'sensor', 'barrera', 'total')
+        en_linea = sorted(ResumenEventoHora.objects.values_list(*campos))
+        self.assertEqual(sum(fila[-1] for fila in en_linea), 7)
+        ResumenEventoHora.objects.all().delete()
+        salida = StringIO()
+        call_command('resumir_eventos', desde='2026-03-01', hasta='2026-03-03', horas_por_tramo=6, stdout=salida)
+        self.assertEqual(sorted(ResumenEventoHora.objects.values_list(*campos)), en_linea)
+        self.assertIn('4 resúmenes reconstruidos', salida.getvalue())
+        # Reconstruir de nuevo no duplica
+        call_command('resumir_eventos', desde='2026-03-01', hasta='2026-03-03', stdout=StringIO())
+        self.assertEqual(sorted(ResumenEventoHora.objects.values_list(*campos)), en_linea)
+
+
+class IngestaEventosTests(TestCase):
+    """
+    /api/eventos/ingesta/ guarda la decisión que tomó el lector, descarta los
+    ids ya registrados (en el envío o en la base de datos) e informa de los
+    errores por línea sin perder las líneas válidas
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin_ingesta', password='x', rol='ADMIN')
+        cls.departamento = Departamento.objects.create(nombre='Departamento ingesta')
+        cls.sensor = Sensor.objects.create(uid='INGESTA-1', nombre='Tarjeta ingesta', departamento=cls.departamento)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.fecha = timezone.now() - timedelta(hours=1)
+
+    def linea(self, id_origen, uid='INGESTA-1', **datos):
+        return json.dumps({'id': id_origen, 'uid': uid, 'fecha_hora': self.fecha.isoformat(), **datos})
+
+    def ingerir(self, *lineas):
+        respuesta = self.client.generic(
+            'POST', '/api/eventos/ingesta/', '\n'.join(lineas), content_type='application/x-ndjson'
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()['data']
+
+    def test_decision_del_lector(self):
+        # El sensor se bloqueó después de los accesos: no cambia lo que decidió el lector
+        Sensor.objects.filter(pk=self.sensor.pk).update(estado='BLOQUEADO')
+        informe = self.ingerir(
+            self.linea('L:1', acceso_permitido=True),
+            self.linea('L:2', tipo='ACCESO_DENEGADO'),
+            self.linea('L:3', uid='BORRADO-1', tipo='ACCESO_PERMITIDO', acceso_permitido=True),
+            self.linea('L:4', uid='BORRADO-2', acceso_permitido=False),
+        )
+        self.assertEqual(informe['insertados'], 4)
+        eventos = {e.id_origen: e for e in Evento.objects.filter(id_origen__isnull=False)}
+        self.assertEqual(
+            {id_origen: (e.tipo, e.codigo, e.sensor_id) for id_origen, e in eventos.items()},
+            {
+                'L:1': ('ACCESO_PERMITIDO', 'ACCESO', self.sensor.pk),
+                'L:2': ('ACCESO_DENEGADO', 'DENEGADO_LECTOR', self.sensor.pk),
+                'L:3': ('ACCESO_PERMITIDO', 'ACCESO_SIN_REGISTRO', None),
+                'L:4': ('ACCESO_DENEGADO', 'UID_DESCONOCIDO', None),
+            }
+        )
+        self.assertEqual(eventos['L:1'].fecha_hora, self.fecha)
+        self.assertTrue(eventos['L:1'].metadata['diferido'])
+        self.assertIn('BORRADO-1', eventos['L:3'].texto_descripcion)
+
+    def test_duplicados_por_id(self):
+        informe = self.ingerir(
+            self.linea('L:1', acceso_permitido=True),
+            # Mismo id con otra hora: el id del lector identifica el acceso
+            json.dumps({'id': 'L:1', 'uid': 'INGESTA-1', 'fecha_hora': timezone.now().isoformat(),
+                        'acceso_permitido': True}),
+            self.linea('L:2', acceso_permitido=False),
+        )
+        self.assertEqual((informe['insertados'], informe['duplicados']), (2, 1))
+        # Reenvío del fichero tras un fallo
+        informe = self.ingerir(self.linea('L:1', acceso_permitido=True), self.linea('L:2', acceso_permitido=False))
+        self.assertEqual((informe['insertados'], informe['duplicados']), (0, 2))
+        self.assertEqual(Evento.objects.filter(id_origen__isnull=False).count(), 2)
+
+    def test_errores_por_linea(self):
+        informe = self.ingerir(
+            self.linea('L:1', acceso_permitido=True),
+            '{no es json',
+            '',
+            '[1, 2]',
+            self.linea('L:5'),
+            self.linea('L:6', tipo='ACCESO_DENEGADO', acceso_permitido=True),
+            json.dumps({'id': 'L:7', 'uid': 'INGESTA-1', 'acceso_permitido': True,
+                        'fecha_hora': (timezone.now() + timedelta(days=1)).isoformat()}),
+            self.linea('L:8', acceso_permitido=False),
+        )
+        self.assertEqual((informe['insertados'], informe['rechazados']), (2, 5))
+        self.assertEqual([error['linea'] for error in informe['errores']], [2, 4, 5, 6, 7])
+        self.assertIn('acceso_permitido', informe['errores'][2]['error']['details'])
+        self.assertEqual(informe['errores'][2]['id'], 'L:5')
+        self.assertIn('tipo', informe['errores'][3]['error']['details'])
+        self.assertIn('fecha_hora', informe['errores'][4]['error']['details'])
+        self.assertTrue(informe['completo'])
+
+    @override_settings(SMARTCONNECT={'EVENTOS_INGESTA_LOTE': 2, 'EVENTOS_INGESTA_MAX_LINEAS': 6})
+    def test_tramos(self):
+        self.ingerir(self.linea('L:4', acceso_permitido=True))
+        lineas = [self.linea(f'L:{i}', acceso_permitido=True) for i in (1, 2, 3, 1, 4, 5, 6, 7)]
+        with CaptureQueriesContext(connection) as consultas:
+            informe = self.ingerir(*lineas)
+        inserciones = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith('INSERT INTO "api_evento"')]
+        # Tramos [1, 2], [3, 4] (4 ya registrado) y [5]: el 1 repetido se descarta entre tramos
+        self.assertEqual(len(inserciones), 3)
+        self.assertEqual((informe['insertados'], informe['duplicados']), (4, 2))
+        self.assertEqual((informe['completo'], informe['siguiente_linea']), (False, 7))
+        self.assertEqual(
+            set(Evento.objects.filter(id_origen__isnull=False).values_list('id_origen', flat=True)),
+            {'L:1', 'L:2', 'L:3', 'L:4', 'L:5'}
+        )
+
+
+@override_settings(SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': False})
+class DescripcionCodificadaTests(TestCase):
+    """
+    Los eventos del sistema guardan un código y sus parámetros en metadata;
+    el texto de la descripción se genera al leer
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin_codigos', password='x', rol='ADMIN')
+        cls.departamento = Departamento.objects.create(nombre='Departamento códigos')
+        cls.sensor = Sensor.objects.create(uid='CODIGO-1', nombre='Tarjeta Ana', departamento=cls.departamento)
+        cls.barrera = Barrera.objects.create(nombre='Barrera códigos', departamento=cls.departamento)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_acceso_guarda_codigo(self):
+        respuesta = self.client.post('/api/acceso/sensor/', {'uid': 'CODIGO-1'}, format='json')
+        texto = 'Sensor Tarjeta Ana (CODIGO-1) accedió exitosamente al departamento Departamento códigos'
+        self.assertEqual(respuesta.json()['data']['evento']['descripcion'], texto)
+        fila = Evento.objects.values('codigo', 'descripcion').get(pk=respuesta.json()['data']['evento']['id'])
+        self.assertEqual(fila, {'codigo': 'ACCESO', 'descripcion': ''})
+
+        # El texto conserva el nombre con el que se registró el evento
+        Sensor.objects.filter(pk=self.sensor.pk).update(nombre='Tarjeta renombrada')
+        self.assertEqual(Evento.objects.get().texto_descripcion, texto)
+
+    def test_denegaciones(self):
+        self.client.post('/api/acceso/sensor/', {'uid': 'NO-EXISTE'}, format='json')
+        Sensor.objects.filter(pk=self.sensor.pk).update(estado='BLOQUEADO')
+        self.client.post('/api/acceso/sensor/', {'uid': 'CODIGO-1'}, format='json')
+        self.assertEqual(
+            list(Evento.objects.order_by('id').values_list('codigo', flat=True)), ['UID_DESCONOCIDO', 'SENSOR_NO_ACTIVO']
+        )
+        self.assertEqual(
+            [evento.texto_descripcion for evento in Evento.objects.order_by('id')],
+            [
+                'Intento de acceso con UID no registrado: NO-EXISTE',
+                'Intento de acceso denegado para sensor Tarjeta Ana (CODIGO-1). Estado del sensor: Bloqueado',
+            ]
+        )
+
+    def test_control_manual(self):
+        ruta = f'/api/barreras/{self.barrera.pk}/controlar/'
+        plantilla = self.client.post(ruta, {'accion': 'ABRIR'}, format='json').json()['data']['evento']
+        propia = self.client.post(ruta, {'accion': 'CERRAR', 'descripcion': 'Cierre nocturno'}, format='json')
+        self.assertEqual(plantilla['descripcion'], 'Control manual: abrir')
+        self.assertEqual(propia.json()['data']['evento']['descripcion'], 'Cierre nocturno')
+        self.assertEqual(
+            list(Evento.objects.order_by('id').values_list('codigo', 'descripcion')),
+            [('CONTROL_MANUAL', ''), ('', 'Cierre nocturno')]
+        )
+
+    def test_serializacion_rapida(self):
+        self.client.post('/api/acceso/sensor/', {'uid': 'CODIGO-1'}, format='json')
+        completa = self.client.get('/api/eventos/').json()['results'][0]['descripcion']
+        rapida = self.client.get('/api/eventos/?fields=id,descripcion').json()['results'][0]
+        self.assertEqual(rapida, {'id': Evento.objects.get().pk, 'descripcion': completa})
+
+    def test_migracion_compacta_solo_textos_exactos(self):
+        migracion = importlib.import_module('api.migrations.0012_compactar_descripcion_evento')
+        metadata = {'uid': 'CODIGO-1', 'departamento': 'Departamento códigos'}
+        texto = 'Sensor Tarjeta Ana (CODIGO-1) accedió exitosamente al departamento Departamento códigos'
+        evento = Evento(tipo='ACCESO_PERMITIDO', descripcion=texto, metadata=metadata)
+        codigo, compactada = migracion._compactar(evento)
+        self.assertEqual(codigo, 'ACCESO')
+        self.assertEqual(compactada['sensor_nombre'], 'Tarjeta Ana')
+        self.assertEqual(Evento.formatear_descripcion('ACCESO_PERMITIDO', codigo, '', compactada), texto)
+
+        evento.descripcion = texto + ' (editado)'
+        self.assertIsNone(migracion._compactar(evento))
+        self.assertIsNone(migracion._compactar(Evento(tipo='BARRERA_ABIERTA', descripcion='Apertura de emergencia')))
+
+
+@override_settings(SMARTCONNECT={'RESPUESTAS_CACHE_ENABLED': False})
+class CamposDispersosTests(TestCase):
+    """
+    ?fields= y ?exclude= recortan la salida y también la consulta: solo las
+    columnas pedidas y solo los JOIN que esos campos necesitan
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(username='admin_campos', password='x', rol='ADMIN')
+        cls.departamento = Departamento.objects.create(nombre='Departamento campos')
+        cls.sensor = Sensor.objects.create(
+            uid='CAMPOS-1', nombre='Sensor campos', departamento=cls.departamento, usuario_asignado=cls.admin
+        )
+        cls.sensor.departamentos_adicionales.add(Departamento.objects.create(nombre='Adicional campos'))
+        Evento.objects.create(tipo='ACCESO_PERMITIDO', sensor=cls.sensor, departamento=cls.departamento)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def consultar(self, url, tabla):
+        """Respuesta y SQL de las consultas de filas sobre la tabla"""
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        sql = [
+            q['sql'] for q in consultas.captured_queries
+            if q['sql'].startswith(f'SELECT "{tabla}".') and 'COUNT(' not in q['sql']
+        ]
+        return respuesta.json(), sql
+
+    def test_solo_columnas_pedidas(self):
+        datos, sql = self.consultar('/api/sensores/?fields=id,uid', 'api_sensor')
+        self.assertEqual(datos['results'], [{'id': self.sensor.pk, 'uid': 'CAMPOS-1'}])
+        self.assertEqual(len(sql), 1)
+        self.assertNotIn('JOIN', sql[0])
+        self.assertNotIn('"nombre"', sql[0])
+
+    def test_join_solo_si_hace_falta(self):
+        datos, sql = self.consultar('/api/sensores/?fields=uid,departamento_nombre', 'api_sensor')
+        self.assertEqual(datos['results'], [{'uid': 'CAMPOS-1', 'departamento_nombre': 'Departamento campos'}])
+        self.assertIn('JOIN "api_departamento"', sql[0])
+        self.assertNotIn('api_usuario', sql[0])
+
+    def test_prefetch_solo_si_hace_falta(self):
+        _, sql = self.consultar('/api/sensores/?fields=uid', 'api_sensor')
+        self.assertNotIn('departamentos_adicionales', ' '.join(sql))
+        datos, _ = self.consultar('/api/sensores/?fields=uid,departamentos_adicionales', 'api_sensor')
+        self.assertEqual(len(datos['results'][0]['departamentos_adicionales']), 1)
+
+    def test_exclude(self):
+        completo, _ = self.consultar('/api/sensores/', 'api_sensor')
+        datos, _ = self.consultar('/api/sensores/?exclude=descripcion,usuario_nombre', 'api_sensor')
+        self.assertEqual(
+            set(datos['results'][0]), set(completo['results'][0]) - {'descripcion', 'usuario_nombre'}
+        )
+
+    def test_detalle_y_otros_viewsets(self):
+        datos, _ = self.consultar(f'/api/sensores/{self.sensor.pk}/?fields=uid', 'api_sensor')
+        self.assertEqual(datos, {'uid': 'CAMPOS-1'})
+        datos, sql = self.consultar('/api/usuarios/?fields=username', 'api_usuario')
+        self.assertEqual(datos['results'], [{'username': 'admin_campos'}])
+        self.assertNotIn('"email"', sql[0])
+        datos, sql = self.consultar('/api/eventos/?fields=id,tipo', 'api_evento')
+        self.assertEqual(datos['results'][0].keys(), {'id', 'tipo'})
+        self.assertNotIn('JOIN', sql[0])
+
+    def test_campo_desconocido(self):
+        respuesta = self.client.get('/api/sensores/?fields=uid,no_existe')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('no_existe', respuesta.json()['error']['details']['fields'])
+
+    def test_escrituras_sin_recorte(self):
+        respuesta = self.client.post('/api/sensores/?fields=uid', {
+            'uid': 'CAMPOS-2', 'nombre': 'Otro sensor', 'departamento': self.departamento.pk
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertIn('nombre', respuesta.json()['data'])
@@ -3,10 +3,11 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from .views import (
-    api_info, acceso_sensor, logout,
+    api_info, metricas, acceso_sensor, acceso_sensor_lote, logout, ticket_en_vivo,
     UsuarioViewSet, DepartamentoViewSet, SensorViewSet,
     BarreraViewSet, EventoViewSet
 )
+from .views_async import acceso_sensor_async, controlar_barrera_async, eventos_en_vivo
 
 # Router para ViewSets
 router = DefaultRouter()
@@ -19,6 +20,7 @@ router.register(r'eventos', EventoViewSet, basename='evento')
 urlpatterns = [
     # Endpoint de información (obligatorio)
     path('info/', api_info, name='api-info'),
+    path('metricas/', metricas, name='metricas'),
     
     # Autenticación JWT
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -27,6 +29,13 @@ urlpatterns = [
     
     # Endpoint de acceso por sensor
     path('acceso/sensor/', acceso_sensor, name='acceso-sensor'),
+    path('acceso/sensor/batch/', acceso_sensor_lote, name='acceso-sensor-batch'),
+    
+    # Versiones asíncronas para despliegue ASGI (uvicorn)
+    path('acceso/sensor/async/', acceso_sensor_async, name='acceso-sensor-async'),
+    path('barreras/<int:pk>/controlar/async/', controlar_barrera_async, name='barrera-controlar-async'),
+    path('eventos/en-vivo/', eventos_en_vivo, name='eventos-en-vivo'),
+    path('eventos/en-vivo/ticket/', ticket_en_vivo, name='eventos-en-vivo-ticket'),
     
     # Incluir rutas del router
     path('', include(router.urls)),
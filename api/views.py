@@ -1,22 +1,64 @@
+import csv
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ParseError, UnsupportedMediaType
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.db import transaction
+from django.db.models import Min, Sum
+from django.db.models.functions import TruncDay
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import Usuario, Departamento, Sensor, Barrera, Evento
+from .allowlist import filas_allowlist, relecturas, version_allowlist
+from .models import Usuario, Departamento, Sensor, Barrera, Evento, CambioSensor, ResumenEventoHora
 from .serializers import (
     UsuarioSerializer, UsuarioListSerializer, DepartamentoSerializer,
     SensorSerializer, BarreraSerializer, EventoSerializer,
-    AccesoSensorSerializer, ControlBarreraSerializer
+    AccesoSensorSerializer, AccesoSensorItemSerializer, AccesoSensorLoteSerializer,
+    ControlBarreraSerializer
 )
+from .conf import smartconnect_setting
 from .permissions import IsAdminUser, IsAdminOrReadOnly, IsOwnerOrAdmin
+from .cache import (
+    obtener_autorizacion, obtener_autorizaciones, actualizar_sensor,
+    estadisticas as estadisticas_cache
+)
+from .acceso import (
+    evento_acceso, formato_compacto, respuesta_compacta, registrar_acceso_desconocido
+)
+from .buffer import registrar_evento, registrar_eventos, buffer_eventos
+from .feed import emitir_ticket
+from .pagination import EventoCursorPagination
+from .filtros import filtrar_eventos, filtrar_resumenes, filtrar_sensores
+from .exportacion import respuesta_exportacion
+from .ingesta import abrir, ingerir
+from .importacion import importar_sensores
+from .campos import CamposViewMixin
+from .condicional import GetCondicionalMixin
+from .respuestas import RespuestaCacheMixin, respuesta_cacheada
+from .rapido import plan_rapido
+
+
+def pagina_serializada(vista, queryset):
+    """
+    Respuesta paginada de queryset con el paginador de la vista, con la
+    serialización rápida si está disponible para los campos solicitados
+    """
+    plan = plan_rapido(vista.get_serializer_class(), vista.campos_solicitados())
+    if plan is not None:
+        pagina = vista.paginate_queryset(plan.filas(queryset))
+        return vista.get_paginated_response(plan.serializar(pagina))
+    pagina = vista.paginate_queryset(queryset)
+    return vista.get_paginated_response(vista.get_serializer(pagina, many=True).data)
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@respuesta_cacheada()
 def api_info(request):
     """
     Endpoint obligatorio con información del proyecto
@@ -37,12 +79,27 @@ def api_info(request):
                 "sensores": "/api/sensores/",
                 "barreras": "/api/barreras/",
                 "eventos": "/api/eventos/",
-                "acceso": "/api/acceso/sensor/"
+                "acceso": "/api/acceso/sensor/, /api/acceso/sensor/batch/"
             }
         }
     })
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metricas(request):
+    """
+    Contadores internos del proceso: caché de sensores y buffer de eventos
+    """
+    return Response({
+        "success": True,
+        "data": {
+            "cache_sensores": estadisticas_cache(),
+            "buffer_eventos": buffer_eventos.estadisticas()
+        }
+    })
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def logout(request):
@@ -82,7 +139,7 @@ def logout(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UsuarioViewSet(viewsets.ModelViewSet):
+class UsuarioViewSet(CamposViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para CRUD de Usuarios
     Admin: acceso completo
@@ -105,11 +162,12 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
     
     def get_queryset(self):
+        queryset = super().get_queryset()
         user = self.request.user
         if user.rol == 'ADMIN':
-            return Usuario.objects.all()
+            return queryset
         # Operador solo ve su propio perfil
-        return Usuario.objects.filter(id=user.id)
+        return queryset.filter(id=user.id)
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -142,7 +200,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         }, status=status.HTTP_200_OK)
 
 
-class DepartamentoViewSet(viewsets.ModelViewSet):
+class DepartamentoViewSet(RespuestaCacheMixin, GetCondicionalMixin, CamposViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para CRUD de Departamentos
     Admin: acceso completo
@@ -151,6 +209,41 @@ class DepartamentoViewSet(viewsets.ModelViewSet):
     queryset = Departamento.objects.all()
     serializer_class = DepartamentoSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    cache_acciones = ('list', 'retrieve', 'sensores')
+    cache_modelos = (Departamento, Sensor, Barrera, Usuario)
+    
+    def por_estado(self):
+        """?por_estado=true añade el desglose de sensores por estado"""
+        return self.request.query_params.get('por_estado', '').lower() in ('1', 'true')
+    
+    def get_serializer_class(self):
+        if self.action == 'sensores':
+            return SensorSerializer
+        return super().get_serializer_class()
+    
+    def get_queryset(self):
+        if self.action == 'sensores':
+            # Solo para get_object(): ?fields= se refiere a los sensores
+            return Departamento.objects.only('pk')
+        queryset = super().get_queryset()
+        campos = self.campos_solicitados()
+        if self.action in ('list', 'retrieve', 'update', 'partial_update') and (
+            campos is None or campos & {'total_sensores', 'total_barreras', 'sensores_por_estado'}
+        ):
+            # Totales anotados en la misma consulta (sin un COUNT por departamento)
+            queryset = queryset.con_totales(
+                por_estado=self.por_estado() and (campos is None or 'sensores_por_estado' in campos)
+            )
+        return queryset
+    
+    def queryset_validador(self):
+        # Sin los totales anotados: el validador ya cuenta sensores y barreras
+        return self.filter_queryset(Departamento.objects.all())
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['por_estado'] = self.por_estado()
+        return context
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -184,25 +277,34 @@ class DepartamentoViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def sensores(self, request, pk=None):
-        """Obtener todos los sensores de un departamento"""
+        """Sensores del departamento, paginados (admite los filtros de sensores)"""
         departamento = self.get_object()
-        sensores = departamento.sensores.all()
-        serializer = SensorSerializer(sensores, many=True)
-        return Response({
-            'success': True,
-            'data': serializer.data
-        })
+        sensores = self.podar(filtrar_sensores(
+            SensorViewSet.queryset.filter(departamento=departamento), request.query_params
+        ))
+        no_modificado = self.condicional(sensores)
+        if no_modificado is not None:
+            return no_modificado
+        return pagina_serializada(self, sensores)
 
 
-class SensorViewSet(viewsets.ModelViewSet):
+class SensorViewSet(RespuestaCacheMixin, GetCondicionalMixin, CamposViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para CRUD de Sensores
     Admin: acceso completo
     Operador: solo lectura
     """
-    queryset = Sensor.objects.select_related('departamento', 'usuario_asignado').all()
+    queryset = Sensor.objects.select_related('departamento', 'usuario_asignado').prefetch_related('departamentos_adicionales')
     serializer_class = SensorSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    cache_acciones = ('list', 'retrieve', 'activos')
+    cache_modelos = (Sensor, Departamento, Usuario)
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'activos'):
+            queryset = filtrar_sensores(queryset, self.request.query_params)
+        return queryset
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -236,12 +338,121 @@ class SensorViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def activos(self, request):
-        """Obtener todos los sensores activos"""
-        sensores = self.queryset.filter(estado='ACTIVO')
-        serializer = self.get_serializer(sensores, many=True)
+        """Sensores activos, paginados (admite los filtros del listado)"""
+        sensores = self.filter_queryset(self.get_queryset()).filter(estado='ACTIVO')
+        no_modificado = self.condicional(sensores)
+        if no_modificado is not None:
+            return no_modificado
+        return pagina_serializada(self, sensores)
+    
+    @action(detail=False, methods=['post'], parser_classes=[])
+    def importar(self, request):
+        """
+        Alta en bloque de sensores desde un fichero CSV (text/csv, con
+        cabecera) o NDJSON (application/x-ndjson), admite Content-Encoding:
+        gzip. Responde con los sensores creados y los errores por línea (ver
+        api/importacion.py).
+        """
+        formatos = {'text/csv': 'csv', 'application/x-ndjson': 'ndjson'}
+        formato = formatos.get(request.content_type.split(';')[0].strip())
+        if formato is None:
+            raise UnsupportedMediaType(request.content_type)
+        if request.stream is None:
+            raise ParseError('El cuerpo de la petición está vacío')
+        try:
+            informe = importar_sensores(abrir(request.stream, request.headers.get('Content-Encoding')), formato)
+        except (OSError, EOFError) as exc:
+            # Cuerpo gzip dañado o truncado: los tramos anteriores ya están confirmados
+            raise ParseError(f'No se pudo leer el cuerpo comprimido: {exc}')
+        except (UnicodeDecodeError, csv.Error) as exc:
+            raise ParseError(f'No se pudo leer el CSV (UTF-8): {exc}')
         return Response({
             'success': True,
-            'data': serializer.data
+            'data': informe
+        })
+    
+    @action(detail=False, methods=['get'])
+    @method_decorator(gzip_page)
+    def allowlist(self, request):
+        """
+        Instantánea versionada de la lista de acceso de todos los sensores
+        (formato de cada fila en api/allowlist.py). Responde 304 si el ETag
+        (versión) no cambió.
+        """
+        version = version_allowlist()
+        etag = f'"allowlist-v2-{version}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        
+        sensores = filas_allowlist(Sensor.objects.all())
+        return Response({
+            'success': True,
+            'data': {
+                'version': version,
+                'total': len(sensores),
+                'sensores': sensores
+            }
+        }, headers={'ETag': etag})
+    
+    @action(detail=False, methods=['get'], url_path='allowlist/delta')
+    @method_decorator(gzip_page)
+    def allowlist_delta(self, request):
+        """
+        Cambios de la lista de acceso desde una versión (?desde=N).
+        'cambios' son altas/modificaciones de sensores activos y 'bajas' los
+        sensores eliminados o que dejaron de estar activos (tombstones).
+        """
+        try:
+            desde = int(request.query_params.get('desde', ''))
+        except ValueError:
+            return Response({
+                'success': False,
+                'error': {
+                    'code': 400,
+                    'message': 'Parámetro "desde" requerido (versión entera)'
+                }
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Si el historial anterior a "desde" ya no existe hay que resincronizar
+        primera = CambioSensor.objects.aggregate(primera=Min('version'))['primera']
+        if primera is not None and desde < primera - 1:
+            return Response({
+                'success': False,
+                'error': {
+                    'code': 410,
+                    'message': 'Versión demasiado antigua, descargue la allowlist completa'
+                }
+            }, status=status.HTTP_410_GONE)
+        
+        maximo = smartconnect_setting('ALLOWLIST_DELTA_MAX')
+        registro = list(
+            CambioSensor.objects.filter(version__gt=desde)
+            .order_by('version').values_list('version', 'uid')[:maximo]
+        )
+        version = registro[-1][0] if registro else max(desde, version_allowlist())
+        # Más los cambios recientes anteriores a "desde" que pudieron confirmarse tarde
+        uids = {uid for _, uid in registro} | relecturas(desde)
+        
+        actuales = {fila[0]: fila for fila in filas_allowlist(Sensor.objects.filter(uid__in=uids))}
+        cambios = []
+        bajas = []
+        for uid in sorted(uids):
+            if uid not in actuales:
+                bajas.append([uid, 'ELIMINADO'])
+            elif actuales[uid][1] != 'ACTIVO':
+                bajas.append([uid, actuales[uid][1]])
+            else:
+                cambios.append(actuales[uid])
+        
+        return Response({
+            'success': True,
+            'data': {
+                'desde': desde,
+                'version': version,
+                'completo': len(registro) < maximo,
+                'cambios': cambios,
+                'bajas': bajas
+            }
         })
     
     @action(detail=True, methods=['post'])
@@ -261,6 +472,7 @@ class SensorViewSet(viewsets.ModelViewSet):
         
         sensor.estado = nuevo_estado
         sensor.save()
+        actualizar_sensor(sensor)
         
         return Response({
             'success': True,
@@ -269,7 +481,7 @@ class SensorViewSet(viewsets.ModelViewSet):
         })
 
 
-class BarreraViewSet(viewsets.ModelViewSet):
+class BarreraViewSet(RespuestaCacheMixin, GetCondicionalMixin, CamposViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para CRUD de Barreras
     Admin: acceso completo
@@ -278,6 +490,7 @@ class BarreraViewSet(viewsets.ModelViewSet):
     queryset = Barrera.objects.select_related('departamento').all()
     serializer_class = BarreraSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    cache_modelos = (Barrera, Departamento)
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -317,7 +530,8 @@ class BarreraViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         
         accion = serializer.validated_data['accion']
-        descripcion = serializer.validated_data.get('descripcion', f'Control manual: {accion.lower()}')
+        # Sin descripción propia, la plantilla CONTROL_MANUAL (Evento.MENSAJES)
+        descripcion = serializer.validated_data.get('descripcion')
         
         with transaction.atomic():
             if accion == 'ABRIR':
@@ -327,17 +541,19 @@ class BarreraViewSet(viewsets.ModelViewSet):
                 barrera.cerrar()
                 tipo_evento = 'BARRERA_CERRADA'
             
-            # Registrar evento
-            evento = Evento.objects.create(
+            # Registrar evento (síncrono o diferido según EVENTO_ESCRITURA)
+            evento = registrar_evento(Evento(
                 tipo=tipo_evento,
                 barrera=barrera,
+                departamento_id=barrera.departamento_id,
                 usuario_accion=request.user,
-                descripcion=descripcion,
+                codigo='CONTROL_MANUAL' if descripcion is None else '',
+                descripcion=descripcion or '',
                 metadata={
                     'accion_manual': True,
                     'usuario': request.user.username
                 }
-            )
+            ))
         
         return Response({
             'success': True,
@@ -349,18 +565,44 @@ class BarreraViewSet(viewsets.ModelViewSet):
         })
 
 
-class EventoViewSet(viewsets.ReadOnlyModelViewSet):
+AGRUPACIONES_ESTADISTICAS = ('hora', 'dia', 'tipo', 'departamento', 'sensor', 'barrera')
+
+
+class EventoViewSet(CamposViewMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para consulta de Eventos (solo lectura)
+    El listado se pagina por cursor sobre (fecha_hora, id): ?cursor=,
+    ?page_size= (hasta EVENTOS_PAGE_SIZE_MAX) y ?total=true para incluir count.
+    ?desde=, ?hasta=, ?tipo=, ?sensor=, ?barrera= y ?departamento= filtran el
+    listado, por_tipo y exportar (ver api/filtros.py).
     """
     queryset = Evento.objects.select_related('sensor', 'barrera', 'usuario_accion').all()
     serializer_class = EventoSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = EventoCursorPagination
+    # Clave del cursor, se lea o no
+    campos_siempre = ('fecha_hora',)
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'por_tipo', 'exportar'):
+            queryset = filtrar_eventos(queryset, self.request.query_params)
+        return queryset
+    
+    def list(self, request, *args, **kwargs):
+        plan = plan_rapido(self.get_serializer_class(), self.campos_solicitados())
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        # La página son filas de values(); el cursor se toma de fecha_hora e id
+        pagina = self.paginate_queryset(
+            plan.filas(self.filter_queryset(self.get_queryset()), 'id', 'fecha_hora')
+        )
+        return self.get_paginated_response(plan.serializar(pagina))
     
     @action(detail=False, methods=['get'])
     def recientes(self, request):
         """Obtener eventos recientes (últimos 50)"""
-        eventos = self.queryset[:50]
+        eventos = self.get_queryset()[:50]
         serializer = self.get_serializer(eventos, many=True)
         return Response({
             'success': True,
@@ -369,7 +611,7 @@ class EventoViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=False, methods=['get'])
     def por_tipo(self, request):
-        """Filtrar eventos por tipo"""
+        """Eventos de un tipo (?tipo=), paginados por cursor como el listado"""
         tipo = request.query_params.get('tipo')
         if not tipo:
             return Response({
@@ -380,12 +622,103 @@ class EventoViewSet(viewsets.ReadOnlyModelViewSet):
                 }
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        eventos = self.queryset.filter(tipo=tipo)
-        serializer = self.get_serializer(eventos, many=True)
+        # get_queryset aplica ?tipo= y el resto de filtros del listado
+        return self.list(request)
+    
+    @action(detail=False, methods=['get'])
+    def estadisticas(self, request):
+        """
+        Totales de eventos desde los resúmenes por hora (api/resumen.py), sin
+        leer eventos. Admite los filtros del listado y ?agrupar= con una lista
+        separada por comas de hora, dia, tipo, departamento, sensor y barrera.
+        """
+        agrupar = [campo for campo in request.query_params.get('agrupar', '').split(',') if campo]
+        invalidos = set(agrupar) - set(AGRUPACIONES_ESTADISTICAS)
+        if invalidos:
+            return Response({
+                'success': False,
+                'error': {
+                    'code': 400,
+                    'message': f'Agrupación no soportada: {", ".join(sorted(invalidos))}',
+                    'details': {'agrupar': list(AGRUPACIONES_ESTADISTICAS)}
+                }
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        resumenes = filtrar_resumenes(ResumenEventoHora.objects.all(), request.query_params)
+        total = resumenes.aggregate(total=Sum('total'))['total'] or 0
+        resultados = []
+        if agrupar:
+            if 'dia' in agrupar:
+                resumenes = resumenes.annotate(dia=TruncDay('hora'))
+            grupos = resumenes.values(*agrupar).annotate(total=Sum('total')).order_by(*agrupar)
+            for grupo in grupos:
+                # 0 en el resumen significa "sin departamento/sensor/barrera"
+                resultados.append({
+                    campo: (valor or None) if campo in ('departamento', 'sensor', 'barrera') else valor
+                    for campo, valor in grupo.items()
+                })
+        
         return Response({
             'success': True,
-            'data': serializer.data
+            'data': {
+                'total': total,
+                'agrupar': agrupar,
+                'resultados': resultados
+            }
         })
+    
+    @action(detail=False, methods=['get'])
+    @method_decorator(gzip_page)
+    def exportar(self, request):
+        """
+        Exportar eventos filtrados en streaming, en orden cronológico:
+        ?formato=ndjson (por defecto) o ?formato=csv. Se comprime con gzip
+        si el cliente lo acepta (Accept-Encoding).
+        """
+        eventos = self.get_queryset().order_by('fecha_hora', 'id')
+        return respuesta_exportacion(
+            eventos, request.query_params.get('formato', 'ndjson'), self.campos_solicitados()
+        )
+    
+    @action(detail=False, methods=['post'], parser_classes=[])
+    def ingesta(self, request):
+        """
+        Ingesta de eventos registrados sin conexión por los lectores: un
+        acceso por línea en NDJSON (application/x-ndjson, admite
+        Content-Encoding: gzip) con su id de lector y su fecha_hora original.
+        Responde con los totales y los errores por línea (ver api/ingesta.py).
+        """
+        if request.content_type.split(';')[0].strip() != 'application/x-ndjson':
+            raise UnsupportedMediaType(request.content_type)
+        if request.stream is None:
+            raise ParseError('El cuerpo de la petición está vacío')
+        try:
+            informe = ingerir(abrir(request.stream, request.headers.get('Content-Encoding')))
+        except (OSError, EOFError) as exc:
+            # Cuerpo gzip dañado o truncado: los tramos anteriores ya están confirmados
+            raise ParseError(f'No se pudo leer el cuerpo comprimido: {exc}')
+        return Response({
+            'success': True,
+            'data': informe
+        })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def ticket_en_vivo(request):
+    """
+    Ticket de un solo uso para abrir /api/eventos/en-vivo/?ticket=
+    EventSource no envía cabeceras y el JWT en la URL quedaría en los logs
+    de acceso; el ticket caduca a los EVENTOS_FEED_TICKET_TTL segundos y solo
+    sirve para el feed.
+    """
+    return Response({
+        'success': True,
+        'data': {
+            'ticket': emitir_ticket(request.user),
+            'expira_en': smartconnect_setting('EVENTOS_FEED_TICKET_TTL')
+        }
+    }, status=status.HTTP_201_CREATED)
 
 
 @api_view(['POST'])
@@ -393,7 +726,11 @@ class EventoViewSet(viewsets.ReadOnlyModelViewSet):
 def acceso_sensor(request):
     """
     Endpoint para simular intento de acceso de un sensor
-    Valida el UID, verifica el estado y registra el evento
+    Valida el UID, verifica el estado y registra el evento.
+    La autorización del sensor se obtiene de la caché (ver api/cache.py) e
+    incluye los departamentos permitidos, usados si se envía departamento_id.
+    Con ?formato=compacto (o Accept con profile=compacto) responde solo
+    success, acceso_permitido y evento_id.
     """
     serializer = AccesoSensorSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
@@ -401,71 +738,123 @@ def acceso_sensor(request):
     uid = serializer.validated_data['uid']
     departamento_id = serializer.validated_data.get('departamento_id')
     
-    try:
-        # Buscar sensor por UID
-        query = Sensor.objects.select_related('departamento', 'usuario_asignado')
-        sensor = query.get(uid=uid)
-        
-        # Verificar si puede acceder
-        puede_acceder = sensor.puede_acceder()
-        
-        with transaction.atomic():
-            if puede_acceder:
-                tipo_evento = 'ACCESO_PERMITIDO'
-                mensaje = f'Acceso permitido para sensor {sensor.uid}'
-                descripcion = f'Sensor {sensor.nombre} ({sensor.uid}) accedió exitosamente al departamento {sensor.departamento.nombre}'
-            else:
-                tipo_evento = 'ACCESO_DENEGADO'
-                mensaje = f'Acceso denegado para sensor {sensor.uid}. Estado: {sensor.get_estado_display()}'
-                descripcion = f'Intento de acceso denegado para sensor {sensor.nombre} ({sensor.uid}). Estado del sensor: {sensor.get_estado_display()}'
-            
-            # Registrar evento
-            evento = Evento.objects.create(
-                tipo=tipo_evento,
-                sensor=sensor,
-                descripcion=descripcion,
-                metadata={
-                    'uid': sensor.uid,
-                    'estado_sensor': sensor.estado,
-                    'departamento': sensor.departamento.nombre,
-                    'usuario_asignado': sensor.usuario_asignado.get_full_name() if sensor.usuario_asignado else None,
-                    'timestamp': timezone.now().isoformat()
-                }
-            )
-        
-        return Response({
-            'success': True,
-            'acceso_permitido': puede_acceder,
-            'message': mensaje,
-            'data': {
-                'sensor': SensorSerializer(sensor).data,
-                'evento': EventoSerializer(evento).data
-            }
-        }, status=status.HTTP_200_OK)
-        
-    except Sensor.DoesNotExist:
-        # Sensor no encontrado
-        descripcion = f'Intento de acceso con UID no registrado: {uid}'
-        
-        # Registrar evento de acceso denegado
-        evento = Evento.objects.create(
-            tipo='ACCESO_DENEGADO',
-            descripcion=descripcion,
-            metadata={
-                'uid': uid,
-                'razon': 'UID no registrado',
-                'timestamp': timezone.now().isoformat()
-            }
+    # Buscar la autorización del sensor (caché o base de datos)
+    autorizacion = obtener_autorizacion(uid)
+    evento, puede_acceder, mensaje = evento_acceso(uid, autorizacion, departamento_id=departamento_id)
+    
+    # Registrar evento (síncrono o diferido según EVENTO_ESCRITURA);
+    # los intentos repetidos con un UID no registrado se fusionan
+    if autorizacion is None:
+        registrar_acceso_desconocido(evento)
+    else:
+        registrar_evento(evento)
+    
+    if formato_compacto(request.query_params, request.META.get('HTTP_ACCEPT')):
+        return Response(
+            respuesta_compacta(evento, puede_acceder, autorizacion is not None),
+            status=status.HTTP_200_OK if autorizacion is not None else status.HTTP_404_NOT_FOUND
         )
+    
+    if autorizacion is None:
+        # Sensor no encontrado
         
         return Response({
             'success': False,
             'acceso_permitido': False,
             'error': {
                 'code': 404,
-                'message': f'Sensor con UID {uid} no encontrado',
+                'message': mensaje,
                 'details': {
                     'evento': EventoSerializer(evento).data
                 }
             }
         }, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'success': True,
+        'acceso_permitido': puede_acceder,
+        'message': mensaje,
+        'data': {
+            'sensor': autorizacion['sensor'],
+            'evento': EventoSerializer(evento).data
+        }
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def acceso_sensor_lote(request):
+    """
+    Endpoint para resolver en bloque los accesos agregados por un gateway
+    Resuelve todos los UIDs con una sola consulta, registra los eventos con
+    un único bulk_create y devuelve las decisiones en el orden de entrada.
+    La fecha_hora de cada evento es su ts (si se envía), limitada a la hora actual.
+    """
+    serializer = AccesoSensorLoteSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    
+    # Validar cada acceso con la misma semántica que /api/acceso/sensor/
+    validos = []
+    resultados = []
+    for indice, item in enumerate(serializer.validated_data['accesos']):
+        item_serializer = AccesoSensorItemSerializer(data=item)
+        if item_serializer.is_valid():
+            validos.append((indice, item_serializer.validated_data))
+            resultados.append(None)
+        else:
+            resultados.append({
+                'indice': indice,
+                'acceso_permitido': False,
+                'error': {
+                    'code': 400,
+                    'message': 'Error de validación',
+                    'details': {
+                        campo: [str(error) for error in errores]
+                        for campo, errores in item_serializer.errors.items()
+                    }
+                }
+            })
+    
+    autorizaciones = obtener_autorizaciones(datos['uid'] for _, datos in validos)
+    
+    eventos = []
+    decisiones = []
+    ahora = timezone.now()
+    for indice, datos in validos:
+        uid = datos['uid']
+        autorizacion = autorizaciones.get(uid)
+        evento, puede_acceder, mensaje = evento_acceso(
+            uid, autorizacion, datos.get('ts'), datos.get('departamento_id')
+        )
+        if datos.get('ts'):
+            # Hora de lectura informada por el gateway, sin pasar de la actual
+            evento.fecha_hora = min(datos['ts'], ahora)
+        eventos.append(evento)
+        decisiones.append((indice, uid, autorizacion is not None, puede_acceder, mensaje))
+    
+    with transaction.atomic():
+        registrar_eventos(eventos)
+    
+    for evento, (indice, uid, registrado, puede_acceder, mensaje) in zip(eventos, decisiones):
+        resultado = {
+            'indice': indice,
+            'uid': uid,
+            'acceso_permitido': puede_acceder,
+            'evento_id': evento.pk,
+        }
+        if registrado:
+            resultado['message'] = mensaje
+        else:
+            resultado['error'] = {'code': 404, 'message': mensaje}
+        resultados[indice] = resultado
+    
+    permitidos = sum(1 for resultado in resultados if resultado['acceso_permitido'])
+    return Response({
+        'success': True,
+        'data': {
+            'total': len(resultados),
+            'permitidos': permitidos,
+            'denegados': len(resultados) - permitidos,
+            'resultados': resultados
+        }
+    }, status=status.HTTP_200_OK)
@@ -0,0 +1,288 @@
+"""
+Vistas asíncronas (ASGI) para el camino crítico de acceso y control de barreras
+Producen las mismas respuestas que sus equivalentes DRF en views.py
+Incluye el feed en vivo de eventos (Server-Sent Events), que solo existe aquí
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException, AuthenticationFailed, MethodNotAllowed, NotAuthenticated, NotFound, ParseError,
+    ValidationError
+)
+
+from .acceso import (
+    evento_acceso, formato_compacto, respuesta_compacta, registrar_acceso_desconocido
+)
+from .authentication import JWTAuthenticationAsync
+from .buffer import aregistrar_evento
+from .cache import aobtener_autorizacion
+from .conf import smartconnect_setting
+from .exceptions import custom_exception_handler
+from .feed import Suscripcion, acanjear_ticket, mensajes_desde_bd, publicador
+from .models import Barrera, Evento, Usuario
+from .renderers import ORJSONRenderer
+from .serializers import (
+    AccesoSensorSerializer, BarreraSerializer, ControlBarreraSerializer, EventoSerializer
+)
+
+
+def _render(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(ORJSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def _error(exc):
+    """Respuesta de error con el mismo formato que custom_exception_handler"""
+    response = custom_exception_handler(exc, {})
+    respuesta = _render(response.data, response.status_code)
+    for cabecera, valor in response.items():
+        if cabecera.lower() != 'content-type':
+            respuesta[cabecera] = valor
+    return respuesta
+
+
+def _id(valor, parametro):
+    if not valor:
+        return None
+    try:
+        return int(valor)
+    except ValueError:
+        raise ValidationError({parametro: f'Debe ser un id numérico: {valor}'})
+
+
+async def _autenticar(request):
+    """Autentica la petición con JWT sin salir del event loop (salvo el ORM)"""
+    autenticacion = JWTAuthenticationAsync()
+    try:
+        resultado = await autenticacion.aauthenticate(request)
+        if resultado is None:
+            raise NotAuthenticated()
+    except APIException as exc:
+        exc.auth_header = autenticacion.authenticate_header(request)
+        raise
+    return resultado[0]
+
+
+def _datos(request):
+    if not request.body:
+        return {}
+    try:
+        return json.loads(request.body)
+    except ValueError as exc:
+        raise ParseError(f'JSON parse error - {exc}')
+
+
+@csrf_exempt
+async def acceso_sensor_async(request):
+    """
+    Versión asíncrona de /api/acceso/sensor/
+    """
+    try:
+        if request.method != 'POST':
+            raise MethodNotAllowed(request.method)
+        await _autenticar(request)
+        serializer = AccesoSensorSerializer(data=_datos(request))
+        serializer.is_valid(raise_exception=True)
+    except APIException as exc:
+        return _error(exc)
+
+    uid = serializer.validated_data['uid']
+
+    autorizacion = await aobtener_autorizacion(uid)
+    evento, puede_acceder, mensaje = evento_acceso(
+        uid, autorizacion, departamento_id=serializer.validated_data.get('departamento_id')
+    )
+    if autorizacion is None:
+        # Camino de abuso (UID no registrado): la fusión de denegaciones es síncrona
+        await sync_to_async(registrar_acceso_desconocido)(evento)
+    else:
+        await aregistrar_evento(evento)
+
+    if formato_compacto(request.GET, request.headers.get('Accept')):
+        return _render(
+            respuesta_compacta(evento, puede_acceder, autorizacion is not None),
+            status.HTTP_200_OK if autorizacion is not None else status.HTTP_404_NOT_FOUND
+        )
+
+    if autorizacion is None:
+        return _render({
+            'success': False,
+            'acceso_permitido': False,
+            'error': {
+                'code': 404,
+                'message': mensaje,
+                'details': {
+                    'evento': EventoSerializer(evento).data
+                }
+            }
+        }, status.HTTP_404_NOT_FOUND)
+
+    return _render({
+        'success': True,
+        'acceso_permitido': puede_acceder,
+        'message': mensaje,
+        'data': {
+            'sensor': autorizacion['sensor'],
+            'evento': EventoSerializer(evento).data
+        }
+    })
+
+
+@csrf_exempt
+async def controlar_barrera_async(request, pk):
+    """
+    Versión asíncrona de /api/barreras/{id}/controlar/
+    Django no admite transacciones en contexto asíncrono: la barrera se
+    guarda antes que el evento, igual que dentro del atomic() síncrono.
+    """
+    try:
+        if request.method != 'POST':
+            raise MethodNotAllowed(request.method)
+        usuario = await _autenticar(request)
+        try:
+            barrera = await Barrera.objects.select_related('departamento').aget(pk=pk)
+        except Barrera.DoesNotExist:
+            raise NotFound('No Barrera matches the given query.')
+        serializer = ControlBarreraSerializer(data=_datos(request))
+        serializer.is_valid(raise_exception=True)
+    except APIException as exc:
+        return _error(exc)
+
+    accion = serializer.validated_data['accion']
+    # Sin descripción propia, la plantilla CONTROL_MANUAL (Evento.MENSAJES)
+    descripcion = serializer.validated_data.get('descripcion')
+
+    if accion == 'ABRIR':
+        await barrera.aabrir()
+        tipo_evento = 'BARRERA_ABIERTA'
+    else:
+        await barrera.acerrar()
+        tipo_evento = 'BARRERA_CERRADA'
+
+    evento = await aregistrar_evento(Evento(
+        tipo=tipo_evento,
+        barrera=barrera,
+        departamento_id=barrera.departamento_id,
+        usuario_accion=usuario,
+        codigo='CONTROL_MANUAL' if descripcion is None else '',
+        descripcion=descripcion or '',
+        metadata={
+            'accion_manual': True,
+            'usuario': usuario.username
+        }
+    ))
+
+    return _render({
+        'success': True,
+        'message': f'Barrera {accion.lower()}da exitosamente',
+        'data': {
+            'barrera': BarreraSerializer(barrera).data,
+            'evento': EventoSerializer(evento).data
+        }
+    })
+
+
+class ASGIRequerido(APIException):
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = 'El feed en vivo requiere el despliegue ASGI (uvicorn)'
+
+
+def _reanudar(ultimo_id):
+    """
+    Mensajes posteriores a ultimo_id (de los recientes en memoria o de la base
+    de datos). Cierra la conexión del hilo del ORM, usada también al
+    autenticar, para no retenerla mientras dure el flujo.
+    """
+    try:
+        if ultimo_id is None:
+            return []
+        mensajes = publicador.desde(ultimo_id)
+        if mensajes is None:
+            mensajes = mensajes_desde_bd(ultimo_id, smartconnect_setting('EVENTOS_FEED_RECIENTES'))
+        return mensajes
+    finally:
+        connection.close()
+
+
+async def eventos_en_vivo(request):
+    """
+    Feed en vivo de eventos por Server-Sent Events: /api/eventos/en-vivo/
+    Sustituye al sondeo de /api/eventos/recientes/. Cada evento nuevo se
+    serializa una vez en el publicador del proceso (api/feed.py) y se envía a
+    todos los clientes, que no retienen conexión a la base de datos.
+    Reanuda con la cabecera Last-Event-ID (o ?ultimo_id=) y admite ?tipo= y
+    ?departamento=. EventSource no envía cabeceras: se autentica con el ticket
+    de un solo uso de /api/eventos/en-vivo/ticket/ en ?ticket= (o con el JWT
+    en Authorization). Solo con ASGI (uvicorn); con WSGI cada cliente
+    ocuparía un worker.
+    """
+    try:
+        if request.method != 'GET':
+            raise MethodNotAllowed(request.method)
+        ticket = request.GET.get('ticket')
+        if ticket:
+            usuario_id = await acanjear_ticket(ticket)
+            if usuario_id is None or not await Usuario.objects.filter(pk=usuario_id, is_active=True).aexists():
+                exc = AuthenticationFailed('Ticket del feed inválido, caducado o ya usado')
+                exc.auth_header = JWTAuthenticationAsync().authenticate_header(request)
+                raise exc
+        else:
+            await _autenticar(request)
+        if not hasattr(request, 'scope'):
+            raise ASGIRequerido()
+        tipo = request.GET.get('tipo') or None
+        departamento_id = _id(request.GET.get('departamento'), 'departamento')
+        ultimo_id = _id(
+            request.headers.get('Last-Event-ID') or request.GET.get('ultimo_id'), 'ultimo_id'
+        )
+    except APIException as exc:
+        return _error(exc)
+
+    def filtro(mensaje):
+        return (
+            (tipo is None or mensaje.tipo == tipo)
+            and (departamento_id is None or mensaje.departamento_id == departamento_id)
+        )
+
+    # Suscribirse antes de reanudar: lo publicado entretanto llega por la cola
+    suscripcion = Suscripcion(asyncio.Queue(), asyncio.get_running_loop(), filtro)
+    publicador.suscribir(suscripcion)
+    try:
+        reanudados = [m for m in await sync_to_async(_reanudar)(ultimo_id) if filtro(m)]
+    except BaseException:
+        publicador.cancelar(suscripcion)
+        raise
+
+    async def flujo():
+        try:
+            yield 'retry: 3000\n\n'
+            enviados = set()
+            for mensaje in reanudados:
+                enviados.add(mensaje.id)
+                yield mensaje.texto
+            while True:
+                try:
+                    mensaje = await asyncio.wait_for(
+                        suscripcion.cola.get(), smartconnect_setting('EVENTOS_FEED_LATIDO')
+                    )
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                if mensaje is None:
+                    # Cliente sin consumir a tiempo: se cierra y EventSource reanuda con Last-Event-ID
+                    return
+                if mensaje.id in enviados:
+                    continue
+                yield mensaje.texto
+        finally:
+            publicador.cancelar(suscripcion)
+
+    respuesta = StreamingHttpResponse(flujo(), content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
@@ -17,7 +17,12 @@ sudo apt upgrade -y
 
 # 2. Instalar dependencias del sistema
 echo -e "${YELLOW}📦 Instalando dependencias del sistema...${NC}"
-sudo apt install -y python3 python3-pip python3-venv nginx git
+sudo apt install -y python3 python3-pip python3-venv nginx git redis-server
+# Caché compartida de autorización (CACHES['default'] con SMARTCONNECT_REDIS_URL).
+# Los comandos de manage.py invalidan la caché: también deben usar Redis
+sudo systemctl enable --now redis-server
+export SMARTCONNECT_REDIS_URL=redis://127.0.0.1:6379/1
+grep -q SMARTCONNECT_REDIS_URL ~/.profile || echo "export SMARTCONNECT_REDIS_URL=$SMARTCONNECT_REDIS_URL" >> ~/.profile
 
 # 3. Crear directorio para el proyecto
 echo -e "${YELLOW}📁 Preparando directorio del proyecto...${NC}"
@@ -58,6 +63,8 @@ fi
 # 8. Aplicar migraciones
 echo -e "${YELLOW}🗄️  Aplicando migraciones de base de datos...${NC}"
 python manage.py migrate
+# Tabla de la caché en base de datos, solo si se arranca sin SMARTCONNECT_REDIS_URL
+python manage.py createcachetable
 
 # 9. Crear superusuario si no existe
 echo -e "${YELLOW}👤 Creando datos de prueba...${NC}"
@@ -72,13 +79,16 @@ echo -e "${YELLOW}⚙️  Configurando Gunicorn...${NC}"
 sudo tee /etc/systemd/system/smartconnect.service > /dev/null <<EOF
 [Unit]
 Description=SmartConnect API Gunicorn daemon
-After=network.target
+After=network.target redis-server.service
+Requires=redis-server.service
 
 [Service]
 User=ubuntu
 Group=www-data
 WorkingDirectory=/home/ubuntu/Aplicacion-Api
-ExecStart=/home/ubuntu/Aplicacion-Api/venv/bin/gunicorn --workers 3 --bind 0.0.0.0:8000 Aplicacion.wsgi:application
+Environment=SMARTCONNECT_REDIS_URL=redis://127.0.0.1:6379/1
+# gunicorn.conf.py precalienta la caché de autorización al arrancar los workers
+ExecStart=/home/ubuntu/Aplicacion-Api/venv/bin/gunicorn --config gunicorn.conf.py --workers 3 --bind 0.0.0.0:8000 Aplicacion.wsgi:application
 
 [Install]
 WantedBy=multi-user.target
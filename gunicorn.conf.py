@@ -0,0 +1,14 @@
+"""
+Configuración de gunicorn (la lee al arrancar desde el directorio del proyecto)
+Vale también para el despliegue ASGI: gunicorn -k uvicorn.workers.UvicornWorker
+"""
+
+
+def post_worker_init(worker):
+    # Django ya está cargado en el worker: precalentar la caché compartida de
+    # autorización antes del primer acceso (SENSOR_CACHE_PRECALENTAR)
+    from api.cache import precalentar_al_iniciar
+
+    total = precalentar_al_iniciar()
+    if total is not None:
+        worker.log.info('Caché de autorización precalentada: %s sensores', total)